@@ -0,0 +1,275 @@
+"""
+Benchmarks the import and read paths end to end against the benchmark database and Redis.
+
+    python -m benchmarks.run --categories 5 --brands 50 --series 20 --models 10 --output results.json
+
+Every scenario runs on a freshly flushed database and Redis. The report is JSON and lists, per
+scenario, the wall time, throughput, peak RSS and the SQL queries and Redis round trips counted
+by ImportMetrics, so two runs can be compared with any JSON diff tool.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from django_redis import get_redis_connection  # noqa: E402
+
+from benchmarks.workbook_generator import generate_workbook  # noqa: E402
+from hierarchy_builder.services.excel_service import ExcelService  # noqa: E402
+from hierarchy_builder.services.hierarchy_service import HierarchyService  # noqa: E402
+from hierarchy_builder.services.import_metrics import ImportMetrics  # noqa: E402
+from hierarchy_builder.views import AsyncHierarchyView, HierarchyView  # noqa: E402
+
+# Accept-Encoding headers of the snapshot representations served by the hierarchy views
+SNAPSHOT_ENCODINGS = {
+    'identity': '',
+    'gzip': 'gzip, deflate',
+    'br': 'br, gzip',
+}
+
+# The async views share one connection pool, whose connections belong to the loop that opened them
+_loop = None
+
+
+def _run_async(coroutine):
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coroutine)
+
+
+def _peak_rss_kb():
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    divisor = 1024 if sys.platform == 'darwin' else 1
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // divisor,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // divisor,
+    }
+
+
+def _reset():
+    call_command('flush', interactive=False, verbosity=0)
+    get_redis_connection("default").flushdb()
+    HierarchyService._local_snapshot = None
+
+
+def _import(path, backend, workers):
+    metrics = ImportMetrics()
+    started = time.perf_counter()
+    with metrics.instrument():
+        with transaction.atomic():
+            error_message = ExcelService(path, backend=backend, workers=workers, metrics=metrics).process_excel_file()
+            if error_message:
+                raise RuntimeError(error_message)
+            commit_started = time.perf_counter()
+        metrics.add_time(None, 'commit', time.perf_counter() - commit_started)
+    return time.perf_counter() - started, metrics
+
+
+def _import_result(seconds, metrics):
+    result = metrics.as_dict()
+    rows = metrics.counters['rows']
+    return {
+        'seconds': round(seconds, 4),
+        'rows': rows,
+        'rows_per_second': round(rows / seconds, 1) if seconds else None,
+        'sql_queries': metrics.counters['sql_queries'],
+        'redis_commands': metrics.counters['redis_commands'],
+        'redis_round_trips': metrics.counters['redis_round_trips'],
+        'stages': result['stages'],
+        'counters': result['counters'],
+        'peak_rss_kb': _peak_rss_kb(),
+    }
+
+
+def _summarize(runs):
+    seconds = [run['seconds'] for run in runs]
+    summary = dict(runs[-1])
+    summary.update(seconds=round(statistics.median(seconds), 4), seconds_min=min(seconds), seconds_max=max(seconds),
+                   repeat=len(runs))
+    if summary.get('rows'):
+        summary['rows_per_second'] = round(summary['rows'] / summary['seconds'], 1)
+    return summary
+
+
+def bench_initial_import(path, backend, workers):
+    """Imports the workbook into an empty database and Redis."""
+    _reset()
+    return _import_result(*_import(path, backend, workers))
+
+
+def bench_reimport(path, backend, workers):
+    """Imports the workbook a second time, when every diff is empty."""
+    _reset()
+    _import(path, backend, workers)
+    return _import_result(*_import(path, backend, workers))
+
+
+def bench_full_hierarchy(path, backend, workers, reads=20):
+    """Reads the live full hierarchy from Redis after an import, bypassing the snapshot."""
+    _reset()
+    _import(path, backend, workers)
+    metrics = ImportMetrics()
+    started = time.perf_counter()
+    with metrics.instrument():
+        for _ in range(reads):
+            hierarchy = HierarchyService.get_full_hierarchy()
+    seconds = time.perf_counter() - started
+    return {
+        'seconds': round(seconds, 4),
+        'reads': reads,
+        'reads_per_second': round(reads / seconds, 1) if seconds else None,
+        'categories': len(hierarchy),
+        'response_bytes': len(json.dumps(hierarchy, separators=(',', ':'))),
+        'sql_queries': metrics.counters['sql_queries'],
+        'redis_commands': metrics.counters['redis_commands'],
+        'redis_round_trips': metrics.counters['redis_round_trips'],
+        'peak_rss_kb': _peak_rss_kb(),
+    }
+
+
+def _read_snapshot(view, request, reads, is_async):
+    if not is_async:
+        for _ in range(reads):
+            response = view(request)
+        return response
+
+    async def read():
+        for _ in range(reads):
+            response = await view(request)
+        return response
+    return _run_async(read())
+
+
+def _bench_snapshot(path, backend, workers, view, is_async, reads):
+    _reset()
+    _import(path, backend, workers)
+    factory = RequestFactory()
+    # Built on the first request, as after the import that rebuilt it
+    _read_snapshot(view, factory.get('/hierarchy/'), 1, is_async)
+
+    results = {}
+    for mode, check_interval in (('cached', settings.HIERARCHY_SNAPSHOT_CHECK_INTERVAL), ('revalidated', 0)):
+        with override_settings(HIERARCHY_SNAPSHOT_CHECK_INTERVAL=check_interval):
+            for encoding, accept_encoding in SNAPSHOT_ENCODINGS.items():
+                etag = _read_snapshot(view, factory.get('/hierarchy/', HTTP_ACCEPT_ENCODING=accept_encoding), 1,
+                                      is_async)['ETag']
+                requests = {
+                    encoding: factory.get('/hierarchy/', HTTP_ACCEPT_ENCODING=accept_encoding),
+                    f'{encoding}_not_modified': factory.get('/hierarchy/', HTTP_ACCEPT_ENCODING=accept_encoding,
+                                                            HTTP_IF_NONE_MATCH=etag),
+                }
+                for name, request in requests.items():
+                    metrics = ImportMetrics()
+                    started = time.perf_counter()
+                    with metrics.instrument():
+                        response = _read_snapshot(view, request, reads, is_async)
+                    seconds = time.perf_counter() - started
+                    result = {
+                        'seconds': round(seconds, 4),
+                        'reads_per_second': round(reads / seconds, 1) if seconds else None,
+                        'status': response.status_code,
+                        'content_encoding': response.get('Content-Encoding'),
+                        'response_bytes': len(response.content),
+                    }
+                    if not is_async:
+                        # Only the sync django_redis client is instrumented
+                        result['redis_round_trips'] = metrics.counters['redis_round_trips']
+                    results[f'{mode}_{name}'] = result
+
+    total_seconds = sum(result['seconds'] for result in results.values())
+    return {'seconds': round(total_seconds, 4), 'reads': reads, 'check_interval': settings.HIERARCHY_SNAPSHOT_CHECK_INTERVAL,
+            'requests': results, 'peak_rss_kb': _peak_rss_kb()}
+
+
+def bench_snapshot(path, backend, workers, reads=200):
+    """Serves the hierarchy snapshot through HierarchyView, per encoding, fresh and with a matching ETag."""
+    return _bench_snapshot(path, backend, workers, HierarchyView.as_view(), False, reads)
+
+
+def bench_async_snapshot(path, backend, workers, reads=200):
+    """Serves the hierarchy snapshot through AsyncHierarchyView, per encoding, fresh and with a matching ETag."""
+    return _bench_snapshot(path, backend, workers, AsyncHierarchyView.as_view(), True, reads)
+
+
+SCENARIOS = {
+    'initial_import': bench_initial_import,
+    'reimport': bench_reimport,
+    'full_hierarchy': bench_full_hierarchy,
+    'snapshot': bench_snapshot,
+    'async_snapshot': bench_async_snapshot,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--categories', type=int, default=3)
+    parser.add_argument('--brands', type=int, default=20, help='Brands per category.')
+    parser.add_argument('--series', type=int, default=10, help='Series per brand.')
+    parser.add_argument('--models', type=int, default=10, help='Average models per series.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=('pandas', 'streaming'), default=None,
+                        help='Ingestion backend; chosen by file size when omitted.')
+    parser.add_argument('--workers', type=int, default=None, help='Parser processes; EXCEL_PARSE_WORKERS when omitted.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario; the median time is reported.')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run; may be given more than once. Runs all by default.')
+    parser.add_argument('--workbook', help='Benchmark this workbook instead of generating one.')
+    parser.add_argument('--output', help='Write the JSON report here instead of to stdout.')
+    args = parser.parse_args(argv)
+
+    call_command('migrate', interactive=False, verbosity=0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.workbook
+        workbook = {'path': path}
+        if path is None:
+            path = os.path.join(tmp_dir, 'benchmark.xlsx')
+            workbook = generate_workbook(path, categories=args.categories, brands_per_category=args.brands,
+                                         series_per_brand=args.series, models_per_series=args.models, seed=args.seed)
+        workbook['bytes'] = os.path.getsize(path)
+
+        results = {}
+        for name in args.scenario or list(SCENARIOS):
+            runs = [SCENARIOS[name](path, args.backend, args.workers) for _ in range(args.repeat)]
+            results[name] = _summarize(runs)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'redis': 'fakeredis' if os.getenv('BENCHMARK_REDIS') == 'fakeredis' else settings.CACHES['default']['LOCATION'],
+        },
+        'parameters': vars(args),
+        'workbook': workbook,
+        'scenarios': results,
+    }
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
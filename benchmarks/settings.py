@@ -0,0 +1,46 @@
+"""
+Settings for the benchmark suite. They extend the project settings with a throwaway database and
+a dedicated Redis database so that benchmarks never touch real data.
+
+By default the database is a SQLite file in the system temporary directory; BENCHMARK_DB_ENGINE,
+BENCHMARK_DB_NAME, BENCHMARK_DB_USER, BENCHMARK_DB_PASSWORD, BENCHMARK_DB_HOST and
+BENCHMARK_DB_PORT point it at a local MySQL instead. Redis defaults to database 15 of
+BENCHMARK_REDIS_URL; BENCHMARK_REDIS=fakeredis runs against an in-process fakeredis server
+(install `fakeredis[lua]`, the snapshot is written with a Lua script).
+"""
+import os
+import tempfile
+
+from excel_parser.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': os.getenv('BENCHMARK_DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.getenv('BENCHMARK_DB_NAME', os.path.join(tempfile.gettempdir(), 'excel_parser_benchmark.sqlite3')),
+        'USER': os.getenv('BENCHMARK_DB_USER', ''),
+        'PASSWORD': os.getenv('BENCHMARK_DB_PASSWORD', ''),
+        'HOST': os.getenv('BENCHMARK_DB_HOST', ''),
+        'PORT': os.getenv('BENCHMARK_DB_PORT', ''),
+    }
+}
+
+_redis_options = {
+    'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+    'REDIS_CLIENT_CLASS': 'hierarchy_builder.repositories.counting_redis.CountingRedis',
+}
+if os.getenv('BENCHMARK_REDIS') == 'fakeredis':
+    from fakeredis import FakeConnection
+    from fakeredis.aioredis import FakeConnection as FakeAsyncConnection
+
+    _redis_options['CONNECTION_POOL_KWARGS'] = {'connection_class': FakeConnection}
+    ASYNC_REDIS_POOL_KWARGS = {'connection_class': FakeAsyncConnection}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.getenv('BENCHMARK_REDIS_URL', 'redis://localhost:6379/15'),
+        'OPTIONS': _redis_options,
+    }
+}
+
+IMPORT_SPOOL_DIR = os.path.join(tempfile.gettempdir(), 'excel_parser_benchmark_spool')
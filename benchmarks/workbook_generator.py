@@ -0,0 +1,68 @@
+import random
+
+from openpyxl import Workbook
+
+
+def _category_name(index):
+    return f"Category{index}"
+
+
+def generate_workbook(path, categories=3, brands_per_category=20, series_per_brand=10, models_per_series=10,
+                      seed=0):
+    """
+    Writes a synthetic workbook in the layout ExcelService expects: a 'Devices' sheet listing the
+    categories, a brand sheet per category and a '-Series' sheet per category in which every row
+    is a brand followed by a series and its models. Series names contain an 's' and model names
+    never do, as the parser tells them apart that way. The same arguments always produce the
+    same workbook.
+
+    Parameters:
+        path (str): Where to save the workbook.
+        categories (int): The number of device categories.
+        brands_per_category (int): The number of brands of every category.
+        series_per_brand (int): The number of series of every brand.
+        models_per_series (int): The average number of models of every series.
+        seed (int): Seeds the variation in the number of models per series.
+
+    Returns:
+        dict: The number of sheets, rows and entities of every level in the workbook.
+    """
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    counts = {'sheets': 0, 'rows': 0, 'device_categories': categories, 'brands': 0, 'series': 0,
+              'device_models': 0}
+
+    devices = workbook.create_sheet('Devices')
+    devices.append(['DeviceName'])
+    for category_index in range(categories):
+        devices.append([_category_name(category_index)])
+    counts['sheets'] += 1
+    counts['rows'] += categories
+
+    for category_index in range(categories):
+        category_name = _category_name(category_index)
+        brand_names = [f"{category_name} Brand {brand_index}" for brand_index in range(brands_per_category)]
+
+        brands = workbook.create_sheet(category_name)
+        brands.append([f"{category_name}Name"])
+        for brand_name in brand_names:
+            brands.append([brand_name])
+
+        series = workbook.create_sheet(f"{category_name}-Series")
+        series.append([f"{category_name}Name"] + [None] * (models_per_series * 2 + 1))
+        for brand_index, brand_name in enumerate(brand_names):
+            for series_index in range(series_per_brand):
+                # Model counts vary around the average so rows have ragged widths, as in real sheets
+                model_count = rng.randint(max(models_per_series // 2, 0), models_per_series * 3 // 2)
+                models = [f"Model {category_index}-{brand_index}-{series_index}-{model_index}"
+                          for model_index in range(model_count)]
+                series.append([brand_name, f"Series {brand_index}-{series_index}"] + models)
+                counts['device_models'] += model_count
+
+        counts['sheets'] += 2
+        counts['rows'] += brands_per_category * (1 + series_per_brand)
+        counts['brands'] += brands_per_category
+        counts['series'] += brands_per_category * series_per_brand
+
+    workbook.save(path)
+    return counts
@@ -96,10 +96,84 @@ CACHES = {
         'LOCATION': f'redis://{os.getenv("REDIS_HOST", "localhost")}:{os.getenv("REDIS_PORT", 6379)}/1',
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Counts the Redis commands of imports for their metrics
+            'REDIS_CLIENT_CLASS': 'hierarchy_builder.repositories.counting_redis.CountingRedis',
         }
     }
 }
 
+# Excel ingestion
+# Workbooks larger than this are streamed with openpyxl's read-only mode instead of pandas
+
+EXCEL_STREAMING_THRESHOLD_BYTES = int(os.getenv('EXCEL_STREAMING_THRESHOLD_BYTES', 50 * 1024 * 1024))
+
+EXCEL_STREAMING_CHUNK_ROWS = int(os.getenv('EXCEL_STREAMING_CHUNK_ROWS', 5000))
+
+# Sheets are parsed in this many processes and applied in transactions of up to this many sheets
+
+EXCEL_PARSE_WORKERS = int(os.getenv('EXCEL_PARSE_WORKERS', os.cpu_count() or 1))
+
+EXCEL_APPLY_BATCH_SHEETS = int(os.getenv('EXCEL_APPLY_BATCH_SHEETS', 10))
+
+# Background import jobs
+# Uploaded workbooks are spooled here until an import worker picks them up
+
+IMPORT_SPOOL_DIR = os.getenv('IMPORT_SPOOL_DIR', os.path.join(BASE_DIR, 'spool'))
+
+IMPORT_JOB_TTL = int(os.getenv('IMPORT_JOB_TTL', 7 * 24 * 60 * 60))
+
+# Chunked imports commit every sheet of names, and every this many brands of a '-Series' sheet, on
+# their own. A running import whose worker did not renew its heartbeat for this many seconds counts
+# as stalled: a chunked one may be resumed, and idle workers queue it again up to this many runs
+# before failing it. The heartbeat is renewed with the hierarchy locks, so keep this well above
+# HIERARCHY_LOCK_LEASE_SECONDS.
+
+IMPORT_CHECKPOINT_BRANDS = int(os.getenv('IMPORT_CHECKPOINT_BRANDS', 200))
+
+IMPORT_JOB_STALE_SECONDS = int(os.getenv('IMPORT_JOB_STALE_SECONDS', 15 * 60))
+
+IMPORT_JOB_MAX_ATTEMPTS = int(os.getenv('IMPORT_JOB_MAX_ATTEMPTS', 3))
+
+# Hierarchy locks
+# Imports lock the categories and brands they write. A lock expires this many seconds after its
+# holder stopped renewing it, and an import waits this long for a held lock before failing (0 fails fast).
+
+HIERARCHY_LOCK_LEASE_SECONDS = int(os.getenv('HIERARCHY_LOCK_LEASE_SECONDS', 30))
+
+HIERARCHY_LOCK_WAIT_SECONDS = int(os.getenv('HIERARCHY_LOCK_WAIT_SECONDS', 60))
+
+# Hierarchy snapshot
+# Seconds for which a process serves its copy of the snapshot before checking Redis for a newer version
+
+HIERARCHY_SNAPSHOT_CHECK_INTERVAL = float(os.getenv('HIERARCHY_SNAPSHOT_CHECK_INTERVAL', 1.0))
+
+# Partial hierarchy endpoints
+# Brands or series per page to aim for when paging through /hierarchy/<category>/ and /hierarchy/<category>/<brand>/
+
+HIERARCHY_PAGE_SIZE = int(os.getenv('HIERARCHY_PAGE_SIZE', 500))
+
+# Categories and brands read per pipelined round trip when the full hierarchy is streamed
+
+HIERARCHY_STREAM_BATCH_SIZE = int(os.getenv('HIERARCHY_STREAM_BATCH_SIZE', 100))
+
+# Search
+# Results returned by /search/ when no limit is given, and the largest limit accepted
+
+SEARCH_DEFAULT_LIMIT = int(os.getenv('SEARCH_DEFAULT_LIMIT', 20))
+
+SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 100))
+
+# Async read path
+# Serves the hierarchy endpoints with async views on redis.asyncio; requires an ASGI server
+
+HIERARCHY_ASYNC_VIEWS = os.getenv('HIERARCHY_ASYNC_VIEWS', 'False') == 'True'
+
+ASYNC_REDIS_MAX_CONNECTIONS = int(os.getenv('ASYNC_REDIS_MAX_CONNECTIONS', 100))
+
+# Further arguments of the async connection pool, e.g. the connection class of an in-process Redis
+
+ASYNC_REDIS_POOL_KWARGS = {}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -1,9 +1,19 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, re_path
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
-from hierarchy_builder.views import ExcelUploadView, HierarchyView, index  # Make sure to import HierarchyView
+from hierarchy_builder.views import ExcelUploadView, HierarchyView, ImportJobStatusView, MetricsView, CategoryHierarchyView, BrandHierarchyView, index  # Make sure to import HierarchyView
+from hierarchy_builder.views import ExcelPlanView, ApplyImportPlanView, ResumeImportView, SearchView
+from hierarchy_builder.views import AsyncHierarchyView, AsyncCategoryHierarchyView, AsyncBrandHierarchyView
+
+# Under an ASGI server the hierarchy endpoints can be served by async views on redis.asyncio
+if settings.HIERARCHY_ASYNC_VIEWS:
+    hierarchy_views = (AsyncHierarchyView, AsyncCategoryHierarchyView, AsyncBrandHierarchyView)
+else:
+    hierarchy_views = (HierarchyView, CategoryHierarchyView, BrandHierarchyView)
+hierarchy_view, category_hierarchy_view, brand_hierarchy_view = (view.as_view() for view in hierarchy_views)
 
 # Swagger schema view setup
 schema_view = get_schema_view(
@@ -26,8 +36,28 @@ urlpatterns = [
     # Your custom file upload URL
     path('upload/', ExcelUploadView.as_view(), name='excel-upload'),
 
+    # Dry run of an upload, and the import of a valid plan
+    path('upload/plan/', ExcelPlanView.as_view(), name='excel-upload-plan'),
+    path('upload/<str:job_id>/apply/', ApplyImportPlanView.as_view(), name='excel-upload-apply'),
+
+    # Resumption of a failed chunked upload from its last checkpoint
+    path('upload/<str:job_id>/resume/', ResumeImportView.as_view(), name='excel-upload-resume'),
+
+    # Status of a queued upload
+    path('upload/<str:job_id>/', ImportJobStatusView.as_view(), name='excel-upload-status'),
+
+    # Prometheus metrics of the imports
+    path('metrics/', MetricsView.as_view(), name='import-metrics'),
+
     # URL for HierarchyView
-    path('hierarchy/', HierarchyView.as_view(), name='device-hierarchy'),  # Add this line
+    path('hierarchy/', hierarchy_view, name='device-hierarchy'),  # Add this line
+
+    # Subtrees of a single category or brand
+    path('hierarchy/<str:category_name>/', category_hierarchy_view, name='category-hierarchy'),
+    path('hierarchy/<str:category_name>/<str:brand_name>/', brand_hierarchy_view, name='brand-hierarchy'),
+
+    # Prefix search over brands, series and models
+    path('search/', SearchView.as_view(), name='hierarchy-search'),
 
     # Swagger Documentation URLs
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
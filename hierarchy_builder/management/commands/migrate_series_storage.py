@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from hierarchy_builder.repositories.series_repository import SeriesRepository
+
+
+class Command(BaseCommand):
+    help = ("Converts the legacy 'series|<brand>' hashes of JSON model lists into a set of series per "
+            "brand and a set of models per series. Keys already stored as sets are left untouched.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Keys to inspect per SCAN batch.')
+
+    def handle(self, *args, **options):
+        redis_con = get_redis_connection("default")
+        migrated = 0
+
+        keys = list(redis_con.scan_iter(match=f"{SeriesRepository.PREFIX}*", count=options['batch_size']))
+        for start in range(0, len(keys), options['batch_size']):
+            batch = keys[start:start + options['batch_size']]
+
+            pipe = redis_con.pipeline(transaction=False)
+            for key in batch:
+                pipe.type(key)
+            legacy_keys = [key for key, key_type in zip(batch, pipe.execute()) if key_type == b'hash']
+
+            for key in legacy_keys:
+                pipe.hgetall(key)
+            legacy_hashes = pipe.execute() if legacy_keys else []
+
+            # Every brand is swapped within MULTI/EXEC, so readers see either the old or the new layout
+            pipe = redis_con.pipeline(transaction=True)
+            for key, series_data in zip(legacy_keys, legacy_hashes):
+                brand_name = key.decode('utf-8')[len(SeriesRepository.PREFIX):]
+                pipe.delete(key)
+                if series_data:
+                    pipe.sadd(key, *series_data.keys())
+                for series_name, models in series_data.items():
+                    models = json.loads(models)
+                    if models:
+                        pipe.sadd(SeriesRepository._redis_models_key(brand_name, series_name.decode('utf-8')), *models)
+            pipe.execute()
+            migrated += len(legacy_keys)
+
+        self.stdout.write(self.style.SUCCESS(f"Migrated {migrated} brand(s) to the set-based series storage."))
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hierarchy_builder.services.cache_rebuild_service import CacheRebuildService
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the Redis hierarchy cache from the database and swaps it in atomically, "
+            "with --verify reports where Redis and the database disagree, or with --repair only "
+            "rebuilds the parts scheduled after an import lost its locks.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Compare Redis with the database instead of rebuilding.')
+        parser.add_argument('--repair', action='store_true',
+                            help='Only rebuild the parts of the cache scheduled for a repair.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per query and Redis commands sent per pipeline.')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            report = CacheRebuildService.verify(chunk_size=options['chunk_size'])
+            self.stdout.write(json.dumps(report, indent=2))
+            if any(entry['count'] for entry in report.values()):
+                raise CommandError("The Redis hierarchy cache does not match the database.")
+            self.stdout.write(self.style.SUCCESS("The Redis hierarchy cache matches the database."))
+            return
+
+        if options['repair']:
+            lock_names = CacheRebuildService.repair_scheduled()
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(lock_names)} part(s) of the hierarchy cache."))
+            return
+
+        result = CacheRebuildService.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the hierarchy cache: {result['keys_written']} key(s) written, "
+            f"{result['stale_keys_removed']} stale key(s) removed, "
+            f"{result['search_entries']} search index entries written."))
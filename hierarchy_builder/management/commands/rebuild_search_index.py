@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from hierarchy_builder.services.search_service import SearchService
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the Redis search index of brands, series and models from the database and swaps it in atomically."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per query and written per ZADD.')
+
+    def handle(self, *args, **options):
+        indexed = SearchService.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index: {indexed} entries written."))
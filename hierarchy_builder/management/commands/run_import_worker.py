@@ -0,0 +1,43 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from hierarchy_builder.services.import_job_service import ImportJobService
+
+
+def _work():
+    stopping = multiprocessing.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    ImportJobService.work(stop=stopping.is_set)
+
+
+class Command(BaseCommand):
+    help = 'Processes queued Excel import jobs with a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.stdout.write(f"Starting {workers} import worker(s)")
+
+        if workers == 1:
+            _work()
+            return
+
+        # Forked workers must not share the parent's database connections. They are not daemonic
+        # because each of them starts its own pool of sheet parsing processes.
+        connections.close_all()
+        processes = [multiprocessing.Process(target=_work) for _ in range(workers)]
+        for process in processes:
+            process.start()
+
+        def terminate(signum, frame):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, terminate)
+        for process in processes:
+            process.join()
@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def _deduplicate(model, parent_field, child_model=None, child_field=None):
+    """
+    Keeps the oldest row of every (parent, name) group, moves the children of the other rows of
+    the group to it and deletes those rows.
+    """
+    group_fields = [parent_field, 'name'] if parent_field else ['name']
+    duplicates = (model.objects.values(*group_fields)
+                  .annotate(keep_id=Min('id'), rows=Count('id'))
+                  .filter(rows__gt=1))
+
+    for group in duplicates.iterator():
+        keep_id = group.pop('keep_id')
+        group.pop('rows')
+        duplicate_ids = list(model.objects.filter(**group).exclude(id=keep_id).values_list('id', flat=True))
+        if child_model is not None:
+            child_model.objects.filter(**{f'{child_field}__in': duplicate_ids}).update(**{child_field: keep_id})
+        model.objects.filter(id__in=duplicate_ids).delete()
+
+
+def deduplicate_hierarchy(apps, schema_editor):
+    DeviceCategory = apps.get_model('hierarchy_builder', 'DeviceCategory')
+    Brand = apps.get_model('hierarchy_builder', 'Brand')
+    Series = apps.get_model('hierarchy_builder', 'Series')
+    DeviceModel = apps.get_model('hierarchy_builder', 'DeviceModel')
+
+    # Parents first: merging two parents can turn their children into duplicates of each other
+    _deduplicate(DeviceCategory, None, Brand, 'category_id')
+    _deduplicate(Brand, 'category_id', Series, 'brand_id')
+    _deduplicate(Series, 'brand_id', DeviceModel, 'series_id')
+    _deduplicate(DeviceModel, 'series_id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hierarchy_builder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_hierarchy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hierarchy_builder', '0002_deduplicate_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='devicecategory',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_device_category_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='brand',
+            constraint=models.UniqueConstraint(fields=('category', 'name'), name='unique_brand_per_category'),
+        ),
+        migrations.AddIndex(
+            model_name='brand',
+            index=models.Index(fields=['name'], name='brand_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='series',
+            constraint=models.UniqueConstraint(fields=('brand', 'name'), name='unique_series_per_brand'),
+        ),
+        migrations.AddConstraint(
+            model_name='devicemodel',
+            constraint=models.UniqueConstraint(fields=('series', 'name'), name='unique_device_model_per_series'),
+        ),
+    ]
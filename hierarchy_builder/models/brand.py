@@ -7,5 +7,13 @@ class Brand(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'name'], name='unique_brand_per_category'),
+        ]
+        indexes = [
+            models.Index(fields=['name'], name='brand_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
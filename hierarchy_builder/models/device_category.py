@@ -5,5 +5,10 @@ class DeviceCategory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_device_category_name'),
+        ]
+
     def __str__(self):
         return self.name
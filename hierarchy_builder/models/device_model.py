@@ -7,5 +7,10 @@ class DeviceModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'name'], name='unique_device_model_per_series'),
+        ]
+
     def __str__(self):
         return self.name
@@ -7,5 +7,10 @@ class Series(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['brand', 'name'], name='unique_series_per_brand'),
+        ]
+
     def __str__(self):
         return self.name
@@ -0,0 +1,91 @@
+import os
+
+from django.conf import settings
+
+from .bundle_reader import BundleWorkbookReader
+from .pandas_reader import PandasWorkbookReader
+from .streaming_reader import StreamingWorkbookReader
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+PANDAS_BACKEND = 'pandas'
+STREAMING_BACKEND = 'streaming'
+CALAMINE_BACKEND = 'calamine'
+BUNDLE_BACKEND = 'bundle'
+BACKENDS = (PANDAS_BACKEND, STREAMING_BACKEND, CALAMINE_BACKEND, BUNDLE_BACKEND)
+
+# Formats only the calamine engine reads; openpyxl, and with it the streaming backend, cannot
+CALAMINE_ONLY_EXTENSIONS = ('.xlsb', '.ods')
+BUNDLE_EXTENSIONS = ('.zip',)
+
+
+def _file_size(excel_file):
+    """
+    Returns the size in bytes of an uploaded file, a file path or a seekable file object.
+    """
+    if hasattr(excel_file, 'size'):
+        return excel_file.size
+    if isinstance(excel_file, (str, os.PathLike)):
+        return os.path.getsize(excel_file)
+
+    position = excel_file.tell()
+    size = excel_file.seek(0, os.SEEK_END)
+    excel_file.seek(position)
+    return size
+
+
+def _file_extension(excel_file):
+    """
+    Returns the lowercased extension of a file path or of the name of an uploaded file or file
+    object, or an empty string if it has none.
+    """
+    name = excel_file if isinstance(excel_file, (str, os.PathLike)) else getattr(excel_file, 'name', None)
+    return os.path.splitext(os.fspath(name))[1].lower() if name else ''
+
+
+def choose_backend(excel_file):
+    """
+    Picks the fastest backend for a file by its type: zip archives are read as CSV/Parquet
+    bundles, .xlsb and .ods with calamine, and other workbooks larger than
+    EXCEL_STREAMING_THRESHOLD_BYTES are streamed to bound memory. The remaining workbooks are read
+    with calamine when python-calamine is installed and with pandas' default engine otherwise.
+    """
+    extension = _file_extension(excel_file)
+    if extension in BUNDLE_EXTENSIONS:
+        return BUNDLE_BACKEND
+    if extension in CALAMINE_ONLY_EXTENSIONS:
+        return CALAMINE_BACKEND
+    if _file_size(excel_file) > settings.EXCEL_STREAMING_THRESHOLD_BYTES:
+        return STREAMING_BACKEND
+    return CALAMINE_BACKEND if python_calamine is not None else PANDAS_BACKEND
+
+
+def get_workbook_reader(excel_file, backend=None):
+    """
+    Opens a workbook with the requested ingestion backend, or with the one `choose_backend`
+    picks for its file type.
+
+    Parameters:
+        excel_file: An uploaded file, a file path or a binary file object.
+        backend (str, optional): One of 'pandas', 'streaming', 'calamine' or 'bundle'.
+
+    Returns:
+        A reader exposing `sheet_names`, `iter_chunks(sheet_name)` and `close()`.
+    """
+    if backend is None:
+        backend = choose_backend(excel_file)
+
+    if backend == STREAMING_BACKEND:
+        return StreamingWorkbookReader(excel_file, chunk_size=settings.EXCEL_STREAMING_CHUNK_ROWS)
+    if backend == PANDAS_BACKEND:
+        return PandasWorkbookReader(excel_file)
+    if backend == CALAMINE_BACKEND:
+        if python_calamine is None:
+            raise ValueError("The 'calamine' backend requires the 'python-calamine' package.")
+        return PandasWorkbookReader(excel_file, engine='calamine')
+    if backend == BUNDLE_BACKEND:
+        return BundleWorkbookReader(excel_file, chunk_size=settings.EXCEL_STREAMING_CHUNK_ROWS)
+    raise ValueError(f"Unknown ingestion backend '{backend}'.")
@@ -0,0 +1,77 @@
+import os
+import zipfile
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+CSV_EXTENSION = '.csv'
+PARQUET_EXTENSION = '.parquet'
+
+
+class BundleWorkbookReader:
+    """
+    Reads a zip archive holding one CSV or Parquet file per sheet, as sent by machine-generated
+    feeds. A member's file name without its extension is the sheet name and the archive order is
+    the sheet order. Rows are read in DataFrames of at most `chunk_size` rows whose columns follow
+    the same conventions as `pd.read_excel`, so every reader yields the same normalized rows.
+    """
+
+    def __init__(self, excel_file, chunk_size):
+        self.archive = zipfile.ZipFile(excel_file)
+        self.chunk_size = chunk_size
+        self.members = {}
+        for info in self.archive.infolist():
+            name, extension = os.path.splitext(os.path.basename(info.filename))
+            if not info.is_dir() and name and extension.lower() in (CSV_EXTENSION, PARQUET_EXTENSION):
+                self.members[name] = info
+
+    @property
+    def sheet_names(self):
+        return list(self.members)
+
+    @staticmethod
+    def _normalize_columns(df):
+        # pd.read_csv already names empty header cells 'Unnamed: <index>'; Parquet columns may be unnamed too
+        df.columns = [f'Unnamed: {index}' if column is None or column == '' else column
+                      for index, column in enumerate(df.columns)]
+        return df
+
+    def _iter_csv(self, member):
+        with self.archive.open(member) as csv_file:
+            yield from pd.read_csv(csv_file, chunksize=self.chunk_size)
+
+    def _iter_parquet(self, member):
+        if pq is None:
+            raise ValueError("Reading Parquet sheets requires the 'pyarrow' package.")
+        # The footer is read first, and seeking backwards in a compressed zip member decompresses it again
+        parquet = pq.ParquetFile(pa.BufferReader(self.archive.read(member)))
+        for batch in parquet.iter_batches(batch_size=self.chunk_size):
+            yield batch.to_pandas()
+        if parquet.metadata.num_rows == 0:
+            yield parquet.schema_arrow.empty_table().to_pandas()
+
+    def iter_chunks(self, sheet_name):
+        """
+        Yields DataFrames holding consecutive rows of the sheet. A sheet without data rows yields
+        one empty DataFrame with the sheet's columns.
+        """
+        member = self.members[sheet_name]
+        if member.filename.lower().endswith(PARQUET_EXTENSION):
+            chunks = self._iter_parquet(member)
+        else:
+            chunks = self._iter_csv(member)
+
+        emitted = False
+        for df in chunks:
+            emitted = True
+            yield self._normalize_columns(df).dropna(how='all')
+        if not emitted:
+            yield pd.DataFrame()
+
+    def close(self):
+        self.archive.close()
@@ -0,0 +1,24 @@
+import pandas as pd
+
+
+class PandasWorkbookReader:
+    """
+    Reads every sheet of a workbook into a single in-memory DataFrame with `pd.read_excel`, using
+    the given pandas engine, e.g. 'calamine', or pandas' default for the file type.
+    """
+
+    def __init__(self, excel_file, engine=None):
+        self.xls = pd.ExcelFile(excel_file, engine=engine)
+
+    @property
+    def sheet_names(self):
+        return self.xls.sheet_names
+
+    def iter_chunks(self, sheet_name):
+        """
+        Yields the whole sheet as one DataFrame whose columns are the sheet's header row.
+        """
+        yield pd.read_excel(self.xls, sheet_name=sheet_name)
+
+    def close(self):
+        self.xls.close()
@@ -0,0 +1,51 @@
+from itertools import islice
+
+import pandas as pd
+from openpyxl import load_workbook
+
+
+class StreamingWorkbookReader:
+    """
+    Streams the rows of a workbook opened in openpyxl's read-only mode and yields them in
+    DataFrames of at most `chunk_size` rows, so memory stays bounded regardless of sheet size.
+    """
+
+    def __init__(self, excel_file, chunk_size):
+        self.workbook = load_workbook(excel_file, read_only=True, data_only=True, keep_links=False)
+        self.chunk_size = chunk_size
+
+    @property
+    def sheet_names(self):
+        return self.workbook.sheetnames
+
+    @staticmethod
+    def _header(row):
+        # Mirror pd.read_excel, which names columns with an empty header cell 'Unnamed: <index>'
+        return [f'Unnamed: {index}' if value is None else value for index, value in enumerate(row)]
+
+    def iter_chunks(self, sheet_name):
+        """
+        Yields DataFrames holding consecutive rows of the sheet. Every chunk uses the sheet's
+        header row as its columns; a sheet without data rows yields one empty DataFrame.
+        """
+        rows = self.workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            yield pd.DataFrame()
+            return
+
+        columns = self._header(header)
+        width = len(columns)
+        emitted = False
+        while True:
+            chunk = [tuple(row[:width]) + (None,) * (width - len(row)) for row in islice(rows, self.chunk_size)]
+            if not chunk:
+                break
+            emitted = True
+            yield pd.DataFrame(chunk, columns=columns).dropna(how='all')
+
+        if not emitted:
+            yield pd.DataFrame(columns=columns)
+
+    def close(self):
+        self.workbook.close()
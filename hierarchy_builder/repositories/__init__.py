@@ -2,3 +2,13 @@ from .device_category_repository import DeviceCategoryRepository
 from .brand_repository import BrandRepository
 from .series_repository import SeriesRepository
 from .device_model_repository import DeviceModelRepository
+from .hierarchy_cascade_repository import HierarchyCascadeRepository
+from .import_job_repository import ImportJobRepository
+from .import_checkpoint_repository import ImportCheckpointRepository
+from .import_metrics_repository import ImportMetricsRepository
+from .hierarchy_snapshot_repository import HierarchySnapshotRepository
+from .cache_repair_repository import CacheRepairRepository
+from .sheet_fingerprint_repository import SheetFingerprintRepository
+from .search_index_repository import SearchIndexRepository
+from .identity_map import HierarchyIdentityMap
+from .unit_of_work import RedisUnitOfWork
@@ -0,0 +1,18 @@
+from django.conf import settings
+from redis.asyncio import ConnectionPool, Redis
+
+_pool = None
+
+
+def get_async_redis_connection():
+    """
+    Returns a redis.asyncio client for the Redis server of the default cache. Every client shares
+    one connection pool per process, so concurrent requests reuse connections instead of opening
+    their own. Connections are only opened on first use, inside the event loop of the server.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool.from_url(settings.CACHES['default']['LOCATION'],
+                                        max_connections=settings.ASYNC_REDIS_MAX_CONNECTIONS,
+                                        **settings.ASYNC_REDIS_POOL_KWARGS)
+    return Redis(connection_pool=_pool)
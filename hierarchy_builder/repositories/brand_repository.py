@@ -1,10 +1,14 @@
 from hierarchy_builder.models.brand import Brand
 from hierarchy_builder.repositories.device_category_repository import DeviceCategoryRepository
+from hierarchy_builder.repositories.async_redis import get_async_redis_connection
+from hierarchy_builder.repositories.search_index_repository import SearchIndexRepository, BRAND
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
 from django_redis import get_redis_connection
 
 class BrandRepository:
     PREFIX = 'brand|'
     redis_con = get_redis_connection("default")
+    async_redis_con = get_async_redis_connection()
 
     @staticmethod
     def _redis_hash_key(category_name):
@@ -30,6 +34,108 @@ class BrandRepository:
         # Convert byte strings to strings (Redis stores data as bytes)
         return {key.decode('utf-8'): int(value) for key, value in brand_dict.items()}
 
+    @staticmethod
+    def get_brands_by_categories_from_redis(category_names):
+        """
+        Retrieves the brands of many categories from the Redis cache in a single pipelined round trip.
+
+        Parameters:
+            category_names (iterable): The names of the categories for which to retrieve brands.
+
+        Returns:
+            dict: Category names mapped to dictionaries of brand names and their corresponding IDs.
+        """
+        category_names = list(category_names)
+        pipe = BrandRepository.redis_con.pipeline(transaction=False)
+        for category_name in category_names:
+            pipe.hgetall(BrandRepository._redis_hash_key(category_name))
+
+        return {
+            category_name: {key.decode('utf-8'): int(value) for key, value in brand_dict.items()}
+            for category_name, brand_dict in zip(category_names, pipe.execute())
+        }
+
+    @staticmethod
+    def exists_in_redis(name, category_name):
+        """
+        Checks whether a brand is listed in the Redis hash of a category.
+        """
+        return bool(BrandRepository.redis_con.hexists(BrandRepository._redis_hash_key(category_name), name))
+
+    @staticmethod
+    def scan_brands_from_redis(category_name, cursor=0, count=500):
+        """
+        Retrieves one page of the brands of a category from the Redis cache with HSCAN.
+
+        Parameters:
+            category_name (str): The name of the category.
+            cursor (int): The cursor returned for the previous page, or 0 for the first page.
+            count (int): The number of brands to aim for; Redis may return somewhat more or fewer.
+
+        Returns:
+            tuple: A (next_cursor, brands) pair where next_cursor is 0 after the last page and
+            brands maps brand names to their IDs.
+        """
+        next_cursor, brand_dict = BrandRepository.redis_con.hscan(BrandRepository._redis_hash_key(category_name),
+                                                                  cursor=cursor, count=count)
+        return next_cursor, {key.decode('utf-8'): int(value) for key, value in brand_dict.items()}
+
+    @staticmethod
+    def get_brands_by_names_from_redis(names, category_name):
+        """
+        Retrieves the given brands of a category from the Redis cache with one HMGET.
+
+        Returns:
+            dict: The names of the brands that exist mapped to their IDs.
+        """
+        names = list(names)
+        if not names:
+            return {}
+        values = BrandRepository.redis_con.hmget(BrandRepository._redis_hash_key(category_name), names)
+        return {name: int(value) for name, value in zip(names, values) if value is not None}
+
+    @staticmethod
+    async def aget_brands_by_categories_from_redis(category_names):
+        """
+        Async version of `get_brands_by_categories_from_redis`.
+        """
+        category_names = list(category_names)
+        pipe = BrandRepository.async_redis_con.pipeline(transaction=False)
+        for category_name in category_names:
+            pipe.hgetall(BrandRepository._redis_hash_key(category_name))
+
+        return {
+            category_name: {key.decode('utf-8'): int(value) for key, value in brand_dict.items()}
+            for category_name, brand_dict in zip(category_names, await pipe.execute())
+        }
+
+    @staticmethod
+    async def aexists_in_redis(name, category_name):
+        """
+        Async version of `exists_in_redis`.
+        """
+        return bool(await BrandRepository.async_redis_con.hexists(BrandRepository._redis_hash_key(category_name), name))
+
+    @staticmethod
+    async def ascan_brands_from_redis(category_name, cursor=0, count=500):
+        """
+        Async version of `scan_brands_from_redis`.
+        """
+        next_cursor, brand_dict = await BrandRepository.async_redis_con.hscan(
+            BrandRepository._redis_hash_key(category_name), cursor=cursor, count=count)
+        return next_cursor, {key.decode('utf-8'): int(value) for key, value in brand_dict.items()}
+
+    @staticmethod
+    async def aget_brands_by_names_from_redis(names, category_name):
+        """
+        Async version of `get_brands_by_names_from_redis`.
+        """
+        names = list(names)
+        if not names:
+            return {}
+        values = await BrandRepository.async_redis_con.hmget(BrandRepository._redis_hash_key(category_name), names)
+        return {name: int(value) for name, value in zip(names, values) if value is not None}
+
     @staticmethod
     def get_all():
         """
@@ -57,6 +163,20 @@ class BrandRepository:
         """
         return Brand.objects.select_related('category').filter(id=id).first()
 
+    @staticmethod
+    def get_ids_by_names(names, category_id):
+        """
+        Retrieves the database IDs of the brands with the given names in a category.
+
+        Parameters:
+            names (iterable): The names of the brands to look up.
+            category_id (int): The ID of the category the brands belong to.
+
+        Returns:
+            dict: A dictionary where keys are brand names and values are their corresponding IDs.
+        """
+        return dict(Brand.objects.filter(category_id=category_id, name__in=list(names)).values_list('name', 'id'))
+
     @staticmethod
     def create(name, category_name):
         """
@@ -77,17 +197,19 @@ class BrandRepository:
             category = DeviceCategoryRepository.create(category_name)
 
         # Directly create the new brand in the database
-        brand = Brand.objects.create(name=name, category=category)
+        brand, created = Brand.objects.get_or_create(name=name, category=category)
 
         hash_key = BrandRepository._redis_hash_key(category_name)
-        BrandRepository.redis_con.hset(hash_key, name, brand.id)
+        RedisUnitOfWork.writer().hset(hash_key, name, brand.id)
+        SearchIndexRepository.add(BRAND, [(category_name, name)])
 
         return brand
 
     @staticmethod
     def delete(name, category_name):
         """
-        Deletes a brand by its name and category.
+        Deletes a brand by its name and category together with its series and models, and
+        removes all of them from Redis and the search index.
 
         Parameters:
             name (str): The name of the brand to delete.
@@ -96,10 +218,51 @@ class BrandRepository:
         Returns:
             bool: True if the brand was successfully deleted, False otherwise.
         """
-        brand = Brand.objects.filter(name=name, category__name=category_name).first()
-        if brand:
-            hash_key = BrandRepository._redis_hash_key(brand.category.name)
-            BrandRepository.redis_con.hdel(hash_key, name)
-            brand.delete()
-            return True
-        return False
+        # Imported here since the cascade repository builds on this one
+        from hierarchy_builder.repositories.hierarchy_cascade_repository import HierarchyCascadeRepository
+        return HierarchyCascadeRepository.delete_brands([name], category_name)['brands'] > 0
+
+    @staticmethod
+    def bulk_create(names, category_name, identity_map=None):
+        """
+        Creates every brand in `names` that does not exist yet in the given category with a single
+        insert and writes all of them to the category's Redis hash with one HSET. If the category
+        does not exist, it is created first.
+
+        Parameters:
+            names (iterable): The names of the brands to create.
+            category_name (str): The name of the category to which the brands belong.
+            identity_map (HierarchyIdentityMap, optional): Resolves the category and the existing
+                brands without a query and receives the IDs of the created brands.
+
+        Returns:
+            dict: A dictionary where keys are brand names and values are their corresponding IDs.
+        """
+        names = set(names)
+        if not names:
+            return {}
+
+        if identity_map is not None:
+            category_id = identity_map.get_category_id(category_name)
+            if category_id is None:
+                category_id = DeviceCategoryRepository.bulk_create([category_name], identity_map)[category_name]
+            existing = {name: identity_map.brands[(category_name, name)] for name in names
+                        if (category_name, name) in identity_map.brands}
+        else:
+            category = DeviceCategoryRepository.get_by_name(category_name)
+            if not category:
+                category = DeviceCategoryRepository.create(category_name)
+            category_id = category.id
+            existing = {}
+
+        missing = names - existing.keys()
+        # Rows that already exist are skipped by the unique constraint instead of being looked up first
+        Brand.objects.bulk_create([Brand(name=name, category_id=category_id) for name in missing],
+                                  ignore_conflicts=True)
+        brands = {**existing, **BrandRepository.get_ids_by_names(missing, category_id)} if missing else existing
+        if identity_map is not None:
+            identity_map.add_brands(category_name, brands)
+
+        RedisUnitOfWork.writer().hset(BrandRepository._redis_hash_key(category_name), mapping=brands)
+        SearchIndexRepository.add(BRAND, [(category_name, name) for name in brands])
+        return brands
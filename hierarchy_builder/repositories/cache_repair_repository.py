@@ -0,0 +1,40 @@
+from django_redis import get_redis_connection
+
+
+class CacheRepairRepository:
+    """
+    Stores the names of the locks, e.g. 'category|Phones', whose part of the Redis hierarchy cache
+    has to be rebuilt from the database because an import committed changes to it but lost its
+    locks before they reached Redis.
+    """
+    REDIS_KEY = 'cache_repair'
+    redis_con = get_redis_connection("default")
+
+    @staticmethod
+    def add(names):
+        """
+        Schedules the parts of the hierarchy guarded by locks for a rebuild.
+
+        Parameters:
+            names (iterable): The names of the locks.
+        """
+        names = list(names)
+        if names:
+            CacheRepairRepository.redis_con.sadd(CacheRepairRepository.REDIS_KEY, *names)
+
+    @staticmethod
+    def get_all():
+        """
+        Returns:
+            set: The names of the locks whose part of the hierarchy is scheduled for a rebuild.
+        """
+        return {name.decode('utf-8') for name in CacheRepairRepository.redis_con.smembers(CacheRepairRepository.REDIS_KEY)}
+
+    @staticmethod
+    def remove(names):
+        """
+        Unschedules the parts of the hierarchy guarded by locks, e.g. once they were rebuilt.
+        """
+        names = list(names)
+        if names:
+            CacheRepairRepository.redis_con.srem(CacheRepairRepository.REDIS_KEY, *names)
@@ -0,0 +1,59 @@
+import threading
+from contextlib import contextmanager
+
+from redis.client import Pipeline, Redis
+
+_state = threading.local()
+
+
+@contextmanager
+def count_redis_commands(counters):
+    """
+    Adds the Redis commands and round trips the current thread sends through CountingRedis
+    clients inside the block to the 'redis_commands' and 'redis_round_trips' entries of
+    `counters`. Commands of other threads, e.g. a lock renewer or concurrent requests, are not
+    counted.
+    """
+    previous = getattr(_state, 'counters', None)
+    _state.counters = counters
+    try:
+        yield counters
+    finally:
+        _state.counters = previous
+
+
+def _count(commands):
+    counters = getattr(_state, 'counters', None)
+    if counters is not None:
+        counters['redis_commands'] += commands
+        counters['redis_round_trips'] += 1
+
+
+class CountingPipeline(Pipeline):
+    """
+    A pipeline that counts one round trip per execution with every buffered command, and one per
+    command it sends right away, e.g. while watching keys.
+    """
+
+    def immediate_execute_command(self, *args, **options):
+        _count(1)
+        return super().immediate_execute_command(*args, **options)
+
+    def execute(self, raise_on_error=True):
+        if self.command_stack:
+            _count(len(self.command_stack))
+        return super().execute(raise_on_error)
+
+
+class CountingRedis(Redis):
+    """
+    The client class of the default cache (django_redis' REDIS_CLIENT_CLASS option). It counts
+    commands for `count_redis_commands` and otherwise behaves like redis.Redis.
+    """
+
+    def execute_command(self, *args, **options):
+        _count(1)
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return CountingPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
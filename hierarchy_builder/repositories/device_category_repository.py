@@ -1,9 +1,12 @@
 from hierarchy_builder.models.device_category import DeviceCategory
+from hierarchy_builder.repositories.async_redis import get_async_redis_connection
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
 from django_redis import get_redis_connection
 
 class DeviceCategoryRepository:
     REDIS_HASH_KEY = 'device_category'
     redis_con = get_redis_connection("default")
+    async_redis_con = get_async_redis_connection()
 
     @staticmethod
     def get_all_from_redis():
@@ -16,6 +19,29 @@ class DeviceCategoryRepository:
         category_dict = DeviceCategoryRepository.redis_con.hgetall(DeviceCategoryRepository.REDIS_HASH_KEY)
         return {key.decode('utf-8'): int(value) for key, value in category_dict.items()}
 
+    @staticmethod
+    async def aget_all_from_redis():
+        """
+        Async version of `get_all_from_redis`.
+        """
+        category_dict = await DeviceCategoryRepository.async_redis_con.hgetall(DeviceCategoryRepository.REDIS_HASH_KEY)
+        return {key.decode('utf-8'): int(value) for key, value in category_dict.items()}
+
+    @staticmethod
+    async def aexists_in_redis(name):
+        """
+        Async version of `exists_in_redis`.
+        """
+        return bool(await DeviceCategoryRepository.async_redis_con.hexists(DeviceCategoryRepository.REDIS_HASH_KEY,
+                                                                           name))
+
+    @staticmethod
+    def exists_in_redis(name):
+        """
+        Checks whether a device category is listed in the Redis hash.
+        """
+        return bool(DeviceCategoryRepository.redis_con.hexists(DeviceCategoryRepository.REDIS_HASH_KEY, name))
+
     @staticmethod
     def get_all():
         """
@@ -52,6 +78,19 @@ class DeviceCategoryRepository:
         """
         return DeviceCategory.objects.filter(id=id).first()
 
+    @staticmethod
+    def get_ids_by_names(names):
+        """
+        Retrieves the database IDs of the device categories with the given names.
+
+        Parameters:
+            names (iterable): The names of the categories to look up.
+
+        Returns:
+            dict: A dictionary where keys are category names and values are their corresponding IDs.
+        """
+        return dict(DeviceCategory.objects.filter(name__in=list(names)).values_list('name', 'id'))
+
     @staticmethod
     def create(name):
         """
@@ -67,13 +106,14 @@ class DeviceCategoryRepository:
         """
         # Attempt to create a new device category in the database
         category, created = DeviceCategory.objects.get_or_create(name=name)
-        DeviceCategoryRepository.redis_con.hset(DeviceCategoryRepository.REDIS_HASH_KEY, name, category.id)
+        RedisUnitOfWork.writer().hset(DeviceCategoryRepository.REDIS_HASH_KEY, name, category.id)
         return category
 
     @staticmethod
     def delete(name):
         """
-        Deletes a device category by its name. If the category exists and is deleted, it also removes the corresponding entry from the Redis hash.
+        Deletes a device category by its name together with its brands, series and models, and
+        removes all of them from Redis and the search index.
 
         Parameters:
             name (str): The name of the device category to delete.
@@ -81,9 +121,41 @@ class DeviceCategoryRepository:
         Returns:
             bool: True if the category was deleted, False otherwise.
         """
-        category = DeviceCategory.objects.filter(name=name).first()
-        if category:
-            category.delete()
-            DeviceCategoryRepository.redis_con.hdel(DeviceCategoryRepository.REDIS_HASH_KEY, name)
-            return True
-        return False
+        # Imported here since the cascade repository builds on this one
+        from hierarchy_builder.repositories.hierarchy_cascade_repository import HierarchyCascadeRepository
+        return HierarchyCascadeRepository.delete_categories([name])['device_categories'] > 0
+
+    @staticmethod
+    def bulk_create(names, identity_map=None):
+        """
+        Creates every device category in `names` that does not exist yet with a single insert
+        and writes all of them to the Redis hash with one HSET.
+
+        Parameters:
+            names (iterable): The names of the device categories to create.
+            identity_map (HierarchyIdentityMap, optional): Resolves existing categories without a
+                query and receives the IDs of the created ones.
+
+        Returns:
+            dict: A dictionary where keys are category names and values are their corresponding IDs.
+        """
+        names = set(names)
+        if not names:
+            return {}
+
+        if identity_map is not None:
+            existing = {name: identity_map.get_category_id(name) for name in names
+                        if identity_map.get_category_id(name) is not None}
+        else:
+            existing = {}
+
+        missing = names - existing.keys()
+        # Rows that already exist are skipped by the unique constraint instead of being looked up first
+        DeviceCategory.objects.bulk_create([DeviceCategory(name=name) for name in missing], ignore_conflicts=True)
+        # MySQL does not return primary keys from bulk inserts, so read them back in one query
+        categories = {**existing, **DeviceCategoryRepository.get_ids_by_names(missing)} if missing else existing
+        if identity_map is not None:
+            identity_map.add_categories(categories)
+
+        RedisUnitOfWork.writer().hset(DeviceCategoryRepository.REDIS_HASH_KEY, mapping=categories)
+        return categories
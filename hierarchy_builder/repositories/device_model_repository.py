@@ -1,16 +1,21 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
 from hierarchy_builder.models.device_model import DeviceModel
+from hierarchy_builder.repositories.search_index_repository import SearchIndexRepository, MODEL
 from hierarchy_builder.repositories.series_repository import SeriesRepository
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
 from django_redis import get_redis_connection
-import json
 
 class DeviceModelRepository:
-    PREFIX = 'series|'
     redis_con = get_redis_connection("default")
 
     @staticmethod
-    def _redis_series_key(brand_name):
-        """Constructs the Redis key for storing series related to a brand."""
-        return f"{DeviceModelRepository.PREFIX}{brand_name}"
+    def _redis_models_key(brand_name, series_name):
+        """Constructs the Redis key of the set of model names of a series."""
+        return SeriesRepository._redis_models_key(brand_name, series_name)
 
     @staticmethod
     def get_all():
@@ -54,12 +59,10 @@ class DeviceModelRepository:
         if not series:
             raise ValueError(f"Series with name '{series_name}' for brand '{brand_name}' does not exist.")
 
-        device_model = DeviceModel.objects.create(name=name, series=series)
+        device_model, created = DeviceModel.objects.get_or_create(name=name, series=series)
 
-        redis_key = DeviceModelRepository._redis_series_key(series.brand.name)
-        models_list = json.loads(DeviceModelRepository.redis_con.hget(redis_key, series.name) or '[]')
-        models_list.append(name)
-        DeviceModelRepository.redis_con.hset(redis_key, series.name, json.dumps(models_list))
+        RedisUnitOfWork.writer().sadd(DeviceModelRepository._redis_models_key(series.brand.name, series.name), name)
+        SearchIndexRepository.add(MODEL, [(series.brand.name, series.name, name)])
 
         return device_model
 
@@ -83,12 +86,101 @@ class DeviceModelRepository:
         ).first()
 
         if device_model:
-            redis_key = DeviceModelRepository._redis_series_key(brand_name)
-            models_list = json.loads(DeviceModelRepository.redis_con.hget(redis_key, series_name) or '[]')
-            if model_name in models_list:
-                models_list.remove(model_name)
-                DeviceModelRepository.redis_con.hset(redis_key, series_name, json.dumps(models_list))
+            RedisUnitOfWork.writer().srem(DeviceModelRepository._redis_models_key(brand_name, series_name), model_name)
+            SearchIndexRepository.remove(MODEL, [(brand_name, series_name, model_name)])
 
             device_model.delete()
             return True
         return False
+
+    @staticmethod
+    def bulk_create(models_by_series, brand_name, category_name=None, identity_map=None):
+        """
+        Creates the given device models of a brand with a single insert and adds them to the
+        Redis set of their series with one SADD per series. Models that already exist are skipped
+        by the unique constraint on (series, name).
+
+        Parameters:
+            models_by_series (dict): Series names mapped to the names of the models to create.
+            brand_name (str): The name of the Brand to which the series and models belong.
+            category_name (str, optional): The name of the brand's category, used to pick the right
+                brand from the identity map.
+            identity_map (HierarchyIdentityMap, optional): Resolves the brand and series without a query.
+
+        Returns:
+            int: The number of device models actually inserted, without the skipped ones.
+        """
+        models_by_series = {series: models for series, models in models_by_series.items() if models}
+        if not models_by_series:
+            return 0
+
+        brand_id = SeriesRepository.resolve_brand_id(brand_name, category_name, identity_map)
+        if identity_map is not None:
+            series_ids = {name: identity_map.get_series_id(brand_id, name) for name in models_by_series
+                          if identity_map.get_series_id(brand_id, name) is not None}
+        else:
+            series_ids = SeriesRepository.get_ids_by_names(models_by_series.keys(), brand_id) if brand_id else {}
+
+        missing = models_by_series.keys() - series_ids.keys()
+        if missing:
+            raise ValueError(f"Series with name '{sorted(missing)[0]}' for brand '{brand_name}' does not exist.")
+
+        # ignore_conflicts hides which rows were skipped, so the rows in scope are counted around
+        # the insert. Both counts may include other models of the series, which cancel out.
+        names = {name for models in models_by_series.values() for name in models}
+        in_scope = DeviceModel.objects.filter(series_id__in=series_ids.values(), name__in=names)
+        existing_count = in_scope.count()
+        DeviceModel.objects.bulk_create([
+            DeviceModel(name=name, series_id=series_ids[series_name])
+            for series_name, models in models_by_series.items()
+            for name in models
+        ], ignore_conflicts=True)
+        inserted = in_scope.count() - existing_count
+
+        redis = RedisUnitOfWork.writer()
+        for series_name, models in models_by_series.items():
+            redis.sadd(DeviceModelRepository._redis_models_key(brand_name, series_name), *models)
+        SearchIndexRepository.add(MODEL, [(brand_name, series_name, name) for series_name, models
+                                          in models_by_series.items() for name in models])
+
+        return inserted
+
+    @staticmethod
+    def bulk_delete(models_by_series, brand_name, brand_ids=None):
+        """
+        Deletes the given device models of the brands with the given name with a single delete
+        statement and removes them from the Redis set of their series with one SREM per series.
+
+        Parameters:
+            models_by_series (dict): Series names mapped to the names of the models to delete.
+            brand_name (str): The name of the brand the series and models belong to.
+            brand_ids (iterable, optional): Only deletes the models of these brands with the name,
+                e.g. of one category. Models that same-name brands still have stay in the Redis
+                sets and the search index they share.
+
+        Returns:
+            int: The number of deleted device models.
+        """
+        models_by_series = {series: list(models) for series, models in models_by_series.items() if models}
+        if not models_by_series:
+            return 0
+
+        condition = reduce(or_, (Q(series__name=series_name, name__in=models)
+                                 for series_name, models in models_by_series.items()))
+        if brand_ids is None:
+            deleted, rows_by_model = DeviceModel.objects.filter(condition, series__brand__name=brand_name).delete()
+            remaining = set()
+        else:
+            deleted, rows_by_model = DeviceModel.objects.filter(condition, series__brand_id__in=brand_ids).delete()
+            remaining = set(DeviceModel.objects.filter(condition, series__brand__name=brand_name)
+                            .values_list('series__name', 'name'))
+
+        models_by_series = {series_name: [name for name in models if (series_name, name) not in remaining]
+                            for series_name, models in models_by_series.items()}
+        redis = RedisUnitOfWork.writer()
+        for series_name, models in models_by_series.items():
+            if models:
+                redis.srem(DeviceModelRepository._redis_models_key(brand_name, series_name), *models)
+        SearchIndexRepository.remove(MODEL, [(brand_name, series_name, name) for series_name, models
+                                             in models_by_series.items() for name in models])
+        return rows_by_model.get(DeviceModel._meta.label, 0)
@@ -0,0 +1,170 @@
+from collections import defaultdict
+
+from hierarchy_builder.models import DeviceCategory, Brand, Series, DeviceModel
+from hierarchy_builder.repositories.device_category_repository import DeviceCategoryRepository
+from hierarchy_builder.repositories.brand_repository import BrandRepository
+from hierarchy_builder.repositories.search_index_repository import SearchIndexRepository, BRAND, SERIES, MODEL
+from hierarchy_builder.repositories.series_repository import SeriesRepository
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+
+
+class HierarchyCascadeRepository:
+    """
+    Deletes categories and brands together with everything below them. The affected subtree is
+    gathered with a few queries, every table is cleared with one queryset delete from the bottom up,
+    and the Redis keys of the subtree are dropped with UNLINK in the unit of work pipeline.
+
+    The series and models sets in Redis are keyed by brand name only, so brands with the same
+    name in other categories share them. Those shared keys are rewritten from the rows that remain
+    instead of being dropped, and the search index keeps the series and models they still list.
+    """
+
+    @staticmethod
+    def _delete(queryset):
+        """
+        Deletes the rows of a queryset through the ORM, so delete signals and on_delete rules keep
+        applying. Children are always deleted first, which leaves the collector nothing to cascade.
+
+        Returns:
+            int: The number of deleted rows of the queryset's own model.
+        """
+        deleted, rows_by_model = queryset.delete()
+        return rows_by_model.get(queryset.model._meta.label, 0)
+
+    @staticmethod
+    def get_brand_subtrees(brand_ids):
+        """
+        Lists the series and models that deleting brands deletes with them, with a single query
+        and without deleting anything, e.g. for a dry run.
+
+        Parameters:
+            brand_ids (iterable): The IDs of the brands.
+
+        Returns:
+            tuple: A (series, device_models) pair of lists of (brand_name, series_name) and
+            (brand_name, series_name, model_name) tuples.
+        """
+        series, device_models = {}, []
+        for series_id, brand_name, series_name, model_name in (Series.objects.filter(brand_id__in=list(brand_ids))
+                                                               .values_list('id', 'brand__name', 'name',
+                                                                            'device_models__name')):
+            series[series_id] = (brand_name, series_name)
+            if model_name is not None:
+                device_models.append((brand_name, series_name, model_name))
+        return list(series.values()), device_models
+
+    @staticmethod
+    def _delete_brand_subtrees(brands):
+        """
+        Deletes brands with their series and models.
+
+        Parameters:
+            brands (list): (category_name, brand_name, brand_id) triples of the brands to delete.
+
+        Returns:
+            dict: The number of deleted brands, series and device models.
+        """
+        brand_ids = [brand_id for _, _, brand_id in brands]
+        brand_names = {brand_name for _, brand_name, _ in brands}
+        if not brand_ids:
+            return {'brands': 0, 'series': 0, 'device_models': 0}
+
+        deleted_series = set(Series.objects.filter(brand_id__in=brand_ids).values_list('brand__name', 'name'))
+        remaining_series = defaultdict(set)
+        for brand_name, series_name in (Series.objects.filter(brand__name__in=brand_names)
+                                        .exclude(brand_id__in=brand_ids).values_list('brand__name', 'name')):
+            remaining_series[brand_name].add(series_name)
+
+        shared_series = {(brand_name, series_name) for brand_name, series_name in deleted_series
+                         if series_name in remaining_series.get(brand_name, ())}
+        remaining_models = defaultdict(set)
+        if shared_series:
+            shared_brand_names = {brand_name for brand_name, _ in shared_series}
+            rows = (DeviceModel.objects.filter(series__brand__name__in=shared_brand_names)
+                    .exclude(series__brand_id__in=brand_ids)
+                    .values_list('series__brand__name', 'series__name', 'name'))
+            for brand_name, series_name, model_name in rows:
+                if (brand_name, series_name) in shared_series:
+                    remaining_models[(brand_name, series_name)].add(model_name)
+
+        deleted_models = list(DeviceModel.objects.filter(series__brand_id__in=brand_ids)
+                              .values_list('series__brand__name', 'series__name', 'name'))
+
+        counts = {
+            'device_models': HierarchyCascadeRepository._delete(
+                DeviceModel.objects.filter(series__brand_id__in=brand_ids)),
+            'series': HierarchyCascadeRepository._delete(Series.objects.filter(brand_id__in=brand_ids)),
+            'brands': HierarchyCascadeRepository._delete(Brand.objects.filter(id__in=brand_ids)),
+        }
+
+        redis = RedisUnitOfWork.writer()
+        redis.unlink(*[SeriesRepository._redis_series_key(brand_name) for brand_name in brand_names],
+                     *[SeriesRepository._redis_models_key(brand_name, series_name)
+                       for brand_name, series_name in deleted_series])
+        for brand_name, series_names in remaining_series.items():
+            redis.sadd(SeriesRepository._redis_series_key(brand_name), *series_names)
+        for (brand_name, series_name), models in remaining_models.items():
+            redis.sadd(SeriesRepository._redis_models_key(brand_name, series_name), *models)
+
+        SearchIndexRepository.remove(BRAND, [(category_name, brand_name) for category_name, brand_name, _ in brands])
+        SearchIndexRepository.remove(SERIES, deleted_series - shared_series)
+        SearchIndexRepository.remove(MODEL, [(brand_name, series_name, model_name)
+                                             for brand_name, series_name, model_name in deleted_models
+                                             if model_name not in remaining_models.get((brand_name, series_name), ())])
+        return counts
+
+    @staticmethod
+    def delete_categories(names, identity_map=None):
+        """
+        Deletes device categories with their brands, series and models, and drops the category
+        entries, brand hashes and series and models sets from Redis.
+
+        Parameters:
+            names (iterable): The names of the device categories to delete.
+            identity_map (HierarchyIdentityMap, optional): Forgets the deleted rows.
+
+        Returns:
+            dict: The number of deleted device categories, brands, series and device models.
+        """
+        names = list(names)
+        if not names:
+            return {'device_categories': 0, 'brands': 0, 'series': 0, 'device_models': 0}
+
+        brands = list(Brand.objects.filter(category__name__in=names).values_list('category__name', 'name', 'id'))
+        counts = HierarchyCascadeRepository._delete_brand_subtrees(brands)
+        counts['device_categories'] = HierarchyCascadeRepository._delete(
+            DeviceCategory.objects.filter(name__in=names))
+        if identity_map is not None:
+            identity_map.remove_categories(names)
+
+        redis = RedisUnitOfWork.writer()
+        redis.hdel(DeviceCategoryRepository.REDIS_HASH_KEY, *names)
+        redis.unlink(*[BrandRepository._redis_hash_key(name) for name in names])
+        return counts
+
+    @staticmethod
+    def delete_brands(names, category_name, identity_map=None):
+        """
+        Deletes brands of a category with their series and models, and removes them from the
+        category's Redis hash together with their series and models sets.
+
+        Parameters:
+            names (iterable): The names of the brands to delete.
+            category_name (str): The name of the category the brands belong to.
+            identity_map (HierarchyIdentityMap, optional): Forgets the deleted rows.
+
+        Returns:
+            dict: The number of deleted brands, series and device models.
+        """
+        names = list(names)
+        if not names:
+            return {'brands': 0, 'series': 0, 'device_models': 0}
+
+        brands = list(Brand.objects.filter(category__name=category_name, name__in=names)
+                      .values_list('category__name', 'name', 'id'))
+        counts = HierarchyCascadeRepository._delete_brand_subtrees(brands)
+        if identity_map is not None:
+            identity_map.remove_brands([(category_name, name) for name in names])
+
+        RedisUnitOfWork.writer().hdel(BrandRepository._redis_hash_key(category_name), *names)
+        return counts
@@ -0,0 +1,169 @@
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+
+
+class HierarchyLockRepository:
+    """
+    Stores leased locks on parts of the hierarchy, e.g. 'category|Phones', as keys holding the
+    fencing token of their holder. Tokens come from one counter, so every lock session has a
+    token no other session ever had. Every fenced flush bumps a generation counter and stamps
+    the locks it was made under with the new generation, so an import can tell whether others
+    changed a part of the hierarchy since it last looked.
+    """
+    PREFIX = 'hierarchy_lock|'
+    FENCE_KEY = 'hierarchy_lock_fence'
+    GENERATION_KEY = 'hierarchy_generation'
+    GENERATION_PREFIX = 'hierarchy_generation|'
+    redis_con = get_redis_connection("default")
+
+    # Takes every lock or none, so that a session never holds some locks while waiting for others
+    # of the same request. Locks the session already holds are extended. KEYS holds the current
+    # generation, the lock keys and then their generation keys.
+    _acquire_script = redis_con.register_script("""
+        local count = (#KEYS - 1) / 2
+        for i = 2, count + 1 do
+            local holder = redis.call('GET', KEYS[i])
+            if holder and holder ~= ARGV[1] then
+                return false
+            end
+        end
+        local generations = {tonumber(redis.call('GET', KEYS[1]) or '0')}
+        for i = 2, count + 1 do
+            redis.call('SET', KEYS[i], ARGV[1], 'PX', ARGV[2])
+            generations[i] = tonumber(redis.call('GET', KEYS[i + count]) or '0')
+        end
+        return generations
+    """)
+
+    # Bumps the generation and stamps the generation keys of the locks with it
+    _bump_script = redis_con.register_script("""
+        local generation = redis.call('INCR', KEYS[1])
+        for i = 2, #KEYS do
+            redis.call('SET', KEYS[i], generation)
+        end
+        return generation
+    """)
+
+    _renew_script = redis_con.register_script("""
+        local renewed = 0
+        for i = 1, #KEYS do
+            if redis.call('GET', KEYS[i]) == ARGV[1] then
+                redis.call('PEXPIRE', KEYS[i], ARGV[2])
+                renewed = renewed + 1
+            end
+        end
+        return renewed
+    """)
+
+    _release_script = redis_con.register_script("""
+        for i = 1, #KEYS do
+            if redis.call('GET', KEYS[i]) == ARGV[1] then
+                redis.call('DEL', KEYS[i])
+            end
+        end
+        return 0
+    """)
+
+    @staticmethod
+    def _redis_keys(names):
+        """Constructs the Redis keys of locks."""
+        return [f"{HierarchyLockRepository.PREFIX}{name}" for name in names]
+
+    @staticmethod
+    def _generation_keys(names):
+        """Constructs the Redis keys holding the generation of the last flush made under locks."""
+        return [f"{HierarchyLockRepository.GENERATION_PREFIX}{name}" for name in names]
+
+    @staticmethod
+    def next_token():
+        """
+        Returns a new fencing token, greater than every token handed out before.
+        """
+        return HierarchyLockRepository.redis_con.incr(HierarchyLockRepository.FENCE_KEY)
+
+    @staticmethod
+    def get_generation():
+        """
+        Returns the number of fenced flushes made so far, which is the generation of the latest.
+        """
+        return int(HierarchyLockRepository.redis_con.get(HierarchyLockRepository.GENERATION_KEY) or 0)
+
+    @staticmethod
+    def acquire(names, token, lease_ms):
+        """
+        Takes locks for a session in one atomic step, unless another session holds any of them.
+
+        Parameters:
+            names (iterable): The names of the locks.
+            token (int): The fencing token of the session.
+            lease_ms (int): The number of milliseconds after which the locks expire unless renewed.
+
+        Returns:
+            tuple: A (generation, generations) pair of the current generation and a dictionary of
+            the generation of the last flush made under each lock if every lock was taken,
+            otherwise None.
+        """
+        names = list(names)
+        keys = ([HierarchyLockRepository.GENERATION_KEY] + HierarchyLockRepository._redis_keys(names) +
+                HierarchyLockRepository._generation_keys(names))
+        generations = HierarchyLockRepository._acquire_script(keys=keys, args=[token, lease_ms])
+        if not generations:
+            return None
+        return generations[0], dict(zip(names, generations[1:]))
+
+    @staticmethod
+    def renew(names, token, lease_ms):
+        """
+        Extends the lease of the locks a session still holds.
+
+        Returns:
+            int: The number of locks that were still held.
+        """
+        return HierarchyLockRepository._renew_script(keys=HierarchyLockRepository._redis_keys(names),
+                                                     args=[token, lease_ms])
+
+    @staticmethod
+    def release(names, token):
+        """
+        Releases the locks a session still holds, leaving those taken over by other sessions alone.
+        """
+        if names:
+            HierarchyLockRepository._release_script(keys=HierarchyLockRepository._redis_keys(names), args=[token])
+
+    @staticmethod
+    def execute_fenced(pipeline, names, token):
+        """
+        Executes the writes buffered in a pipeline in one MULTI/EXEC only if the session still
+        holds every lock when Redis runs it, and bumps the generation of the locks with them. The
+        lock keys are watched, so a lease that expires or is taken over between the check and
+        EXEC aborts the writes.
+
+        Parameters:
+            pipeline (Pipeline): The pipeline holding the buffered writes.
+            names (iterable): The names of the locks the writes require.
+            token (int): The fencing token of the session.
+
+        Returns:
+            int: The generation after the flush, or None if a lock was lost and nothing was written.
+        """
+        keys = HierarchyLockRepository._redis_keys(names)
+        fenced = HierarchyLockRepository.redis_con.pipeline(transaction=True)
+        try:
+            if keys:
+                fenced.watch(*keys)
+                holders = fenced.mget(keys)
+                if not all(holder is not None and int(holder) == token for holder in holders):
+                    return None
+            fenced.multi()
+            # WATCH has to come before the writes, so they are replayed from the buffering pipeline
+            for args, options in pipeline.command_stack:
+                fenced.pipeline_execute_command(*args, **options)
+            HierarchyLockRepository._bump_script(
+                keys=[HierarchyLockRepository.GENERATION_KEY] + HierarchyLockRepository._generation_keys(names),
+                client=fenced)
+            return fenced.execute()[-1]
+        except WatchError:
+            return None
+        finally:
+            fenced.reset()
+            pipeline.reset()
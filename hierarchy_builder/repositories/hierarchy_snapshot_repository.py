@@ -0,0 +1,106 @@
+from collections import namedtuple
+from django_redis import get_redis_connection
+
+from hierarchy_builder.repositories.async_redis import get_async_redis_connection
+
+HierarchySnapshot = namedtuple('HierarchySnapshot', ['version', 'content', 'updated_at', 'etag', 'encodings'])
+
+
+class HierarchySnapshotRepository:
+    REDIS_HASH_KEY = 'hierarchy_snapshot'
+    VERSION_KEY = 'hierarchy_snapshot_version'
+    ENCODING_PREFIX = 'content:'
+    redis_con = get_redis_connection("default")
+    async_redis_con = get_async_redis_connection()
+
+    # Bumps the version and replaces the stored snapshot atomically, so readers never see a
+    # version number paired with the content of another version. A snapshot built from an older
+    # hierarchy generation than the stored one is refused, as a slow build would otherwise replace
+    # newer content.
+    _save_script = redis_con.register_script("""
+        local stored = tonumber(redis.call('HGET', KEYS[1], 'generation') or '-1')
+        if stored > tonumber(ARGV[1]) then
+            return false
+        end
+        local version = redis.call('INCR', KEYS[2])
+        redis.call('DEL', KEYS[1])
+        redis.call('HSET', KEYS[1], 'version', version, 'generation', unpack(ARGV))
+        return version
+    """)
+
+    @staticmethod
+    def get_version():
+        """
+        Retrieves the version of the stored snapshot with a single GET.
+
+        Returns:
+            int: The snapshot version, or None if no snapshot has been stored yet.
+        """
+        version = HierarchySnapshotRepository.redis_con.get(HierarchySnapshotRepository.VERSION_KEY)
+        return int(version) if version is not None else None
+
+    @staticmethod
+    async def aget_version():
+        """
+        Async version of `get_version`.
+        """
+        version = await HierarchySnapshotRepository.async_redis_con.get(HierarchySnapshotRepository.VERSION_KEY)
+        return int(version) if version is not None else None
+
+    @staticmethod
+    def _from_hash(data):
+        if not data:
+            return None
+
+        prefix = HierarchySnapshotRepository.ENCODING_PREFIX.encode('utf-8')
+        encodings = {key[len(prefix):].decode('utf-8'): value for key, value in data.items() if key.startswith(prefix)}
+        return HierarchySnapshot(version=int(data[b'version']), content=data[b'content'],
+                                 updated_at=float(data[b'updated_at']), etag=data[b'etag'].decode('utf-8'),
+                                 encodings=encodings)
+
+    @staticmethod
+    async def aget():
+        """
+        Async version of `get`.
+        """
+        data = await HierarchySnapshotRepository.async_redis_con.hgetall(HierarchySnapshotRepository.REDIS_HASH_KEY)
+        return HierarchySnapshotRepository._from_hash(data)
+
+    @staticmethod
+    def get():
+        """
+        Retrieves the stored snapshot.
+
+        Returns:
+            HierarchySnapshot: The snapshot, or None if no snapshot has been stored yet.
+        """
+        data = HierarchySnapshotRepository.redis_con.hgetall(HierarchySnapshotRepository.REDIS_HASH_KEY)
+        return HierarchySnapshotRepository._from_hash(data)
+
+    @staticmethod
+    def save(generation, content, updated_at, etag, encodings):
+        """
+        Stores a new snapshot under the next version number, unless the stored snapshot was built
+        from a newer generation of the hierarchy.
+
+        Parameters:
+            generation (int): The hierarchy generation read before the hierarchy was serialized.
+            content (bytes): The serialized hierarchy.
+            updated_at (float): The UNIX timestamp at which the hierarchy was built.
+            etag (str): A hash of the content.
+            encodings (dict): Content encodings, e.g. 'gzip', mapped to the compressed content.
+
+        Returns:
+            HierarchySnapshot: The stored snapshot, or None if it was refused.
+        """
+        fields = [generation, 'content', content, 'updated_at', repr(updated_at), 'etag', etag]
+        for encoding, compressed in encodings.items():
+            fields += [f"{HierarchySnapshotRepository.ENCODING_PREFIX}{encoding}", compressed]
+
+        version = HierarchySnapshotRepository._save_script(
+            keys=[HierarchySnapshotRepository.REDIS_HASH_KEY, HierarchySnapshotRepository.VERSION_KEY],
+            args=fields)
+        if version is None:
+            return None
+        return HierarchySnapshot(version=int(version), content=content, updated_at=updated_at, etag=etag,
+                                 encodings=encodings)
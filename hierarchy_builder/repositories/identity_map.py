@@ -0,0 +1,94 @@
+from hierarchy_builder.models.device_category import DeviceCategory
+from hierarchy_builder.models.brand import Brand
+from hierarchy_builder.models.series import Series
+
+
+class HierarchyIdentityMap:
+    """
+    Resolves category, brand and series names to database IDs in memory for the duration of an
+    import. It is preloaded with one query per table and kept up to date by the bulk repository
+    methods, so foreign keys never need a lookup query of their own.
+    """
+
+    def __init__(self):
+        self.categories = {}
+        self.brands = {}
+        self.series = {}
+        self._brands_by_name = {}
+
+    def load(self):
+        """
+        Loads the names and IDs of every category, brand and series.
+
+        Returns:
+            HierarchyIdentityMap: The loaded map, for chaining.
+        """
+        self.categories = dict(DeviceCategory.objects.values_list('name', 'id'))
+        self.brands = {}
+        self._brands_by_name = {}
+        for category_name, brand_name, brand_id in Brand.objects.values_list('category__name', 'name', 'id'):
+            self._add_brand(category_name, brand_name, brand_id)
+        self.series = {(brand_id, name): series_id for brand_id, name, series_id in
+                       Series.objects.values_list('brand_id', 'name', 'id')}
+        return self
+
+    def _add_brand(self, category_name, brand_name, brand_id):
+        self.brands[(category_name, brand_name)] = brand_id
+        # Mirrors BrandRepository.get_by_name, which returns the first brand with a name
+        self._brands_by_name.setdefault(brand_name, brand_id)
+
+    def get_category_id(self, category_name):
+        return self.categories.get(category_name)
+
+    def get_brand_id(self, brand_name, category_name=None):
+        """
+        Returns the ID of a brand within a category or, when no category is given or the brand is
+        not found under it, the ID of the first brand with that name.
+        """
+        brand_id = self.brands.get((category_name, brand_name)) if category_name is not None else None
+        return brand_id if brand_id is not None else self._brands_by_name.get(brand_name)
+
+    def get_brand_ids(self, brand_name):
+        """Returns the IDs of the brands with a name in every category."""
+        return [brand_id for (_, name), brand_id in self.brands.items() if name == brand_name]
+
+    def get_series_id(self, brand_id, series_name):
+        return self.series.get((brand_id, series_name))
+
+    def add_categories(self, categories):
+        """Registers category names mapped to their IDs."""
+        self.categories.update(categories)
+
+    def add_brands(self, category_name, brands):
+        """Registers the brand names of a category mapped to their IDs."""
+        for brand_name, brand_id in brands.items():
+            self._add_brand(category_name, brand_name, brand_id)
+
+    def add_series(self, brand_id, series):
+        """Registers the series names of a brand mapped to their IDs."""
+        for series_name, series_id in series.items():
+            self.series[(brand_id, series_name)] = series_id
+
+    def remove_categories(self, category_names):
+        """Forgets categories together with the brands and series that were deleted with them."""
+        category_names = set(category_names)
+        for name in category_names:
+            self.categories.pop(name, None)
+        self.remove_brands([key for key in self.brands if key[0] in category_names])
+
+    def remove_brands(self, brand_keys):
+        """Forgets (category_name, brand_name) brands together with their series."""
+        brand_ids = {self.brands.pop(key) for key in brand_keys if key in self.brands}
+        if not brand_ids:
+            return
+
+        self._brands_by_name = {name: brand_id for name, brand_id in self._brands_by_name.items()
+                                if brand_id not in brand_ids}
+        for (category_name, brand_name), brand_id in self.brands.items():
+            self._brands_by_name.setdefault(brand_name, brand_id)
+        self.remove_series([key for key in self.series if key[0] in brand_ids])
+
+    def remove_series(self, series_keys):
+        """Forgets (brand_id, series_name) series."""
+        for key in series_keys:
+            self.series.pop(key, None)
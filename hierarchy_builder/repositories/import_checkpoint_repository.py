@@ -0,0 +1,89 @@
+import json
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+
+
+class ImportCheckpointRepository:
+    """
+    Stores how far a chunked import got: the sheets it completed and, for '-Series' sheets, the
+    brands of every chunk it committed. Brands are recorded by chunk position and name rather
+    than by how many units were applied, as which brands a run applies depends on the stored
+    fingerprints at the time. Writes go through the unit of work, so a checkpoint is only stored
+    together with the rows it covers.
+    """
+    PREFIX = 'import_checkpoint|'
+    BRANDS_PREFIX = 'import_checkpoint_brands|'
+    redis_con = get_redis_connection("default")
+
+    @staticmethod
+    def _redis_key(job_id):
+        """Constructs the Redis hash key holding the completed sheets of an import job."""
+        return f"{ImportCheckpointRepository.PREFIX}{job_id}"
+
+    @staticmethod
+    def _redis_brands_key(job_id):
+        """Constructs the Redis hash key holding the committed brands of an import job."""
+        return f"{ImportCheckpointRepository.BRANDS_PREFIX}{job_id}"
+
+    @staticmethod
+    def save_sheet(job_id, sheet_name):
+        """
+        Records that a sheet was imported completely.
+
+        Parameters:
+            job_id (str): The identifier of the job.
+            sheet_name (str): The name of the sheet.
+        """
+        writer = RedisUnitOfWork.writer()
+        writer.hset(ImportCheckpointRepository._redis_key(job_id), sheet_name, 1)
+        writer.expire(ImportCheckpointRepository._redis_key(job_id), settings.IMPORT_JOB_TTL)
+
+    @staticmethod
+    def save_brands(job_id, sheet_name, chunk_index, brand_names):
+        """
+        Records that the rows of brands in a chunk of a '-Series' sheet were committed.
+
+        Parameters:
+            job_id (str): The identifier of the job.
+            sheet_name (str): The name of the sheet.
+            chunk_index (int): The position of the chunk in the sheet.
+            brand_names (iterable): The names of the committed brands.
+        """
+        fields = {json.dumps([sheet_name, chunk_index, brand_name]): 1 for brand_name in brand_names}
+        if not fields:
+            return
+        writer = RedisUnitOfWork.writer()
+        writer.hset(ImportCheckpointRepository._redis_brands_key(job_id), mapping=fields)
+        writer.expire(ImportCheckpointRepository._redis_brands_key(job_id), settings.IMPORT_JOB_TTL)
+
+    @staticmethod
+    def get(job_id):
+        """
+        Retrieves the checkpoints of an import job in a single round trip.
+
+        Parameters:
+            job_id (str): The identifier of the job.
+
+        Returns:
+            tuple: A (done_sheets, committed_brands) pair of the set of completed sheets and the
+            set of (sheet_name, chunk_index, brand_name) triples committed in other sheets.
+        """
+        pipe = ImportCheckpointRepository.redis_con.pipeline(transaction=False)
+        pipe.hkeys(ImportCheckpointRepository._redis_key(job_id))
+        pipe.hkeys(ImportCheckpointRepository._redis_brands_key(job_id))
+        sheet_fields, brand_fields = pipe.execute()
+
+        done_sheets = {field.decode('utf-8') for field in sheet_fields}
+        committed_brands = {tuple(json.loads(field)) for field in brand_fields}
+        return done_sheets, committed_brands
+
+    @staticmethod
+    def delete(job_id):
+        """
+        Drops the checkpoints of an import job.
+        """
+        ImportCheckpointRepository.redis_con.unlink(ImportCheckpointRepository._redis_key(job_id),
+                                                    ImportCheckpointRepository._redis_brands_key(job_id))
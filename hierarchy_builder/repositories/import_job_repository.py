@@ -0,0 +1,201 @@
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+import json
+
+
+class ImportJobRepository:
+    PREFIX = 'import_job|'
+    SHEETS_PREFIX = 'import_job_sheets|'
+    QUEUE_KEY = 'import_job_queue'
+    # Every worker moves the job it runs into a list of its own, so a job is never lost with its worker
+    PROCESSING_PREFIX = 'import_job_processing|'
+    WORKERS_KEY = 'import_job_workers'
+    redis_con = get_redis_connection("default")
+
+    @staticmethod
+    def _redis_job_key(job_id):
+        """Constructs the Redis hash key holding the state of an import job."""
+        return f"{ImportJobRepository.PREFIX}{job_id}"
+
+    @staticmethod
+    def _redis_sheets_key(job_id):
+        """Constructs the Redis hash key holding the per-sheet progress of an import job."""
+        return f"{ImportJobRepository.SHEETS_PREFIX}{job_id}"
+
+    @staticmethod
+    def _redis_processing_key(worker_id):
+        """Constructs the Redis list key holding the job a worker is running."""
+        return f"{ImportJobRepository.PROCESSING_PREFIX}{worker_id}"
+
+    @staticmethod
+    def create(job_id, **fields):
+        """
+        Stores a new import job and pushes it onto the job queue.
+
+        Parameters:
+            job_id (str): The identifier of the job.
+            **fields: The initial state of the job, e.g. its status and spooled file path.
+        """
+        pipe = ImportJobRepository.redis_con.pipeline()
+        pipe.hset(ImportJobRepository._redis_job_key(job_id), mapping=fields)
+        pipe.expire(ImportJobRepository._redis_job_key(job_id), settings.IMPORT_JOB_TTL)
+        pipe.lpush(ImportJobRepository.QUEUE_KEY, job_id)
+        pipe.execute()
+
+    @staticmethod
+    def requeue(job_id, **fields):
+        """
+        Updates fields of an existing import job and pushes it onto the job queue again.
+        """
+        pipe = ImportJobRepository.redis_con.pipeline()
+        pipe.hset(ImportJobRepository._redis_job_key(job_id), mapping=fields)
+        pipe.lpush(ImportJobRepository.QUEUE_KEY, job_id)
+        pipe.execute()
+
+    @staticmethod
+    def dequeue(worker_id, timeout):
+        """
+        Blocks until a job is queued or the timeout expires, and moves the job into the processing
+        list of the worker, where it stays until `acknowledge` removes it.
+
+        Parameters:
+            worker_id (str): The identifier of the worker.
+            timeout (int): The number of seconds to wait for a job.
+
+        Returns:
+            str: The identifier of the next job, or None if the timeout expired.
+        """
+        # Registered again once a job arrived, in case a sweep dropped the idle worker meanwhile
+        ImportJobRepository.redis_con.sadd(ImportJobRepository.WORKERS_KEY, worker_id)
+        job_id = ImportJobRepository.redis_con.blmove(ImportJobRepository.QUEUE_KEY,
+                                                      ImportJobRepository._redis_processing_key(worker_id),
+                                                      timeout, src='RIGHT', dest='LEFT')
+        if job_id is None:
+            return None
+        ImportJobRepository.redis_con.sadd(ImportJobRepository.WORKERS_KEY, worker_id)
+        return job_id.decode('utf-8')
+
+    @staticmethod
+    def acknowledge(worker_id, job_id):
+        """
+        Removes a job the worker finished from its processing list.
+        """
+        ImportJobRepository.redis_con.lrem(ImportJobRepository._redis_processing_key(worker_id), 1, job_id)
+
+    @staticmethod
+    def get_processing():
+        """
+        Lists the jobs in the processing lists of every worker, and forgets the workers whose
+        processing list is empty.
+
+        Returns:
+            list: (worker_id, job_id) pairs.
+        """
+        worker_ids = [worker_id.decode('utf-8') for worker_id in
+                      ImportJobRepository.redis_con.smembers(ImportJobRepository.WORKERS_KEY)]
+        pipe = ImportJobRepository.redis_con.pipeline(transaction=False)
+        for worker_id in worker_ids:
+            pipe.lrange(ImportJobRepository._redis_processing_key(worker_id), 0, -1)
+
+        processing = []
+        idle_worker_ids = []
+        for worker_id, job_ids in zip(worker_ids, pipe.execute()):
+            processing.extend((worker_id, job_id.decode('utf-8')) for job_id in job_ids)
+            if not job_ids:
+                idle_worker_ids.append(worker_id)
+        if idle_worker_ids:
+            ImportJobRepository.redis_con.srem(ImportJobRepository.WORKERS_KEY, *idle_worker_ids)
+        return processing
+
+    @staticmethod
+    def reclaim(worker_id, job_id, decide):
+        """
+        Takes a job out of the processing list of a worker that stopped, provided neither the job
+        nor the list change meanwhile, e.g. because the worker is still alive after all.
+
+        Parameters:
+            worker_id (str): The identifier of the worker.
+            job_id (str): The identifier of the job.
+            decide (callable): Receives the fields of the job and returns None to leave it alone,
+                or a (fields, requeue) pair of the fields to update on the job and whether to push
+                it onto the job queue again. Jobs that expired are dropped without asking.
+
+        Returns:
+            bool: Whether the job was taken out of the processing list.
+        """
+        processing_key = ImportJobRepository._redis_processing_key(worker_id)
+        with ImportJobRepository.redis_con.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(ImportJobRepository._redis_job_key(job_id), processing_key)
+                job_data = pipe.hgetall(ImportJobRepository._redis_job_key(job_id))
+                if job_id.encode('utf-8') not in pipe.lrange(processing_key, 0, -1):
+                    return False
+                job = {key.decode('utf-8'): value.decode('utf-8') for key, value in job_data.items()}
+                decision = decide(job) if job else (None, False)
+                if decision is None:
+                    return False
+
+                fields, requeue = decision
+                pipe.multi()
+                pipe.lrem(processing_key, 1, job_id)
+                if fields:
+                    pipe.hset(ImportJobRepository._redis_job_key(job_id), mapping=fields)
+                if requeue:
+                    pipe.lpush(ImportJobRepository.QUEUE_KEY, job_id)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    @staticmethod
+    def queue_length():
+        """
+        Returns the number of jobs waiting in the queue.
+        """
+        return ImportJobRepository.redis_con.llen(ImportJobRepository.QUEUE_KEY)
+
+    @staticmethod
+    def update(job_id, **fields):
+        """
+        Updates fields of an import job.
+        """
+        ImportJobRepository.redis_con.hset(ImportJobRepository._redis_job_key(job_id), mapping=fields)
+
+    @staticmethod
+    def update_sheet(job_id, sheet_name, progress):
+        """
+        Stores the progress of a single sheet of an import job.
+
+        Parameters:
+            job_id (str): The identifier of the job.
+            sheet_name (str): The name of the sheet.
+            progress (dict): The JSON-serializable progress of the sheet.
+        """
+        pipe = ImportJobRepository.redis_con.pipeline()
+        pipe.hset(ImportJobRepository._redis_sheets_key(job_id), sheet_name, json.dumps(progress))
+        pipe.expire(ImportJobRepository._redis_sheets_key(job_id), settings.IMPORT_JOB_TTL)
+        pipe.execute()
+
+    @staticmethod
+    def get(job_id):
+        """
+        Retrieves an import job and the progress of its sheets.
+
+        Parameters:
+            job_id (str): The identifier of the job.
+
+        Returns:
+            dict: The job fields with a 'sheets' entry mapping sheet names to their progress,
+            or None if the job does not exist.
+        """
+        pipe = ImportJobRepository.redis_con.pipeline(transaction=False)
+        pipe.hgetall(ImportJobRepository._redis_job_key(job_id))
+        pipe.hgetall(ImportJobRepository._redis_sheets_key(job_id))
+        job_data, sheets_data = pipe.execute()
+        if not job_data:
+            return None
+
+        job = {key.decode('utf-8'): value.decode('utf-8') for key, value in job_data.items()}
+        job['sheets'] = {key.decode('utf-8'): json.loads(value) for key, value in sheets_data.items()}
+        return job
@@ -0,0 +1,34 @@
+from django_redis import get_redis_connection
+
+
+class ImportMetricsRepository:
+    """
+    Keeps the cumulative import metrics of every worker process in one Redis hash whose fields are
+    Prometheus series, e.g. 'excel_import_stage_seconds_total{stage="parse"}'.
+    """
+    REDIS_HASH_KEY = 'import_metrics'
+    redis_con = get_redis_connection("default")
+
+    @staticmethod
+    def increment(series):
+        """
+        Adds values to cumulative series in a single pipelined round trip.
+
+        Parameters:
+            series (dict): Series names mapped to the amount to add.
+        """
+        pipe = ImportMetricsRepository.redis_con.pipeline(transaction=False)
+        for name, value in series.items():
+            pipe.hincrbyfloat(ImportMetricsRepository.REDIS_HASH_KEY, name, value)
+        pipe.execute()
+
+    @staticmethod
+    def get_all():
+        """
+        Retrieves every cumulative series.
+
+        Returns:
+            dict: Series names mapped to their float values.
+        """
+        data = ImportMetricsRepository.redis_con.hgetall(ImportMetricsRepository.REDIS_HASH_KEY)
+        return {name.decode('utf-8'): float(value) for name, value in data.items()}
@@ -0,0 +1,120 @@
+from django_redis import get_redis_connection
+
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+
+BRAND = 'brand'
+SERIES = 'series'
+MODEL = 'model'
+
+
+class SearchIndexRepository:
+    """
+    Keeps a prefix index of brand, series and model names in one Redis sorted set. Every member
+    has score 0 and reads '<casefolded name>\\0<kind>\\0<path>', where the path of a brand is
+    (category, brand), of a series (brand, series) and of a model (brand, series, model), so that
+    ZRANGEBYLEX finds every name starting with a prefix in sorted order. Series and models are
+    indexed under their brand name, like their Redis sets. Writes go through the unit of work.
+    """
+    REDIS_KEY = 'search_index'
+    STAGING_KEY = 'rebuild|search_index'
+    SEPARATOR = '\0'
+    redis_con = get_redis_connection("default")
+
+    @staticmethod
+    def _member(kind, path):
+        """Constructs the sorted set member of a brand, series or model."""
+        return SearchIndexRepository.SEPARATOR.join((path[-1].casefold(), kind, *path))
+
+    @staticmethod
+    def _parse_member(member):
+        """Splits a sorted set member into its kind and path."""
+        _, kind, *path = member.decode('utf-8').split(SearchIndexRepository.SEPARATOR)
+        return kind, tuple(path)
+
+    @staticmethod
+    def add(kind, paths, key=None):
+        """
+        Adds entries of one kind to the index.
+
+        Parameters:
+            kind (str): 'brand', 'series' or 'model'.
+            paths (iterable): The paths of the entries, e.g. (brand_name, series_name) for series.
+            key (str, optional): The sorted set to write to instead of the live index.
+        """
+        members = {SearchIndexRepository._member(kind, path): 0 for path in paths}
+        if members:
+            RedisUnitOfWork.writer().zadd(key or SearchIndexRepository.REDIS_KEY, members)
+
+    @staticmethod
+    def remove(kind, paths):
+        """
+        Removes entries of one kind from the index.
+
+        Parameters:
+            kind (str): 'brand', 'series' or 'model'.
+            paths (iterable): The paths of the entries.
+        """
+        members = [SearchIndexRepository._member(kind, path) for path in paths]
+        if members:
+            RedisUnitOfWork.writer().zrem(SearchIndexRepository.REDIS_KEY, *members)
+
+    @staticmethod
+    def search(prefix, limit):
+        """
+        Retrieves the entries whose name starts with a prefix, ignoring case, with one ZRANGEBYLEX.
+
+        Parameters:
+            prefix (str): The beginning of the names to find.
+            limit (int): The maximum number of entries to return.
+
+        Returns:
+            list: (kind, path) pairs ordered by name.
+        """
+        start = prefix.casefold().encode('utf-8')
+        # 0xff never occurs in UTF-8, so it sorts after every name with the prefix
+        members = SearchIndexRepository.redis_con.zrangebylex(SearchIndexRepository.REDIS_KEY, b'[' + start,
+                                                              b'(' + start + b'\xff', start=0, num=limit)
+        return [SearchIndexRepository._parse_member(member) for member in members]
+
+    @staticmethod
+    def get_categories_by_brands(brand_names):
+        """
+        Looks up the categories of brands in the index with one pipelined ZRANGEBYLEX per brand.
+
+        Parameters:
+            brand_names (iterable): The names of the brands.
+
+        Returns:
+            dict: Brand names mapped to the sorted names of the categories they belong to.
+        """
+        brand_names = list(brand_names)
+        pipe = SearchIndexRepository.redis_con.pipeline(transaction=False)
+        for brand_name in brand_names:
+            start = SearchIndexRepository.SEPARATOR.join((brand_name.casefold(), BRAND, '')).encode('utf-8')
+            pipe.zrangebylex(SearchIndexRepository.REDIS_KEY, b'[' + start, b'(' + start + b'\xff')
+
+        categories = {}
+        for brand_name, members in zip(brand_names, pipe.execute()):
+            paths = [SearchIndexRepository._parse_member(member)[1] for member in members]
+            categories[brand_name] = sorted(category_name for category_name, name in paths if name == brand_name)
+        return categories
+
+    @staticmethod
+    def swap_in_staging():
+        """
+        Replaces the live index with the staging sorted set written by a rebuild, or empties it
+        when the staging set was never written because there is nothing to index.
+        """
+        pipe = SearchIndexRepository.redis_con.pipeline(transaction=True)
+        if SearchIndexRepository.redis_con.exists(SearchIndexRepository.STAGING_KEY):
+            pipe.rename(SearchIndexRepository.STAGING_KEY, SearchIndexRepository.REDIS_KEY)
+        else:
+            pipe.unlink(SearchIndexRepository.REDIS_KEY)
+        pipe.execute()
+
+    @staticmethod
+    def clear_staging():
+        """
+        Drops the staging sorted set left behind by an interrupted rebuild.
+        """
+        SearchIndexRepository.redis_con.unlink(SearchIndexRepository.STAGING_KEY)
@@ -1,17 +1,26 @@
 from hierarchy_builder.models.series import Series
 from hierarchy_builder.repositories.brand_repository import BrandRepository
+from hierarchy_builder.repositories.async_redis import get_async_redis_connection
+from hierarchy_builder.repositories.search_index_repository import SearchIndexRepository, SERIES, MODEL
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
 from django_redis import get_redis_connection
-import json
 
 class SeriesRepository:
     PREFIX = 'series|'
+    MODELS_PREFIX = 'models|'
     redis_con = get_redis_connection("default")
+    async_redis_con = get_async_redis_connection()
 
     @staticmethod
     def _redis_series_key(brand_name):
-        """Constructs the Redis key for storing series related to a brand."""
+        """Constructs the Redis key of the set of series names of a brand."""
         return f"{SeriesRepository.PREFIX}{brand_name}"
 
+    @staticmethod
+    def _redis_models_key(brand_name, series_name):
+        """Constructs the Redis key of the set of model names of a series."""
+        return f"{SeriesRepository.MODELS_PREFIX}{brand_name}|{series_name}"
+
     @staticmethod
     def get_series_and_models_by_brand(brand_name):
         """
@@ -23,11 +32,218 @@ class SeriesRepository:
         Returns:
             dict: A dictionary with series names as keys and lists of model names as values.
         """
-        hash_key = SeriesRepository._redis_series_key(brand_name)
-        series_data = SeriesRepository.redis_con.hgetall(hash_key)
+        return SeriesRepository.get_series_and_models_by_brands([brand_name])[brand_name]
+
+    @staticmethod
+    def get_series_and_models_by_brands(brand_names):
+        """
+        Retrieves all series and their models for many brands from Redis in two pipelined round
+        trips: one for the series sets of every brand and one for the model sets of every series.
+
+        Parameters:
+            brand_names (iterable): The names of the brands.
+
+        Returns:
+            dict: Brand names mapped to dictionaries with series names as keys and sorted lists of
+            model names as values.
+        """
+        brand_names = list(brand_names)
+        pipe = SeriesRepository.redis_con.pipeline(transaction=False)
+        for brand_name in brand_names:
+            pipe.smembers(SeriesRepository._redis_series_key(brand_name))
+        series_keys = [(brand_name, series.decode('utf-8'))
+                       for brand_name, series_names in zip(brand_names, pipe.execute())
+                       for series in series_names]
+
+        for brand_name, series_name in series_keys:
+            pipe.smembers(SeriesRepository._redis_models_key(brand_name, series_name))
+        models_sets = pipe.execute() if series_keys else []
+
+        series_and_models = {brand_name: {} for brand_name in brand_names}
+        for (brand_name, series_name), models in zip(series_keys, models_sets):
+            series_and_models[brand_name][series_name] = sorted(model.decode('utf-8') for model in models)
+        return series_and_models
+
+    @staticmethod
+    def get_series_by_brands(brand_names):
+        """
+        Retrieves the series names, without their models, of many brands from Redis in a single
+        pipelined round trip.
+
+        Returns:
+            dict: Brand names mapped to sorted lists of series names.
+        """
+        brand_names = list(brand_names)
+        pipe = SeriesRepository.redis_con.pipeline(transaction=False)
+        for brand_name in brand_names:
+            pipe.smembers(SeriesRepository._redis_series_key(brand_name))
+        return {brand_name: sorted(series.decode('utf-8') for series in series_names)
+                for brand_name, series_names in zip(brand_names, pipe.execute())}
+
+    @staticmethod
+    def scan_series(brand_name, cursor=0, count=500):
+        """
+        Retrieves one page of the series names of a brand from Redis with SSCAN.
 
-        # Deserialize model data from JSON
-        return {series.decode('utf-8'): json.loads(models) for series, models in series_data.items()}
+        Parameters:
+            brand_name (str): The name of the brand.
+            cursor (int): The cursor returned for the previous page, or 0 for the first page.
+            count (int): The number of series to aim for; Redis may return somewhat more or fewer.
+
+        Returns:
+            tuple: A (next_cursor, series_names) pair where next_cursor is 0 after the last page.
+        """
+        next_cursor, series_names = SeriesRepository.redis_con.sscan(SeriesRepository._redis_series_key(brand_name),
+                                                                     cursor=cursor, count=count)
+        return next_cursor, [series.decode('utf-8') for series in series_names]
+
+    @staticmethod
+    def get_existing_series(brand_name, series_names):
+        """
+        Filters series names down to those listed for a brand in Redis, with one SMISMEMBER.
+
+        Returns:
+            list: The series names that exist, in the given order.
+        """
+        series_names = list(series_names)
+        if not series_names:
+            return []
+        flags = SeriesRepository.redis_con.smismember(SeriesRepository._redis_series_key(brand_name), series_names)
+        return [name for name, flag in zip(series_names, flags) if flag]
+
+    @staticmethod
+    def get_models_by_series(brand_name, series_names):
+        """
+        Retrieves the models of some series of a brand from Redis in a single pipelined round trip.
+
+        Returns:
+            dict: Series names mapped to sorted lists of model names.
+        """
+        series_names = list(series_names)
+        pipe = SeriesRepository.redis_con.pipeline(transaction=False)
+        for series_name in series_names:
+            pipe.smembers(SeriesRepository._redis_models_key(brand_name, series_name))
+        return {series_name: sorted(model.decode('utf-8') for model in models)
+                for series_name, models in zip(series_names, pipe.execute())}
+
+    @staticmethod
+    async def aget_series_and_models_by_brands(brand_names):
+        """
+        Async version of `get_series_and_models_by_brands`.
+        """
+        brand_names = list(brand_names)
+        pipe = SeriesRepository.async_redis_con.pipeline(transaction=False)
+        for brand_name in brand_names:
+            pipe.smembers(SeriesRepository._redis_series_key(brand_name))
+        series_keys = [(brand_name, series.decode('utf-8'))
+                       for brand_name, series_names in zip(brand_names, await pipe.execute())
+                       for series in series_names]
+
+        for brand_name, series_name in series_keys:
+            pipe.smembers(SeriesRepository._redis_models_key(brand_name, series_name))
+        models_sets = await pipe.execute() if series_keys else []
+
+        series_and_models = {brand_name: {} for brand_name in brand_names}
+        for (brand_name, series_name), models in zip(series_keys, models_sets):
+            series_and_models[brand_name][series_name] = sorted(model.decode('utf-8') for model in models)
+        return series_and_models
+
+    @staticmethod
+    async def aget_series_by_brands(brand_names):
+        """
+        Async version of `get_series_by_brands`.
+        """
+        brand_names = list(brand_names)
+        pipe = SeriesRepository.async_redis_con.pipeline(transaction=False)
+        for brand_name in brand_names:
+            pipe.smembers(SeriesRepository._redis_series_key(brand_name))
+        return {brand_name: sorted(series.decode('utf-8') for series in series_names)
+                for brand_name, series_names in zip(brand_names, await pipe.execute())}
+
+    @staticmethod
+    async def ascan_series(brand_name, cursor=0, count=500):
+        """
+        Async version of `scan_series`.
+        """
+        next_cursor, series_names = await SeriesRepository.async_redis_con.sscan(
+            SeriesRepository._redis_series_key(brand_name), cursor=cursor, count=count)
+        return next_cursor, [series.decode('utf-8') for series in series_names]
+
+    @staticmethod
+    async def aget_existing_series(brand_name, series_names):
+        """
+        Async version of `get_existing_series`.
+        """
+        series_names = list(series_names)
+        if not series_names:
+            return []
+        flags = await SeriesRepository.async_redis_con.smismember(SeriesRepository._redis_series_key(brand_name),
+                                                                  series_names)
+        return [name for name, flag in zip(series_names, flags) if flag]
+
+    @staticmethod
+    async def aget_models_by_series(brand_name, series_names):
+        """
+        Async version of `get_models_by_series`.
+        """
+        series_names = list(series_names)
+        pipe = SeriesRepository.async_redis_con.pipeline(transaction=False)
+        for series_name in series_names:
+            pipe.smembers(SeriesRepository._redis_models_key(brand_name, series_name))
+        return {series_name: sorted(model.decode('utf-8') for model in models)
+                for series_name, models in zip(series_names, await pipe.execute())}
+
+    @staticmethod
+    def get_ids_by_names(names, brand_id):
+        """
+        Retrieves the database IDs of the series with the given names that belong to a brand.
+
+        Parameters:
+            names (iterable): The names of the series to look up.
+            brand_id (int): The ID of the brand to which the series belong.
+
+        Returns:
+            dict: A dictionary where keys are series names and values are their corresponding IDs.
+        """
+        return dict(Series.objects.filter(brand_id=brand_id, name__in=list(names)).values_list('name', 'id'))
+
+    @staticmethod
+    def get_series_and_models_by_brand_ids(brand_ids):
+        """
+        Retrieves the series and models of brands from the database with a single query. Unlike the
+        Redis sets, which are keyed by brand name, this tells apart same-name brands of different
+        categories.
+
+        Parameters:
+            brand_ids (iterable): The IDs of the brands.
+
+        Returns:
+            dict: Brand IDs mapped to dictionaries with series names as keys and sets of model
+            names as values.
+        """
+        brand_ids = list(brand_ids)
+        series_and_models = {brand_id: {} for brand_id in brand_ids}
+        for brand_id, series_name, model_name in (Series.objects.filter(brand_id__in=brand_ids)
+                                                  .values_list('brand_id', 'name', 'device_models__name')):
+            models = series_and_models[brand_id].setdefault(series_name, set())
+            if model_name is not None:
+                models.add(model_name)
+        return series_and_models
+
+    @staticmethod
+    def resolve_brand_id(brand_name, category_name=None, identity_map=None):
+        """
+        Resolves a brand name to its ID through the identity map when one is given, or with
+        `BrandRepository.get_by_name` otherwise.
+
+        Returns:
+            int: The ID of the brand, or None if the brand does not exist.
+        """
+        if identity_map is not None:
+            return identity_map.get_brand_id(brand_name, category_name)
+
+        brand = BrandRepository.get_by_name(brand_name)
+        return brand.id if brand else None
 
     @staticmethod
     def get_all():
@@ -89,11 +305,11 @@ class SeriesRepository:
             raise ValueError(f"Brand with name '{brand_name}' does not exist.")
 
         # Create the new series in the database
-        series = Series.objects.create(name=name, brand=brand)
+        series, created = Series.objects.get_or_create(name=name, brand=brand)
 
-        # Add the new series to the Redis cache with an initial empty list of models
-        hash_key = SeriesRepository._redis_series_key(brand.name)
-        SeriesRepository.redis_con.hset(hash_key, series.name, json.dumps([]))
+        # Add the new series to the brand's set of series in the Redis cache
+        RedisUnitOfWork.writer().sadd(SeriesRepository._redis_series_key(brand.name), series.name)
+        SearchIndexRepository.add(SERIES, [(brand.name, series.name)])
 
         return series
 
@@ -111,8 +327,115 @@ class SeriesRepository:
         """
         series = Series.objects.filter(name=series_name, brand__name=brand_name).first()
         if series:
-            hash_key = SeriesRepository._redis_series_key(series.brand.name)
-            SeriesRepository.redis_con.hdel(hash_key, series_name)
+            redis = RedisUnitOfWork.writer()
+            redis.srem(SeriesRepository._redis_series_key(series.brand.name), series_name)
+            redis.unlink(SeriesRepository._redis_models_key(series.brand.name, series_name))
+            SearchIndexRepository.remove(SERIES, [(brand_name, series_name)])
+            SearchIndexRepository.remove(MODEL, [(brand_name, series_name, model_name) for model_name
+                                                 in series.device_models.values_list('name', flat=True)])
             series.delete()
             return True
         return False
+
+    @staticmethod
+    def bulk_create(names, brand_name, category_name=None, identity_map=None):
+        """
+        Creates every series in `names` that does not exist yet for the given brand with a single
+        insert and adds them to the brand's set of series in Redis with one SADD.
+
+        Parameters:
+            names (iterable): The names of the series to create.
+            brand_name (str): The name of the Brand to which the series belong.
+            category_name (str, optional): The name of the brand's category, used to pick the right
+                brand from the identity map.
+            identity_map (HierarchyIdentityMap, optional): Resolves the brand and the existing
+                series without a query and receives the IDs of the created series.
+
+        Returns:
+            int: The number of series actually inserted, without the skipped ones.
+        """
+        names = set(names)
+        if not names:
+            return 0
+
+        brand_id = SeriesRepository.resolve_brand_id(brand_name, category_name, identity_map)
+        if brand_id is None:
+            raise ValueError(f"Brand with name '{brand_name}' does not exist.")
+
+        if identity_map is not None:
+            existing = {name for name in names if identity_map.get_series_id(brand_id, name) is not None}
+        else:
+            existing = set()
+
+        created = names - existing
+        if not created:
+            return 0
+
+        # Series that already exist, e.g. written earlier in the same transaction and therefore not
+        # in Redis yet, are skipped by the unique constraint. ignore_conflicts hides which, so the
+        # rows are counted around the insert.
+        in_scope = Series.objects.filter(brand_id=brand_id, name__in=created)
+        existing_count = in_scope.count()
+        Series.objects.bulk_create([Series(name=name, brand_id=brand_id) for name in created], ignore_conflicts=True)
+        inserted = in_scope.count() - existing_count
+        if identity_map is not None:
+            identity_map.add_series(brand_id, SeriesRepository.get_ids_by_names(created, brand_id))
+
+        RedisUnitOfWork.writer().sadd(SeriesRepository._redis_series_key(brand_name), *created)
+        SearchIndexRepository.add(SERIES, [(brand_name, name) for name in created])
+        return inserted
+
+    @staticmethod
+    def bulk_delete(names, brand_name, identity_map=None, brand_ids=None):
+        """
+        Deletes every series in `names` of the brands with the given name, and their models, with a
+        single delete statement. Removes them from the brand's Redis set with one SREM and drops
+        their model sets with one UNLINK.
+
+        Parameters:
+            names (iterable): The names of the series to delete.
+            brand_name (str): The name of the brand the series belong to.
+            identity_map (HierarchyIdentityMap, optional): Forgets the deleted series.
+            brand_ids (iterable, optional): Only deletes the series of these brands with the name,
+                e.g. of one category. Series and models that same-name brands still have stay in
+                the Redis sets and the search index they share.
+
+        Returns:
+            int: The number of deleted series.
+        """
+        names = list(names)
+        if not names:
+            return 0
+
+        if brand_ids is None:
+            series = Series.objects.filter(name__in=names, brand__name=brand_name)
+        else:
+            brand_ids = list(brand_ids)
+            series = Series.objects.filter(name__in=names, brand_id__in=brand_ids)
+        # The models go with their series, so their names are read first to drop them from the search index
+        models = list(series.values_list('name', 'device_models__name').exclude(device_models__name=None))
+        deleted, rows_by_model = series.delete()
+        if identity_map is not None:
+            deleted_brand_ids = identity_map.get_brand_ids(brand_name) if brand_ids is None else brand_ids
+            identity_map.remove_series([(brand_id, name) for brand_id in deleted_brand_ids for name in names])
+
+        remaining = {}
+        if brand_ids is not None:
+            for series_name, model_name in (Series.objects.filter(name__in=names, brand__name=brand_name)
+                                            .values_list('name', 'device_models__name')):
+                remaining.setdefault(series_name, set()).add(model_name)
+        gone = [name for name in names if name not in remaining]
+        deleted_models = [(series_name, model_name) for series_name, model_name in models
+                          if model_name not in remaining.get(series_name, ())]
+
+        redis = RedisUnitOfWork.writer()
+        if gone:
+            redis.srem(SeriesRepository._redis_series_key(brand_name), *gone)
+            redis.unlink(*[SeriesRepository._redis_models_key(brand_name, name) for name in gone])
+        for series_name, model_name in deleted_models:
+            if series_name in remaining:
+                redis.srem(SeriesRepository._redis_models_key(brand_name, series_name), model_name)
+        SearchIndexRepository.remove(SERIES, [(brand_name, name) for name in gone])
+        SearchIndexRepository.remove(MODEL, [(brand_name, series_name, model_name)
+                                             for series_name, model_name in deleted_models])
+        return rows_by_model.get(Series._meta.label, 0)
@@ -0,0 +1,89 @@
+from django_redis import get_redis_connection
+
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+
+
+class SheetFingerprintRepository:
+    """
+    Stores the content fingerprint of every imported sheet and, for '-Series' sheets, of every
+    brand in the sheet. Writes go through the unit of work, so a fingerprint is only stored
+    together with the rows it describes.
+    """
+    SHEETS_HASH_KEY = 'sheet_fingerprint'
+    BRANDS_HASH_KEY = 'brand_fingerprint'
+    redis_con = get_redis_connection("default")
+
+    @staticmethod
+    def _brand_field(sheet_name, brand_name):
+        """Constructs the field of a brand of a '-Series' sheet in the brand fingerprint hash."""
+        return f"{sheet_name}|{brand_name}"
+
+    @staticmethod
+    def get_all():
+        """
+        Retrieves every stored fingerprint in a single round trip.
+
+        Returns:
+            tuple: A (sheets, brands) pair where sheets maps sheet names to fingerprints and
+            brands maps (sheet_name, brand_name) pairs to fingerprints.
+        """
+        pipe = SheetFingerprintRepository.redis_con.pipeline(transaction=False)
+        pipe.hgetall(SheetFingerprintRepository.SHEETS_HASH_KEY)
+        pipe.hgetall(SheetFingerprintRepository.BRANDS_HASH_KEY)
+        sheets_data, brands_data = pipe.execute()
+
+        sheets = {key.decode('utf-8'): value.decode('utf-8') for key, value in sheets_data.items()}
+        brands = {}
+        for key, value in brands_data.items():
+            sheet_name, _, brand_name = key.decode('utf-8').rpartition('|')
+            brands[(sheet_name, brand_name)] = value.decode('utf-8')
+        return sheets, brands
+
+    @staticmethod
+    def save(sheet_name, fingerprint, brand_fingerprints=None, removed_brands=()):
+        """
+        Stores the fingerprint of a sheet and, optionally, of its brands.
+
+        Parameters:
+            sheet_name (str): The name of the sheet.
+            fingerprint (str): The fingerprint of the whole sheet.
+            brand_fingerprints (dict, optional): Brand names mapped to their fingerprints.
+            removed_brands (iterable): Brands of the sheet whose stored fingerprints are dropped.
+        """
+        writer = RedisUnitOfWork.writer()
+        writer.hset(SheetFingerprintRepository.SHEETS_HASH_KEY, sheet_name, fingerprint)
+        if brand_fingerprints:
+            writer.hset(SheetFingerprintRepository.BRANDS_HASH_KEY, mapping={
+                SheetFingerprintRepository._brand_field(sheet_name, brand_name): brand_fingerprint
+                for brand_name, brand_fingerprint in brand_fingerprints.items()
+            })
+        removed_fields = [SheetFingerprintRepository._brand_field(sheet_name, brand_name)
+                          for brand_name in removed_brands]
+        if removed_fields:
+            writer.hdel(SheetFingerprintRepository.BRANDS_HASH_KEY, *removed_fields)
+
+    @staticmethod
+    def delete(sheet_names, brand_keys=()):
+        """
+        Drops stored fingerprints so that the sheets are fully processed on their next import.
+
+        Parameters:
+            sheet_names (iterable): The names of the sheets.
+            brand_keys (iterable): (sheet_name, brand_name) pairs of brand fingerprints.
+        """
+        writer = RedisUnitOfWork.writer()
+        sheet_names = list(sheet_names)
+        brand_fields = [SheetFingerprintRepository._brand_field(sheet_name, brand_name)
+                        for sheet_name, brand_name in brand_keys]
+        if sheet_names:
+            writer.hdel(SheetFingerprintRepository.SHEETS_HASH_KEY, *sheet_names)
+        if brand_fields:
+            writer.hdel(SheetFingerprintRepository.BRANDS_HASH_KEY, *brand_fields)
+
+    @staticmethod
+    def clear():
+        """
+        Drops every stored fingerprint.
+        """
+        RedisUnitOfWork.writer().unlink(SheetFingerprintRepository.SHEETS_HASH_KEY,
+                                        SheetFingerprintRepository.BRANDS_HASH_KEY)
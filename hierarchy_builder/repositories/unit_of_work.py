@@ -0,0 +1,94 @@
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from hierarchy_builder.repositories.hierarchy_lock_repository import HierarchyLockRepository
+
+
+class RedisUnitOfWork:
+    """
+    Buffers the Redis writes of the repositories and sends them in one MULTI/EXEC pipeline once
+    the surrounding database transaction commits. Writes of a transaction that rolls back are
+    never sent, so Redis cannot show rows the database does not have. Inside `fenced`, batches
+    are flushed through a lock session instead, which only writes while it holds its locks.
+    """
+    redis_con = get_redis_connection("default")
+    _state = threading.local()
+
+    @staticmethod
+    def writer():
+        """
+        Returns the object repositories should send their Redis writes to: the pipeline of the
+        active batch, or the Redis connection itself when no batch is active.
+        """
+        return getattr(RedisUnitOfWork._state, 'pipeline', None) or RedisUnitOfWork.redis_con
+
+    @staticmethod
+    def after_flush(callback):
+        """
+        Runs `callback` once the writes of the active batch have been sent to Redis, or right away
+        when no batch is active. Callbacks of a batch that is discarded never run.
+        """
+        callbacks = getattr(RedisUnitOfWork._state, 'callbacks', None)
+        if callbacks is None:
+            callback()
+        else:
+            callbacks.append(callback)
+
+    @staticmethod
+    def _flush(execute, callbacks):
+        execute()
+        for callback in callbacks:
+            callback()
+
+    @staticmethod
+    @contextmanager
+    def fenced(fence):
+        """
+        Makes the batches opened inside the block check `fence.check()` before the database
+        commits and flush with `fence.execute(pipeline)`. A `fence` of None leaves batches as they are.
+        """
+        RedisUnitOfWork._state.fence = fence
+        try:
+            yield
+        finally:
+            RedisUnitOfWork._state.fence = None
+
+    @staticmethod
+    @contextmanager
+    def batch():
+        """
+        Buffers every repository write made inside the block. On a clean exit the buffer is
+        flushed with `transaction.on_commit`, i.e. immediately outside of an atomic block and after
+        the outermost commit inside one. On an exception the buffer is discarded. Nested batches
+        join the outer one.
+        """
+        if getattr(RedisUnitOfWork._state, 'pipeline', None) is not None:
+            yield RedisUnitOfWork._state.pipeline
+            return
+
+        fence = getattr(RedisUnitOfWork._state, 'fence', None)
+        pipeline = RedisUnitOfWork.redis_con.pipeline(transaction=True)
+        callbacks = []
+        RedisUnitOfWork._state.pipeline = pipeline
+        RedisUnitOfWork._state.callbacks = callbacks
+        try:
+            yield pipeline
+            if fence is not None:
+                # Raising here rolls the database transaction back as well
+                fence.check()
+        except BaseException:
+            pipeline.reset()
+            raise
+        else:
+            if fence is None and len(pipeline):
+                # Fenced flushes bump the generation themselves; snapshots tell their age by it
+                pipeline.incr(HierarchyLockRepository.GENERATION_KEY)
+            execute = pipeline.execute if fence is None else partial(fence.execute, pipeline)
+            transaction.on_commit(partial(RedisUnitOfWork._flush, execute, callbacks))
+        finally:
+            RedisUnitOfWork._state.pipeline = None
+            RedisUnitOfWork._state.callbacks = None
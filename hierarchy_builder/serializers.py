@@ -1,5 +1,9 @@
 from rest_framework import serializers
+from hierarchy_builder.readers import BACKENDS
 
 # Serializer for handling file uploads
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField(max_length=None, allow_empty_file=False)
+    backend = serializers.ChoiceField(choices=BACKENDS, required=False)
+    reconcile = serializers.BooleanField(required=False, default=False)
+    chunked = serializers.BooleanField(required=False, default=False)
@@ -1,2 +1,3 @@
 from .excel_service import ExcelService
-from .hierarchy_service import HierarchyService
\ No newline at end of file
+from .hierarchy_service import HierarchyService
+from .import_job_service import ImportJobService
@@ -0,0 +1,285 @@
+from collections import defaultdict
+
+from django_redis import get_redis_connection
+
+from hierarchy_builder.models import DeviceCategory, Brand, Series, DeviceModel
+from hierarchy_builder.repositories.device_category_repository import DeviceCategoryRepository
+from hierarchy_builder.repositories.brand_repository import BrandRepository
+from hierarchy_builder.repositories.cache_repair_repository import CacheRepairRepository
+from hierarchy_builder.repositories.series_repository import SeriesRepository
+from hierarchy_builder.repositories.sheet_fingerprint_repository import SheetFingerprintRepository
+from hierarchy_builder.services.hierarchy_locks import CATEGORY_LIST_LOCK, HierarchyLocks, brand_lock, category_lock
+from hierarchy_builder.services.hierarchy_service import HierarchyService
+from hierarchy_builder.services.search_service import SearchService
+
+HASH = 'hash'
+SET = 'set'
+
+
+class CacheRebuildService:
+    """
+    Rebuilds the Redis hierarchy cache from MySQL, or compares the two.
+    """
+    STAGING_PREFIX = 'rebuild|'
+    redis_con = get_redis_connection("default")
+
+    @staticmethod
+    def _live_key_patterns():
+        return [
+            DeviceCategoryRepository.REDIS_HASH_KEY,
+            f"{BrandRepository.PREFIX}*",
+            f"{SeriesRepository.PREFIX}*",
+            f"{SeriesRepository.MODELS_PREFIX}*",
+        ]
+
+    @staticmethod
+    def _scan_keys(patterns, chunk_size):
+        keys = set()
+        for pattern in patterns:
+            keys.update(key.decode('utf-8') for key in
+                        CacheRebuildService.redis_con.scan_iter(match=pattern, count=chunk_size))
+        return keys
+
+    @staticmethod
+    def iter_expected_keys(chunk_size):
+        """
+        Streams the four tables in chunks and yields every Redis key the hierarchy cache should
+        contain, one table after the other. Rows are grouped by the exact name the key is built
+        from in Python, as the database collation may order names that differ in case or trailing
+        spaces together, so only one table's keys are held in memory at a time.
+
+        Yields:
+            tuple: A (key, type, value) triple where value is a {field: id} dictionary of strings
+            for hashes and a set of member names for sets.
+        """
+        categories = DeviceCategory.objects.values_list('name', 'id').iterator(chunk_size=chunk_size)
+        yield DeviceCategoryRepository.REDIS_HASH_KEY, HASH, {name: str(category_id) for name, category_id in categories}
+
+        brands = defaultdict(dict)
+        for category_name, name, brand_id in (Brand.objects.values_list('category__name', 'name', 'id')
+                                              .iterator(chunk_size=chunk_size)):
+            brands[category_name][name] = str(brand_id)
+        for category_name, fields in brands.items():
+            yield BrandRepository._redis_hash_key(category_name), HASH, fields
+        del brands
+
+        series = defaultdict(set)
+        for brand_name, name in Series.objects.values_list('brand__name', 'name').iterator(chunk_size=chunk_size):
+            series[brand_name].add(name)
+        for brand_name, names in series.items():
+            yield SeriesRepository._redis_series_key(brand_name), SET, names
+        del series
+
+        models = defaultdict(set)
+        for brand_name, series_name, name in (DeviceModel.objects
+                                              .values_list('series__brand__name', 'series__name', 'name')
+                                              .iterator(chunk_size=chunk_size)):
+            models[(brand_name, series_name)].add(name)
+        for (brand_name, series_name), names in models.items():
+            yield SeriesRepository._redis_models_key(brand_name, series_name), SET, names
+
+    @staticmethod
+    def _lock_everything(locks):
+        """
+        Locks the whole hierarchy: the category list first, which keeps imports from adding
+        categories, then every category and every brand name, which keeps them from adding brands
+        or writing under the existing ones.
+        """
+        locks.acquire([CATEGORY_LIST_LOCK])
+        locks.acquire([category_lock(name) for name in DeviceCategory.objects.values_list('name', flat=True)]
+                      + [brand_lock(name) for name in Brand.objects.values_list('name', flat=True).distinct()])
+
+    @staticmethod
+    def rebuild(chunk_size=2000):
+        """
+        Writes the whole hierarchy into staging keys with pipelines, then swaps them in with RENAME
+        and drops the live keys that no longer have a row, all in one fenced MULTI/EXEC. Readers
+        therefore see either the old cache or the complete new one. The whole hierarchy is locked
+        meanwhile, so imports wait for the rebuild instead of writing under it.
+
+        Parameters:
+            chunk_size (int): Rows fetched per database round trip and commands sent per pipeline.
+
+        The search index is rebuilt afterwards as well.
+
+        Returns:
+            dict: The number of keys written, the number of stale keys removed and the number of
+            rows in the search index.
+
+        Raises:
+            HierarchyLockError: If an import holds part of the hierarchy for too long, or the
+            rebuild lost its locks before the swap, in which case nothing was swapped in.
+        """
+        redis_con = CacheRebuildService.redis_con
+        with HierarchyLocks() as locks:
+            CacheRebuildService._lock_everything(locks)
+
+            stale_staging_keys = CacheRebuildService._scan_keys([f"{CacheRebuildService.STAGING_PREFIX}*"],
+                                                                chunk_size)
+            if stale_staging_keys:
+                redis_con.unlink(*stale_staging_keys)
+
+            keys = []
+            pipe = redis_con.pipeline(transaction=False)
+            for key, key_type, value in CacheRebuildService.iter_expected_keys(chunk_size):
+                if not value:
+                    continue
+                staging_key = f"{CacheRebuildService.STAGING_PREFIX}{key}"
+                if key_type == HASH:
+                    pipe.hset(staging_key, mapping=value)
+                else:
+                    pipe.sadd(staging_key, *value)
+                keys.append(key)
+                if len(pipe) >= chunk_size:
+                    pipe.execute()
+            pipe.execute()
+
+            stale_keys = (CacheRebuildService._scan_keys(CacheRebuildService._live_key_patterns(), chunk_size)
+                          - set(keys))
+
+            locks.check()
+            pipe = redis_con.pipeline(transaction=True)
+            for key in keys:
+                pipe.rename(f"{CacheRebuildService.STAGING_PREFIX}{key}", key)
+            if stale_keys:
+                pipe.unlink(*stale_keys)
+            # The next import cannot assume that any sheet is still reflected in the rebuilt cache
+            pipe.unlink(SheetFingerprintRepository.SHEETS_HASH_KEY, SheetFingerprintRepository.BRANDS_HASH_KEY)
+            locks.execute(pipe)
+            locks.check()
+
+        HierarchyService.build_snapshot()
+        search_entries = SearchService.rebuild_index(chunk_size)
+        return {'keys_written': len(keys), 'stale_keys_removed': len(stale_keys), 'search_entries': search_entries}
+
+    @staticmethod
+    def _iter_repaired_keys(lock_names):
+        """
+        Yields the Redis keys of the parts of the hierarchy guarded by locks, as they should read
+        according to the database, including the model sets of series that no longer exist.
+
+        Yields:
+            tuple: A (key, type, value) triple like `iter_expected_keys`, with an empty value for
+            keys that should not exist.
+        """
+        category_prefix, brand_prefix = category_lock(''), brand_lock('')
+        category_names = {name[len(category_prefix):] for name in lock_names if name.startswith(category_prefix)}
+        brand_names = {name[len(brand_prefix):] for name in lock_names if name.startswith(brand_prefix)}
+
+        if CATEGORY_LIST_LOCK in lock_names:
+            yield DeviceCategoryRepository.REDIS_HASH_KEY, HASH, {
+                name: str(category_id) for name, category_id in DeviceCategory.objects.values_list('name', 'id')}
+
+        brands = {category_name: {} for category_name in category_names}
+        for category_name, name, brand_id in (Brand.objects.filter(category__name__in=category_names)
+                                              .values_list('category__name', 'name', 'id')):
+            brands.setdefault(category_name, {})[name] = str(brand_id)
+        for category_name, fields in brands.items():
+            yield BrandRepository._redis_hash_key(category_name), HASH, fields
+
+        models = {(brand_name, series_name): set() for brand_name, series_names
+                  in SeriesRepository.get_series_by_brands(brand_names).items() for series_name in series_names}
+        series = {brand_name: set() for brand_name in brand_names}
+        for brand_name, series_name in Series.objects.filter(brand__name__in=brand_names).values_list('brand__name',
+                                                                                                      'name'):
+            series.setdefault(brand_name, set()).add(series_name)
+            models.setdefault((brand_name, series_name), set())
+        for brand_name, series_name, name in (DeviceModel.objects.filter(series__brand__name__in=brand_names)
+                                              .values_list('series__brand__name', 'series__name', 'name')):
+            models.setdefault((brand_name, series_name), set()).add(name)
+        for brand_name, names in series.items():
+            yield SeriesRepository._redis_series_key(brand_name), SET, names
+        for (brand_name, series_name), names in models.items():
+            yield SeriesRepository._redis_models_key(brand_name, series_name), SET, names
+
+    @staticmethod
+    def repair_scheduled():
+        """
+        Rebuilds the parts of the hierarchy cache scheduled for a repair after an import lost its
+        locks between its database commit and its Redis flush. The parts are locked meanwhile and
+        rewritten in one fenced MULTI/EXEC; the search index and the snapshot are rebuilt after.
+
+        Returns:
+            list: The sorted names of the locks whose parts were rebuilt.
+        """
+        lock_names = CacheRepairRepository.get_all()
+        if not lock_names:
+            return []
+
+        with HierarchyLocks() as locks:
+            locks.acquire(lock_names)
+            # Unscheduled first, so that a part scheduled again while it is being rebuilt is kept
+            CacheRepairRepository.remove(lock_names)
+            try:
+                pipe = CacheRebuildService.redis_con.pipeline(transaction=True)
+                for key, key_type, value in CacheRebuildService._iter_repaired_keys(lock_names):
+                    pipe.unlink(key)
+                    if value and key_type == HASH:
+                        pipe.hset(key, mapping=value)
+                    elif value:
+                        pipe.sadd(key, *value)
+                # The fingerprints may describe rows that never reached Redis
+                pipe.unlink(SheetFingerprintRepository.SHEETS_HASH_KEY, SheetFingerprintRepository.BRANDS_HASH_KEY)
+                locks.execute(pipe)
+            except BaseException:
+                CacheRepairRepository.add(lock_names)
+                raise
+
+        HierarchyService.build_snapshot()
+        SearchService.rebuild_index()
+        return sorted(lock_names)
+
+    @staticmethod
+    def verify(chunk_size=2000, sample_size=10):
+        """
+        Compares the Redis hierarchy cache with MySQL without changing either.
+
+        Parameters:
+            chunk_size (int): Rows fetched per database round trip and keys read per pipeline.
+            sample_size (int): The maximum number of keys listed per kind of difference.
+
+        Returns:
+            dict: Counts and samples of keys that are missing from Redis, that Redis has but MySQL
+            does not, and that exist in both with different contents.
+        """
+        report = {'missing': [], 'extra': [], 'mismatched': []}
+        counts = {'missing': 0, 'extra': 0, 'mismatched': 0}
+
+        def record(kind, key):
+            counts[kind] += 1
+            if len(report[kind]) < sample_size:
+                report[kind].append(key)
+
+        def compare(batch):
+            pipe = CacheRebuildService.redis_con.pipeline(transaction=False)
+            for key, key_type, _ in batch:
+                if key_type == HASH:
+                    pipe.hgetall(key)
+                else:
+                    pipe.smembers(key)
+            for (key, key_type, expected), actual in zip(batch, pipe.execute()):
+                if key_type == HASH:
+                    actual = {field.decode('utf-8'): value.decode('utf-8') for field, value in actual.items()}
+                else:
+                    actual = {member.decode('utf-8') for member in actual}
+                if not actual and expected:
+                    record('missing', key)
+                elif actual != expected:
+                    record('mismatched', key)
+
+        expected_keys = set()
+        batch = []
+        for entry in CacheRebuildService.iter_expected_keys(chunk_size):
+            if entry[2]:
+                expected_keys.add(entry[0])
+                batch.append(entry)
+            if len(batch) >= chunk_size:
+                compare(batch)
+                batch = []
+        if batch:
+            compare(batch)
+
+        for key in CacheRebuildService._scan_keys(CacheRebuildService._live_key_patterns(), chunk_size) - expected_keys:
+            record('extra', key)
+
+        return {kind: {'count': counts[kind], 'sample': sorted(report[kind])} for kind in report}
@@ -0,0 +1,44 @@
+class DiffService:
+    @staticmethod
+    def diff_names(existing_names, incoming_names):
+        """
+        Computes which names have to be added and which have to be deleted so that the
+        existing names match the incoming ones.
+
+        Parameters:
+            existing_names (iterable): The names currently stored.
+            incoming_names (iterable): The names found in the uploaded sheet.
+
+        Returns:
+            tuple: A (names_to_add, names_to_delete) pair of sets.
+        """
+        existing_names = set(existing_names)
+        incoming_names = set(incoming_names)
+        return incoming_names - existing_names, existing_names - incoming_names
+
+    @staticmethod
+    def diff_series_and_models(existing, incoming):
+        """
+        Computes the series and model changes for a single brand.
+
+        Parameters:
+            existing (dict): Series names mapped to the model names currently stored.
+            incoming (dict): Series names mapped to the model names found in the sheet.
+
+        Returns:
+            tuple: A (series_to_add, series_to_delete, models_to_add, models_to_delete) tuple where
+            the series entries are sets of series names and the model entries are dictionaries
+            mapping a series name to the set of its model names. Empty model sets are omitted.
+        """
+        series_to_add, series_to_delete = DiffService.diff_names(existing.keys(), incoming.keys())
+
+        models_to_add = {}
+        models_to_delete = {}
+        for series_name in set(existing) | set(incoming):
+            added, deleted = DiffService.diff_names(existing.get(series_name, ()), incoming.get(series_name, ()))
+            if added:
+                models_to_add[series_name] = added
+            if deleted and series_name not in series_to_delete:
+                models_to_delete[series_name] = deleted
+
+        return series_to_add, series_to_delete, models_to_add, models_to_delete
@@ -1,105 +1,489 @@
-import pandas as pd
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from hierarchy_builder.readers import get_workbook_reader
 from hierarchy_builder.repositories.device_category_repository import DeviceCategoryRepository
 from hierarchy_builder.repositories.brand_repository import BrandRepository
 from hierarchy_builder.repositories.series_repository import SeriesRepository
 from hierarchy_builder.repositories.device_model_repository import DeviceModelRepository
+from hierarchy_builder.repositories.hierarchy_cascade_repository import HierarchyCascadeRepository
+from hierarchy_builder.repositories.identity_map import HierarchyIdentityMap
+from hierarchy_builder.repositories.sheet_fingerprint_repository import SheetFingerprintRepository
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+from hierarchy_builder.services.diff_service import DiffService
+from hierarchy_builder.services.hierarchy_locks import CATEGORY_LIST_LOCK, brand_lock, category_lock
+from hierarchy_builder.services.hierarchy_service import HierarchyService
+from hierarchy_builder.services.import_metrics import ImportMetrics
+from hierarchy_builder.services.import_plan import ImportPlan, ADD, DELETE
+from hierarchy_builder.services.sheet_fingerprint import SeriesSheetFingerprint, fingerprint_names
+from hierarchy_builder.services.sheet_scheduler import (SheetScheduler, get_sheet_level, DEVICE_CATEGORIES, BRANDS,
+                                                        SERIES_AND_MODELS)
 
 
 class ExcelService:
-    def __init__(self, excel_file):
+    def __init__(self, excel_file, backend=None, progress=None, workers=None, metrics=None, reconcile=False,
+                 dry_run=False, checkpoint=None, locks=None):
         self.excel_file = excel_file
+        self.backend = backend
+        # When set, series and models missing from the '-Series' sheets are deleted as well
+        self.reconcile = reconcile
+        # A dry run only reads and diffs, and collects what it would change in `plan`
+        self.dry_run = dry_run
+        self.plan = ImportPlan() if dry_run else None
+        self._planned_brands = set()
+        # With a checkpoint the import is chunked: every sheet of names, and every unit of brands of
+        # a '-Series' sheet, commits on its own and is recorded, so that a resumed import skips it
+        self.checkpoint = checkpoint
+        self._done_sheets = set()
+        self._committed_brands = set()
+        # With a lock session, every part of the hierarchy is locked before it is diffed
+        self.locks = locks
+        # Cleared once another import changed the hierarchy after the fingerprints were loaded
+        self._trust_fingerprints = True
+        self.progress = progress
+        self.workers = settings.EXCEL_PARSE_WORKERS if workers is None else workers
+        self.metrics = metrics if metrics is not None else ImportMetrics()
+        self.identity_map = None
+        # Fingerprints of the previous imports, kept up to date in memory as Redis only sees changes on commit
+        self.sheet_fingerprints = {}
+        self.brand_fingerprints = {}
+        # Series and models written by this import. Redis only receives them when the transaction
+        # commits, so they are merged into what Redis reports before every diff.
+        self._written_series_and_models = {}
+        # Everything the '-Series' sheets list, per (category, brand), and their categories; only kept
+        # when reconciling
+        self._incoming_series_and_models = {}
+        self._series_categories = set()
 
     def process_excel_file(self):
-        xls = pd.ExcelFile(self.excel_file)
-        error_message = None
-
-        for sheet_name in xls.sheet_names:
-            try:
-                if '-Series' in sheet_name:
-                    self._process_series_and_models(xls, sheet_name)
-                elif sheet_name == 'Devices':
-                    self._process_device_categories(xls, sheet_name)
-                else:
-                    self._process_brands(xls, sheet_name)
-            except Exception as e:
-                error_message = f"Error processing sheet {sheet_name}: {e}"
-                break
-
-        return error_message
-
-    def _process_device_categories(self, xls, sheet_name):
-        existing_categories_names_in_redis = list(DeviceCategoryRepository.get_all_from_redis().keys())
-
-        df = pd.read_excel(xls, sheet_name=sheet_name)
-        categories_in_sheet = df['DeviceName'].dropna().str.lower().unique().tolist()
-        categories_in_sheet = [cat for cat in categories_in_sheet if cat != 'nan']
-
-        categories_to_add = [cat for cat in categories_in_sheet if cat not in existing_categories_names_in_redis]
-        categories_to_delete = [cat for cat in existing_categories_names_in_redis if cat not in categories_in_sheet]
-
-        for category_name in categories_to_add:
-            DeviceCategoryRepository.create(name=category_name)
-
-        for category_name in categories_to_delete:
-            DeviceCategoryRepository.delete(name=category_name)
-
-    def _process_brands(self, xls, sheet_name):
-        df = pd.read_excel(xls, sheet_name=sheet_name)
-
-        if not df.empty and len(df.columns) > 0:
-            category_type_header = str(df.columns[0])
-            category_type = category_type_header.replace('Name', '').lower()
-
-            brands_in_sheet = df.iloc[:, 0].dropna().str.lower().unique().tolist()
-            brands_in_sheet = [brand for brand in brands_in_sheet if brand != 'nan']
-
-            existing_brand_names_in_redis = list(
-                BrandRepository.get_brands_by_category_from_redis(category_type).keys())
-
-            brands_to_add = [brand for brand in brands_in_sheet if brand not in existing_brand_names_in_redis]
-            brands_to_delete = [brand for brand in existing_brand_names_in_redis if brand not in brands_in_sheet]
-
-            for brand_name in brands_to_add:
-                BrandRepository.create(name=brand_name, category_name=category_type)
-
-            for brand_name in brands_to_delete:
-                BrandRepository.delete(name=brand_name, category_name=category_type)
-
-    def _process_series_and_models(self, xls, sheet_name):
-        df = pd.read_excel(xls, sheet_name=sheet_name)
-
-        if not df.empty and len(df.columns) > 1:
-            category_type_header = str(df.columns[0])
-            category_type = category_type_header.replace('Name', '').lower()
-
-            for _, row in df.iterrows():
-                brand_name = row.iloc[0].lower() if pd.notnull(row.iloc[0]) else None
-                if brand_name in [None, 'nan']:
-                    continue
-
-                existing_series_and_models = SeriesRepository.get_series_and_models_by_brand(brand_name)
-
-                series_and_models_in_sheet = {}
-                current_series_name = None
-                for item in row.iloc[1:].dropna():
-                    item = str(item).lower()
-                    if item == 'nan':
-                        continue
-                    if 's' in item:
-                        current_series_name = item
-                        series_and_models_in_sheet[current_series_name] = []
-                    elif current_series_name:
-                        model_name = item
-                        series_and_models_in_sheet[current_series_name].append(model_name)
-
-                for series_name, models_in_sheet in series_and_models_in_sheet.items():
-                    if series_name != 'nan':
-                        if series_name not in existing_series_and_models:
-                            SeriesRepository.create(name=series_name, brand_name=brand_name)
-                            existing_series_and_models[series_name] = []
-
-                    for model_name in models_in_sheet:
-                        if model_name != 'nan':
-                            if model_name not in existing_series_and_models.get(series_name, []):
-                                DeviceModelRepository.create(name=model_name, series_name=series_name,
-                                                             brand_name=brand_name)
+        with self.metrics.stage(None, 'open'):
+            reader = get_workbook_reader(self.excel_file, backend=self.backend)
+        scheduler = SheetScheduler(reader, self.excel_file, backend=self.backend, workers=self.workers)
+        batch_size = settings.EXCEL_APPLY_BATCH_SHEETS
+        # Every foreign key of the import is resolved from memory after these few bulk queries
+        with self.metrics.stage(None, 'load_identity_map'):
+            if self.locks is not None:
+                self.locks.sync()
+            self.identity_map = HierarchyIdentityMap().load()
+            self.sheet_fingerprints, self.brand_fingerprints = SheetFingerprintRepository.get_all()
+            if self.checkpoint is not None:
+                self._done_sheets, self._committed_brands = self.checkpoint.load()
+
+        chunked = self.checkpoint is not None
+        completed = False
+        levels = scheduler.iter_levels()
+        try:
+            for level, sheets in levels:
+                # Sheets of the same level are applied in a bounded number of batched transactions
+                for start in range(0, len(sheets), batch_size):
+                    sheet_name = None
+                    try:
+                        with self._transaction(not chunked):
+                            for sheet_name, chunks in sheets[start:start + batch_size]:
+                                self._process_sheet(level, sheet_name, chunks)
+                    except Exception as e:
+                        return f"Error processing sheet {sheet_name}: {e}"
+
+                if level == SERIES_AND_MODELS and self.reconcile:
+                    try:
+                        with self._transaction(not chunked):
+                            self._reconcile_series_and_models()
+                    except Exception as e:
+                        return f"Error reconciling series and models: {e}"
+            completed = True
+        finally:
+            levels.close()
+            reader.close()
+            # A chunked import has committed its chunks as it went, so the snapshot only flips once
+            # every sheet is in. Otherwise the surrounding transaction decides.
+            if not self.dry_run and (completed or not chunked):
+                # Registered last so that it runs after the Redis writes of every batch have been flushed
+                transaction.on_commit(HierarchyService.build_snapshot)
+
+        return None
+
+    @staticmethod
+    @contextmanager
+    def _transaction(enabled):
+        """
+        Runs the block in a database transaction whose Redis writes are flushed on commit, or as
+        is when `enabled` is false because an outer block already does.
+        """
+        if not enabled:
+            yield
+            return
+        with transaction.atomic(), RedisUnitOfWork.batch():
+            yield
+
+    def _process_sheet(self, level, sheet_name, chunks):
+        if sheet_name in self._done_sheets:
+            # Committed before the import was resumed; reconciling still needs the rows it lists
+            if level == SERIES_AND_MODELS and self.reconcile:
+                for _, (category_type, series_and_models_by_brand) in chunks:
+                    self._collect_incoming(category_type, series_and_models_by_brand)
+            return
+
+        if self.progress:
+            self.progress.sheet_started(sheet_name)
+
+        parsed_chunks = self._count_rows(sheet_name, chunks)
+        # In a chunked import a sheet of names commits as a whole, a '-Series' sheet per unit of brands
+        chunked = self.checkpoint is not None
+        with self._transaction(chunked and level != SERIES_AND_MODELS):
+            if level == DEVICE_CATEGORIES:
+                self._process_device_categories(sheet_name, parsed_chunks)
+            elif level == BRANDS:
+                self._process_brands(sheet_name, parsed_chunks)
+            else:
+                self._process_series_and_models(sheet_name, parsed_chunks)
+            if chunked:
+                # After the units of a '-Series' sheet, the checkpoint gets a batch of its own
+                with self._transaction(level == SERIES_AND_MODELS):
+                    self.checkpoint.sheet_committed(sheet_name)
+
+        if self.progress:
+            self.progress.sheet_finished(sheet_name)
+
+    def _count_rows(self, sheet_name, chunks):
+        chunks = iter(chunks)
+        while True:
+            # Reading and parsing happen lazily, or in the parser pool, while the next chunk is fetched
+            with self.metrics.stage(sheet_name, 'parse'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+
+            row_count, parsed = chunk
+            self.metrics.add_rows(sheet_name, row_count)
+            yield parsed
+            if self.progress:
+                self.progress.rows_processed(sheet_name, row_count)
+
+    def _lock(self, names):
+        """
+        Takes the locks on the parts of the hierarchy about to be diffed. When another import
+        changed these parts meanwhile, the identity map is reloaded and the stored fingerprints
+        are no longer trusted to skip sheets, as they may describe its rows instead.
+        """
+        if self.locks is None:
+            return
+        with self.metrics.stage(None, 'lock'):
+            changed = self.locks.acquire(names)
+        if changed:
+            with self.metrics.stage(None, 'load_identity_map'):
+                self.identity_map.load()
+            self._trust_fingerprints = False
+
+    def _count_deleted(self, deleted_by_level):
+        for level, count in deleted_by_level.items():
+            self.metrics.count(f'{level}_deleted', count)
+
+    def _is_unchanged(self, sheet_name, fingerprint):
+        if not self._trust_fingerprints or self.sheet_fingerprints.get(sheet_name) != fingerprint:
+            return False
+        self.metrics.count('sheets_skipped')
+        return True
+
+    def _save_fingerprint(self, sheet_name, fingerprint, brand_fingerprints=None):
+        removed_brands = []
+        if brand_fingerprints is not None:
+            removed_brands = [brand_name for stored_sheet, brand_name in self.brand_fingerprints
+                              if stored_sheet == sheet_name and brand_name not in brand_fingerprints]
+            for brand_name in removed_brands:
+                del self.brand_fingerprints[(sheet_name, brand_name)]
+            self.brand_fingerprints.update(((sheet_name, brand_name), brand_fingerprint)
+                                           for brand_name, brand_fingerprint in brand_fingerprints.items())
+        self.sheet_fingerprints[sheet_name] = fingerprint
+        if not self.dry_run:
+            SheetFingerprintRepository.save(sheet_name, fingerprint, brand_fingerprints, removed_brands)
+
+    def _invalidate_fingerprints(self, levels, brand_names=None):
+        """
+        Forgets the fingerprints of the sheets of the given levels, or only of the given brands
+        and the sheets listing them, after deletes made the rows they describe disappear.
+        """
+        brand_keys = [key for key in self.brand_fingerprints if get_sheet_level(key[0]) in levels
+                      and (brand_names is None or key[1] in brand_names)]
+        if brand_names is None:
+            sheet_names = [name for name in self.sheet_fingerprints if get_sheet_level(name) in levels]
+        else:
+            sheet_names = list({sheet_name for sheet_name, _ in brand_keys if sheet_name in self.sheet_fingerprints})
+
+        for key in brand_keys:
+            del self.brand_fingerprints[key]
+        for name in sheet_names:
+            del self.sheet_fingerprints[name]
+        if not self.dry_run:
+            SheetFingerprintRepository.delete(sheet_names, brand_keys)
+
+    def _process_device_categories(self, sheet_name, parsed_chunks):
+        categories_in_sheet = set()
+        for categories in parsed_chunks:
+            categories_in_sheet |= categories
+
+        fingerprint = fingerprint_names(categories_in_sheet)
+        if self._is_unchanged(sheet_name, fingerprint):
+            return
+
+        with self.metrics.stage(sheet_name, 'diff'):
+            categories_to_add, categories_to_delete = self._diff_device_categories(categories_in_sheet)
+        if self.locks is not None and (categories_to_add or categories_to_delete):
+            # The list is only locked when it changes, so imports that leave it alone never wait on it.
+            # It may have changed before the lock was taken, so the diff is repeated under it.
+            self._lock([CATEGORY_LIST_LOCK])
+            with self.metrics.stage(sheet_name, 'diff'):
+                categories_to_add, categories_to_delete = self._diff_device_categories(categories_in_sheet)
+        # Deleting a category deletes the series and models of its brands too
+        self._lock([category_lock(name) for name in categories_to_add | categories_to_delete] +
+                   [brand_lock(brand_name) for category_name, brand_name in self.identity_map.brands
+                    if category_name in categories_to_delete])
+
+        if self.dry_run:
+            self.plan.record(DEVICE_CATEGORIES, ADD, categories_to_add)
+            self.plan.record(DEVICE_CATEGORIES, DELETE, categories_to_delete)
+            self._plan_cascade([(category_name, brand_name) for category_name, brand_name in self.identity_map.brands
+                                if category_name in categories_to_delete])
+            self.identity_map.remove_categories(categories_to_delete)
+            if categories_to_delete:
+                self._invalidate_fingerprints((BRANDS, SERIES_AND_MODELS))
+            return
+
+        with self.metrics.stage(sheet_name, 'apply'):
+            DeviceCategoryRepository.bulk_create(categories_to_add, identity_map=self.identity_map)
+            deleted = HierarchyCascadeRepository.delete_categories(categories_to_delete, identity_map=self.identity_map)
+        self.metrics.count('device_categories_inserted', len(categories_to_add))
+        self._count_deleted(deleted)
+        if self.locks is not None:
+            # Other imports may change the list again as soon as these changes have reached Redis
+            RedisUnitOfWork.after_flush(partial(self.locks.release, [CATEGORY_LIST_LOCK]))
+
+        if categories_to_delete:
+            # The brands, series and models of deleted categories went with them
+            self._invalidate_fingerprints((BRANDS, SERIES_AND_MODELS))
+        self._save_fingerprint(sheet_name, fingerprint)
+
+    @staticmethod
+    def _diff_device_categories(categories_in_sheet):
+        existing_categories_names_in_redis = DeviceCategoryRepository.get_all_from_redis().keys()
+        return DiffService.diff_names(existing_categories_names_in_redis, categories_in_sheet)
+
+    def _process_brands(self, sheet_name, parsed_chunks):
+        category_type = None
+        brands_in_sheet = set()
+        for chunk_category_type, brands in parsed_chunks:
+            category_type = category_type or chunk_category_type
+            brands_in_sheet |= brands
+
+        if category_type is None:
+            return
+
+        fingerprint = fingerprint_names(brands_in_sheet, category_type)
+        # A category missing from the 'Devices' sheet is added along with its brands, which changes
+        # the category list. Its lock is taken first, in the same order as the category sheet takes them.
+        adds_category = self.locks is not None and self.identity_map.get_category_id(category_type) is None
+        self._lock([CATEGORY_LIST_LOCK, category_lock(category_type)] if adds_category
+                   else [category_lock(category_type)])
+        if self.locks is not None and not adds_category and self.identity_map.get_category_id(category_type) is None:
+            # Another import deleted the category before its lock was taken
+            adds_category = True
+            self._lock([CATEGORY_LIST_LOCK])
+        if adds_category:
+            RedisUnitOfWork.after_flush(partial(self.locks.release, [CATEGORY_LIST_LOCK]))
+        if self._is_unchanged(sheet_name, fingerprint):
+            return
+
+        with self.metrics.stage(sheet_name, 'diff'):
+            existing_brand_names_in_redis = BrandRepository.get_brands_by_category_from_redis(category_type).keys()
+            brands_to_add, brands_to_delete = DiffService.diff_names(existing_brand_names_in_redis, brands_in_sheet)
+        self._lock([brand_lock(name) for name in brands_to_add | brands_to_delete])
+
+        if self.dry_run:
+            self.plan.record(BRANDS, ADD, (f"{category_type}/{name}" for name in brands_to_add))
+            self._plan_cascade([(category_type, name) for name in brands_to_delete])
+            self._planned_brands.update(brands_to_add)
+            if brands_to_delete:
+                self._invalidate_fingerprints((SERIES_AND_MODELS,), brand_names=brands_to_delete)
+            return
+
+        with self.metrics.stage(sheet_name, 'apply'):
+            BrandRepository.bulk_create(brands_to_add, category_name=category_type, identity_map=self.identity_map)
+            deleted = HierarchyCascadeRepository.delete_brands(brands_to_delete, category_name=category_type,
+                                                               identity_map=self.identity_map)
+        self.metrics.count('brands_inserted', len(brands_to_add))
+        self._count_deleted(deleted)
+
+        if brands_to_delete:
+            self._invalidate_fingerprints((SERIES_AND_MODELS,), brand_names=brands_to_delete)
+        self._save_fingerprint(sheet_name, fingerprint)
+
+    def _process_series_and_models(self, sheet_name, parsed_chunks):
+        fingerprint = SeriesSheetFingerprint()
+        if self.reconcile or not self._trust_fingerprints or sheet_name not in self.sheet_fingerprints:
+            # Nothing to compare with, so every chunk is diffed and applied on its own and only one
+            # chunk of rows, besides the names the fingerprint merges, is held at a time. Reconciling
+            # needs every row, so nothing is skipped.
+            for chunk_index, (category_type, series_and_models_by_brand) in enumerate(parsed_chunks):
+                fingerprint.add(category_type, series_and_models_by_brand)
+                if self.reconcile:
+                    self._collect_incoming(category_type, series_and_models_by_brand)
+                if series_and_models_by_brand:
+                    self._lock([brand_lock(name) for name in series_and_models_by_brand])
+                    self._apply_chunk(sheet_name, chunk_index, category_type, series_and_models_by_brand)
+            self._save_series_fingerprint(sheet_name, fingerprint.sheet_fingerprint(), fingerprint.brand_fingerprints())
+            return
+
+        # Which brands changed is only known once the whole sheet is read, so the parsed names are kept
+        buffered_chunks = []
+        for category_type, series_and_models_by_brand in parsed_chunks:
+            fingerprint.add(category_type, series_and_models_by_brand)
+            buffered_chunks.append((category_type, series_and_models_by_brand))
+
+        brand_fingerprints = fingerprint.brand_fingerprints()
+        self._lock([brand_lock(name) for name in brand_fingerprints])
+        if self._is_unchanged(sheet_name, fingerprint.sheet_fingerprint()):
+            return
+
+        changed_brands = {brand_name for brand_name, brand_fingerprint in brand_fingerprints.items()
+                          if not self._trust_fingerprints
+                          or self.brand_fingerprints.get((sheet_name, brand_name)) != brand_fingerprint}
+        self.metrics.count('brands_skipped', len(brand_fingerprints) - len(changed_brands))
+
+        for chunk_index, (category_type, series_and_models_by_brand) in enumerate(buffered_chunks):
+            changed = {brand_name: series_and_models for brand_name, series_and_models
+                       in series_and_models_by_brand.items() if brand_name in changed_brands}
+            if changed:
+                self._apply_chunk(sheet_name, chunk_index, category_type, changed)
+        self._save_series_fingerprint(sheet_name, fingerprint.sheet_fingerprint(), brand_fingerprints)
+
+    def _save_series_fingerprint(self, sheet_name, sheet_fingerprint, brand_fingerprints):
+        """
+        Saves the fingerprints of a '-Series' sheet. A chunked import has committed its brands
+        unit by unit, so they are written in a batch of their own, through the lock session
+        like every other hierarchy write.
+        """
+        with self._transaction(self.checkpoint is not None):
+            self._save_fingerprint(sheet_name, sheet_fingerprint, brand_fingerprints)
+
+    def _apply_chunk(self, sheet_name, chunk_index, category_type, series_and_models_by_brand):
+        """
+        Applies the brands of a chunk of a '-Series' sheet. A chunked import skips the brands of
+        the chunk that a previous run of the import committed and commits the others in units of
+        at most IMPORT_CHECKPOINT_BRANDS brands. Brands are recorded by chunk position and name,
+        which stay the same on every run as the chunks of a file always come in the same order,
+        whichever brands the fingerprints let a run skip.
+        """
+        if self.checkpoint is None:
+            self._apply_series_and_models(sheet_name, category_type, series_and_models_by_brand)
+            return
+
+        brand_names = [brand_name for brand_name in series_and_models_by_brand
+                       if (sheet_name, chunk_index, brand_name) not in self._committed_brands]
+        for start in range(0, len(brand_names), settings.IMPORT_CHECKPOINT_BRANDS):
+            unit = brand_names[start:start + settings.IMPORT_CHECKPOINT_BRANDS]
+            with self._transaction(True):
+                self._apply_series_and_models(sheet_name, category_type, {
+                    brand_name: series_and_models_by_brand[brand_name] for brand_name in unit
+                })
+                self.checkpoint.brands_committed(sheet_name, chunk_index, unit)
+
+    def _apply_series_and_models(self, sheet_name, category_type, series_and_models_by_brand):
+        with self.metrics.stage(sheet_name, 'diff'):
+            existing_by_brand = SeriesRepository.get_series_and_models_by_brands(series_and_models_by_brand.keys())
+
+        for brand_name, series_and_models_in_sheet in series_and_models_by_brand.items():
+            with self.metrics.stage(sheet_name, 'diff'):
+                existing_series_and_models = existing_by_brand[brand_name]
+                written = self._written_series_and_models.setdefault(brand_name, {})
+                for series_name, models in written.items():
+                    existing_series_and_models[series_name] = set(existing_series_and_models.get(series_name, ())) | models
+
+                series_to_add, _, models_to_add, _ = DiffService.diff_series_and_models(existing_series_and_models,
+                                                                                        series_and_models_in_sheet)
+
+            if self.dry_run:
+                self._plan_series_and_models(sheet_name, category_type, brand_name, series_to_add, models_to_add)
+                for series_name in series_to_add | models_to_add.keys():
+                    written.setdefault(series_name, set()).update(models_to_add.get(series_name, ()))
+                continue
+
+            with self.metrics.stage(sheet_name, 'apply'):
+                series_inserted = SeriesRepository.bulk_create(series_to_add, brand_name=brand_name,
+                                                               category_name=category_type,
+                                                               identity_map=self.identity_map)
+                models_inserted = DeviceModelRepository.bulk_create(models_to_add, brand_name=brand_name,
+                                                                    category_name=category_type,
+                                                                    identity_map=self.identity_map)
+            self.metrics.count('series_inserted', series_inserted)
+            self.metrics.count('device_models_inserted', models_inserted)
+
+            for series_name in series_to_add | models_to_add.keys():
+                written.setdefault(series_name, set()).update(models_to_add.get(series_name, ()))
+
+    def _collect_incoming(self, category_type, series_and_models_by_brand):
+        if category_type is not None:
+            self._series_categories.add(category_type)
+        for brand_name, series_and_models in series_and_models_by_brand.items():
+            incoming = self._incoming_series_and_models.setdefault((category_type, brand_name), {})
+            for series_name, models in series_and_models.items():
+                incoming.setdefault(series_name, set()).update(models)
+
+    def _reconcile_series_and_models(self):
+        """
+        Deletes the series and models of every brand of the categories of the '-Series' sheets
+        that the sheets no longer contain. Runs once all sheets were applied, as the rows of a brand
+        may be spread over many chunks and sheets. Brands are told apart by category, so the
+        same-name brands of categories without an uploaded '-Series' sheet keep their rows.
+        """
+        brands = {key: brand_id for key, brand_id in self.identity_map.brands.items()
+                  if key[0] in self._series_categories}
+        if not brands:
+            return
+
+        self._lock([brand_lock(brand_name) for _, brand_name in brands])
+        with self.metrics.stage(None, 'diff'):
+            # Read from the database, as the Redis sets are shared by same-name brands
+            existing_by_brand = SeriesRepository.get_series_and_models_by_brand_ids(brands.values())
+
+        for (category_name, brand_name), brand_id in sorted(brands.items()):
+            with self.metrics.stage(None, 'diff'):
+                _, series_to_delete, _, models_to_delete = DiffService.diff_series_and_models(
+                    existing_by_brand[brand_id], self._incoming_series_and_models.get((category_name, brand_name), {}))
+
+            if self.dry_run:
+                self.plan.record('series', DELETE, (f"{brand_name}/{name}" for name in series_to_delete))
+                self.plan.record('device_models', DELETE, (f"{brand_name}/{series_name}/{name}"
+                                                           for series_name, models in models_to_delete.items()
+                                                           for name in models))
+                continue
+
+            with self.metrics.stage(None, 'apply'), self._transaction(self.checkpoint is not None):
+                series_deleted = SeriesRepository.bulk_delete(series_to_delete, brand_name,
+                                                              identity_map=self.identity_map, brand_ids=[brand_id])
+                models_deleted = DeviceModelRepository.bulk_delete(models_to_delete, brand_name,
+                                                                    brand_ids=[brand_id])
+            self.metrics.count('series_deleted', series_deleted)
+            self.metrics.count('device_models_deleted', models_deleted)
+
+    def _plan_cascade(self, brand_keys):
+        """
+        Records the deletes of (category_name, brand_name) brands in the plan together with their
+        series and models, as the import deletes them in a cascade, and forgets the brands like the
+        import does.
+        """
+        brand_ids = [self.identity_map.brands[key] for key in brand_keys if key in self.identity_map.brands]
+        series, device_models = HierarchyCascadeRepository.get_brand_subtrees(brand_ids)
+        self.plan.record(BRANDS, DELETE, (f"{category_name}/{brand_name}" for category_name, brand_name in brand_keys))
+        self.plan.record('series', DELETE, ('/'.join(path) for path in series))
+        self.plan.record('device_models', DELETE, ('/'.join(path) for path in device_models))
+        self.identity_map.remove_brands(brand_keys)
+
+    def _plan_series_and_models(self, sheet_name, category_type, brand_name, series_to_add, models_to_add):
+        if (series_to_add or models_to_add) and brand_name not in self._planned_brands \
+                and self.identity_map.get_brand_id(brand_name, category_type) is None:
+            self.plan.error(sheet_name, f"Brand with name '{brand_name}' does not exist.")
+
+        self.plan.record('series', ADD, (f"{brand_name}/{name}" for name in series_to_add))
+        self.plan.record('device_models', ADD, (f"{brand_name}/{series_name}/{name}"
+                                                for series_name, models in models_to_add.items() for name in models))
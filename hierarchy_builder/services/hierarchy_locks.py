@@ -0,0 +1,170 @@
+import threading
+import time
+
+from django.conf import settings
+
+from hierarchy_builder.repositories.cache_repair_repository import CacheRepairRepository
+from hierarchy_builder.repositories.hierarchy_lock_repository import HierarchyLockRepository
+
+# The list of categories, written by the 'Devices' sheet
+CATEGORY_LIST_LOCK = 'categories'
+
+
+def category_lock(category_name):
+    """Names the lock on the brands of a category."""
+    return f"category|{category_name}"
+
+
+def brand_lock(brand_name):
+    """Names the lock on the series and models of the brands with a name, which share their Redis keys."""
+    return f"brand|{brand_name}"
+
+
+class HierarchyLockError(Exception):
+    pass
+
+
+class HierarchyLocks:
+    """
+    The leased locks one import holds on the parts of the hierarchy it writes. Locks are taken as
+    the import reaches each part and are held until the session ends, after its last commit,
+    unless the import releases them earlier. A background thread renews the leases; a session
+    whose leases ran out, e.g. because its worker stalled, can no longer flush to Redis, as every
+    flush is fenced by its token.
+
+    The renewer also calls `heartbeat`, when given, on every renewal, e.g. to renew the lease of
+    the import job running the session.
+    """
+
+    def __init__(self, wait_seconds=None, lease_seconds=None, heartbeat=None):
+        self.wait_seconds = settings.HIERARCHY_LOCK_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        lease_seconds = settings.HIERARCHY_LOCK_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.lease_ms = int(lease_seconds * 1000)
+        self.token = None
+        self.held = set()
+        # The generation the session's view of the hierarchy dates from, and those of its own flushes
+        self.generation = None
+        self._flushes = set()
+        self._lost = False
+        # Renewals and fenced flushes must not interleave, as a renewal touches the watched lock keys
+        self._mutex = threading.Lock()
+        self._stopping = threading.Event()
+        self._renewer = None
+        self._heartbeat = heartbeat
+
+    def __enter__(self):
+        self.token = HierarchyLockRepository.next_token()
+        self.sync()
+        if self._heartbeat is not None:
+            self._heartbeat()
+        self._renewer = threading.Thread(target=self._renew, daemon=True)
+        self._renewer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopping.set()
+        self._renewer.join()
+        with self._mutex:
+            HierarchyLockRepository.release(sorted(self.held), self.token)
+            self.held.clear()
+
+    def _renew(self):
+        while not self._stopping.wait(self.lease_ms / 3000):
+            with self._mutex:
+                if self.held and HierarchyLockRepository.renew(sorted(self.held), self.token,
+                                                               self.lease_ms) < len(self.held):
+                    self._lost = True
+            if self._heartbeat is not None:
+                self._heartbeat()
+
+    def sync(self):
+        """
+        Records the current generation. Called right before loading the state that later
+        `acquire` calls report as possibly stale.
+        """
+        self.generation = HierarchyLockRepository.get_generation()
+
+    def acquire(self, names):
+        """
+        Takes the locks the session does not hold yet, all at once. While another import holds
+        any of them, retries for up to `wait_seconds`.
+
+        Parameters:
+            names (iterable): The names of the locks.
+
+        Returns:
+            bool: Whether another import flushed changes under any of the locks since `sync`, or
+            since the last `acquire` that reported a change, in which case state loaded before may
+            be stale. Changes to parts of the hierarchy outside the locks are not reported.
+
+        Raises:
+            HierarchyLockError: If the locks could not be taken in time, or the session lost the
+            locks it held.
+        """
+        self.check()
+        names = set(names) - self.held
+        if not names:
+            return False
+
+        deadline = time.monotonic() + self.wait_seconds
+        delay = 0.05
+        while True:
+            with self._mutex:
+                acquired = HierarchyLockRepository.acquire(sorted(names), self.token, self.lease_ms)
+                if acquired is not None:
+                    self.held |= names
+                    break
+            if time.monotonic() + delay > deadline:
+                raise HierarchyLockError(f"Another import holds one of the locks {sorted(names)[:5]}.")
+            time.sleep(delay)
+            delay = min(delay * 2, 1)
+
+        generation, generations = acquired
+        changed = any(lock_generation > self.generation and lock_generation not in self._flushes
+                      for lock_generation in generations.values())
+        if changed:
+            self.generation = generation
+        return changed
+
+    def release(self, names):
+        """
+        Releases some of the locks before the session ends, e.g. once the writes they guard have
+        reached Redis.
+
+        Parameters:
+            names (iterable): The names of the locks.
+        """
+        with self._mutex:
+            names = set(names) & self.held
+            HierarchyLockRepository.release(sorted(names), self.token)
+            self.held -= names
+
+    def check(self):
+        """
+        Renews the leases of the locks the session holds, so that they outlast the database commit
+        and Redis flush that follow. Called right before every commit.
+
+        Raises:
+            HierarchyLockError: If the session lost any of its locks.
+        """
+        with self._mutex:
+            if not self._lost and self.held and HierarchyLockRepository.renew(sorted(self.held), self.token,
+                                                                              self.lease_ms) < len(self.held):
+                self._lost = True
+        if self._lost:
+            raise HierarchyLockError("The import lost its locks to another import.")
+
+    def execute(self, pipeline):
+        """
+        Flushes the writes buffered in a unit of work pipeline, provided the session still holds
+        its locks. Otherwise nothing is written to Redis; as the database has committed by then,
+        the parts of the hierarchy under the locks are scheduled for a cache rebuild, which import
+        workers run while idle.
+        """
+        with self._mutex:
+            generation = HierarchyLockRepository.execute_fenced(pipeline, sorted(self.held), self.token)
+            if generation is None:
+                self._lost = True
+                CacheRepairRepository.add(self.held)
+                return
+            self._flushes.add(generation)
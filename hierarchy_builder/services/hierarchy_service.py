@@ -1,16 +1,325 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
 from hierarchy_builder.repositories.device_category_repository import DeviceCategoryRepository
 from hierarchy_builder.repositories.brand_repository import BrandRepository
 from hierarchy_builder.repositories.series_repository import SeriesRepository
+from hierarchy_builder.repositories.hierarchy_lock_repository import HierarchyLockRepository
+from hierarchy_builder.repositories.hierarchy_snapshot_repository import HierarchySnapshotRepository
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 
 class HierarchyService:
+    # The last snapshot this process has read, reused for as long as its version is current
+    _local_snapshot = None
+    _local_checked_at = None
+
     @staticmethod
     def get_full_hierarchy():
         categories = DeviceCategoryRepository.get_all_from_redis()
+        brands_by_category = BrandRepository.get_brands_by_categories_from_redis(categories.keys())
+
+        brand_names = [brand_name for brands in brands_by_category.values() for brand_name in brands]
+        series_by_brand = SeriesRepository.get_series_and_models_by_brands(brand_names)
+
         hierarchy = {}
-        for category_name, category_id in categories.items():
-            brands = BrandRepository.get_brands_by_category_from_redis(category_name)
+        for category_name, brands in brands_by_category.items():
             hierarchy[category_name] = {}
-            for brand_name, brand_id in brands.items():
-                series_and_models = SeriesRepository.get_series_and_models_by_brand(brand_name)
-                hierarchy[category_name][brand_name] = series_and_models
+            for brand_name in brands:
+                hierarchy[category_name][brand_name] = series_by_brand[brand_name]
         return hierarchy
+
+    @staticmethod
+    def iter_full_hierarchy_json(batch_size=None):
+        """
+        Serializes the full hierarchy piece by piece. Categories and brands are read in pipelined
+        batches and every batch is written out before the next one is fetched, so memory use is
+        bounded by the batch size rather than by the size of the catalogue. The output is the
+        same compact JSON as `json.dumps(get_full_hierarchy(), separators=(',', ':'))`.
+
+        Parameters:
+            batch_size (int, optional): Categories and brands fetched per pipelined round trip.
+                Defaults to HIERARCHY_STREAM_BATCH_SIZE.
+
+        Yields:
+            bytes: Consecutive pieces of the JSON document.
+        """
+        batch_size = batch_size or settings.HIERARCHY_STREAM_BATCH_SIZE
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+
+        category_names = list(DeviceCategoryRepository.get_all_from_redis())
+        yield b'{'
+        for start in range(0, len(category_names), batch_size):
+            category_batch = category_names[start:start + batch_size]
+            brands_by_category = BrandRepository.get_brands_by_categories_from_redis(category_batch)
+            for index, category_name in enumerate(category_batch):
+                separator = ',' if start or index else ''
+                yield f"{separator}{encode(category_name)}:{{".encode('utf-8')
+
+                brand_names = list(brands_by_category[category_name])
+                for brand_start in range(0, len(brand_names), batch_size):
+                    brand_batch = brand_names[brand_start:brand_start + batch_size]
+                    series_by_brand = SeriesRepository.get_series_and_models_by_brands(brand_batch)
+                    members = ','.join(f"{encode(brand_name)}:{encode(series_by_brand[brand_name])}"
+                                       for brand_name in brand_batch)
+                    yield f"{',' if brand_start else ''}{members}".encode('utf-8')
+                yield b'}'
+        yield b'}'
+
+    @staticmethod
+    def _next_cursor(cursor):
+        return str(cursor) if cursor else None
+
+    @staticmethod
+    def get_category_subtree(category_name, depth=3, cursor=0, page_size=None, brand_names=None):
+        """
+        Reads the hierarchy below one category from its `brand|` hash and the series and models
+        sets of its brands only, one page of brands at a time.
+
+        Parameters:
+            category_name (str): The name of the category.
+            depth (int): 1 for brand names only, 2 to add series names, 3 to add models as well.
+            cursor (int): The cursor of the page to read, or 0 for the first page.
+            page_size (int, optional): The number of brands per page to aim for. Defaults to
+                HIERARCHY_PAGE_SIZE.
+            brand_names (iterable, optional): Reads only these brands instead of a page.
+
+        Returns:
+            dict: The category name, its brands (a sorted list at depth 1, a dictionary otherwise)
+            and the cursor of the next page, which is None after the last page. None if the
+            category does not exist.
+        """
+        if not DeviceCategoryRepository.exists_in_redis(category_name):
+            return None
+
+        if brand_names is not None:
+            next_cursor, brands = 0, BrandRepository.get_brands_by_names_from_redis(brand_names, category_name)
+        else:
+            next_cursor, brands = BrandRepository.scan_brands_from_redis(
+                category_name, cursor=cursor, count=page_size or settings.HIERARCHY_PAGE_SIZE)
+
+        brand_names = sorted(brands)
+        if depth <= 1:
+            subtree = brand_names
+        elif depth == 2:
+            subtree = SeriesRepository.get_series_by_brands(brand_names)
+        else:
+            subtree = SeriesRepository.get_series_and_models_by_brands(brand_names)
+        return {'category': category_name, 'brands': subtree, 'next_cursor': HierarchyService._next_cursor(next_cursor)}
+
+    @staticmethod
+    def get_brand_subtree(category_name, brand_name, depth=2, cursor=0, page_size=None, series_names=None):
+        """
+        Reads the series and models of one brand of a category, one page of series at a time.
+
+        Parameters:
+            category_name (str): The name of the category.
+            brand_name (str): The name of the brand.
+            depth (int): 1 for series names only, 2 to add their models.
+            cursor (int): The cursor of the page to read, or 0 for the first page.
+            page_size (int, optional): The number of series per page to aim for. Defaults to
+                HIERARCHY_PAGE_SIZE.
+            series_names (iterable, optional): Reads only these series instead of a page.
+
+        Returns:
+            dict: The category and brand names, the brand's series (a sorted list at depth 1, a
+            dictionary of sorted model lists otherwise) and the cursor of the next page, which is
+            None after the last page. None if the brand does not exist in the category.
+        """
+        if not BrandRepository.exists_in_redis(brand_name, category_name):
+            return None
+
+        if series_names is not None:
+            next_cursor, series_names = 0, SeriesRepository.get_existing_series(brand_name, series_names)
+        else:
+            next_cursor, series_names = SeriesRepository.scan_series(
+                brand_name, cursor=cursor, count=page_size or settings.HIERARCHY_PAGE_SIZE)
+
+        series_names = sorted(series_names)
+        subtree = series_names if depth <= 1 else SeriesRepository.get_models_by_series(brand_name, series_names)
+        return {'category': category_name, 'brand': brand_name, 'series': subtree,
+                'next_cursor': HierarchyService._next_cursor(next_cursor)}
+
+    @staticmethod
+    def _remember(snapshot):
+        HierarchyService._local_snapshot = snapshot
+        HierarchyService._local_checked_at = time.monotonic()
+        return snapshot
+
+    @staticmethod
+    def build_snapshot():
+        """
+        Serializes the current hierarchy, compresses it with every available encoding and stores
+        it as a new snapshot version, unless a concurrent build from a newer hierarchy generation
+        stored its snapshot first.
+
+        Returns:
+            HierarchySnapshot: The stored snapshot, or the newer one that was kept.
+        """
+        # Read first, so that changes flushed while serializing make the snapshot count as older
+        generation = HierarchyLockRepository.get_generation()
+        # Joining the streamed pieces skips the nested dictionary of the whole hierarchy
+        content = b''.join(HierarchyService.iter_full_hierarchy_json())
+        encodings = {'gzip': gzip.compress(content, compresslevel=9)}
+        if brotli is not None:
+            encodings['br'] = brotli.compress(content, quality=9)
+
+        snapshot = HierarchySnapshotRepository.save(generation, content, updated_at=time.time(),
+                                                    etag=hashlib.sha1(content).hexdigest(), encodings=encodings)
+        if snapshot is None:
+            snapshot = HierarchySnapshotRepository.get()
+        return HierarchyService._remember(snapshot)
+
+    @staticmethod
+    def get_snapshot():
+        """
+        Returns the serialized hierarchy. The in-process copy is served without touching Redis for
+        HIERARCHY_SNAPSHOT_CHECK_INTERVAL seconds after its version was last confirmed; after that
+        a single GET checks the version. The snapshot is built on first use.
+
+        Returns:
+            HierarchySnapshot: The current snapshot.
+        """
+        local_snapshot = HierarchyService._local_snapshot
+        if (local_snapshot is not None
+                and time.monotonic() - HierarchyService._local_checked_at < settings.HIERARCHY_SNAPSHOT_CHECK_INTERVAL):
+            return local_snapshot
+
+        version = HierarchySnapshotRepository.get_version()
+        if version is None:
+            return HierarchyService.build_snapshot()
+
+        if local_snapshot is not None and local_snapshot.version == version:
+            return HierarchyService._remember(local_snapshot)
+
+        snapshot = HierarchySnapshotRepository.get()
+        if snapshot is None:
+            return HierarchyService.build_snapshot()
+        return HierarchyService._remember(snapshot)
+
+    @staticmethod
+    async def aget_snapshot():
+        """
+        Async version of `get_snapshot`. Building a missing snapshot runs in a worker thread.
+        """
+        local_snapshot = HierarchyService._local_snapshot
+        if (local_snapshot is not None
+                and time.monotonic() - HierarchyService._local_checked_at < settings.HIERARCHY_SNAPSHOT_CHECK_INTERVAL):
+            return local_snapshot
+
+        version = await HierarchySnapshotRepository.aget_version()
+        if version is not None and local_snapshot is not None and local_snapshot.version == version:
+            return HierarchyService._remember(local_snapshot)
+
+        snapshot = await HierarchySnapshotRepository.aget() if version is not None else None
+        if snapshot is None:
+            return await sync_to_async(HierarchyService.build_snapshot)()
+        return HierarchyService._remember(snapshot)
+
+    @staticmethod
+    async def _aprefetched(batches, fetch):
+        """
+        Yields (batch, result) pairs in order while the request for the next batch is already in flight.
+        """
+        task = asyncio.ensure_future(fetch(batches[0])) if batches else None
+        for index, batch in enumerate(batches):
+            result = await task
+            if index + 1 < len(batches):
+                task = asyncio.ensure_future(fetch(batches[index + 1]))
+            yield batch, result
+
+    @staticmethod
+    async def aiter_full_hierarchy_json(batch_size=None):
+        """
+        Async version of `iter_full_hierarchy_json`, reading category by category like it. The
+        brand hashes of the next category batch and the series of the next brand batch are fetched
+        while the current batch is written out, so at most one batch of each is held ahead.
+
+        Yields:
+            bytes: Consecutive pieces of the JSON document.
+        """
+        batch_size = batch_size or settings.HIERARCHY_STREAM_BATCH_SIZE
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+
+        category_names = list(await DeviceCategoryRepository.aget_all_from_redis())
+        category_batches = [category_names[start:start + batch_size]
+                            for start in range(0, len(category_names), batch_size)]
+        separator = ''
+        yield b'{'
+        async for category_batch, brands_by_category in HierarchyService._aprefetched(
+                category_batches, BrandRepository.aget_brands_by_categories_from_redis):
+            for category_name in category_batch:
+                yield f"{separator}{encode(category_name)}:{{".encode('utf-8')
+                separator = ','
+
+                brand_names = list(brands_by_category[category_name])
+                brand_batches = [brand_names[start:start + batch_size] for start in range(0, len(brand_names), batch_size)]
+                brand_separator = ''
+                async for brand_batch, series_by_brand in HierarchyService._aprefetched(
+                        brand_batches, SeriesRepository.aget_series_and_models_by_brands):
+                    members = ','.join(f"{encode(brand_name)}:{encode(series_by_brand[brand_name])}"
+                                       for brand_name in brand_batch)
+                    yield f"{brand_separator}{members}".encode('utf-8')
+                    brand_separator = ','
+                yield b'}'
+        yield b'}'
+
+    @staticmethod
+    async def aget_category_subtree(category_name, depth=3, cursor=0, page_size=None, brand_names=None):
+        """
+        Async version of `get_category_subtree`. The existence check and the page of brands are
+        fetched concurrently.
+        """
+        if brand_names is not None:
+            brands_request = BrandRepository.aget_brands_by_names_from_redis(brand_names, category_name)
+        else:
+            brands_request = BrandRepository.ascan_brands_from_redis(
+                category_name, cursor=cursor, count=page_size or settings.HIERARCHY_PAGE_SIZE)
+        exists, brands = await asyncio.gather(DeviceCategoryRepository.aexists_in_redis(category_name), brands_request)
+        if not exists:
+            return None
+
+        next_cursor, brands = (0, brands) if brand_names is not None else brands
+        brand_names = sorted(brands)
+        if depth <= 1:
+            subtree = brand_names
+        elif depth == 2:
+            subtree = await SeriesRepository.aget_series_by_brands(brand_names)
+        else:
+            subtree = await SeriesRepository.aget_series_and_models_by_brands(brand_names)
+        return {'category': category_name, 'brands': subtree, 'next_cursor': HierarchyService._next_cursor(next_cursor)}
+
+    @staticmethod
+    async def aget_brand_subtree(category_name, brand_name, depth=2, cursor=0, page_size=None, series_names=None):
+        """
+        Async version of `get_brand_subtree`. The existence check and the page of series are
+        fetched concurrently.
+        """
+        if series_names is not None:
+            series_request = SeriesRepository.aget_existing_series(brand_name, series_names)
+        else:
+            series_request = SeriesRepository.ascan_series(brand_name, cursor=cursor,
+                                                           count=page_size or settings.HIERARCHY_PAGE_SIZE)
+        exists, series = await asyncio.gather(BrandRepository.aexists_in_redis(brand_name, category_name),
+                                              series_request)
+        if not exists:
+            return None
+
+        next_cursor, series_names = (0, series) if series_names is not None else series
+        series_names = sorted(series_names)
+        if depth <= 1:
+            subtree = series_names
+        else:
+            subtree = await SeriesRepository.aget_models_by_series(brand_name, series_names)
+        return {'category': category_name, 'brand': brand_name, 'series': subtree,
+                'next_cursor': HierarchyService._next_cursor(next_cursor)}
@@ -0,0 +1,438 @@
+import json
+import os
+import socket
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from hierarchy_builder.repositories.import_checkpoint_repository import ImportCheckpointRepository
+from hierarchy_builder.repositories.import_job_repository import ImportJobRepository
+from hierarchy_builder.repositories.import_metrics_repository import ImportMetricsRepository
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+from hierarchy_builder.services.cache_rebuild_service import CacheRebuildService
+from hierarchy_builder.services.excel_service import ExcelService
+from hierarchy_builder.services.hierarchy_locks import HierarchyLocks
+from hierarchy_builder.services.import_metrics import ImportMetrics
+
+
+class ImportJobError(Exception):
+    pass
+
+
+class ImportJobProgress:
+    """
+    Receives progress callbacks from ExcelService and records them on the job in Redis.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.rows_processed_total = 0
+        self.sheets = {}
+        self._started = {}
+
+    def sheet_started(self, sheet_name):
+        self._started[sheet_name] = time.monotonic()
+        self.sheets[sheet_name] = {'status': 'running', 'rows_processed': 0,
+                                   'started_at': timezone.now().isoformat()}
+        ImportJobRepository.update(self.job_id, current_sheet=sheet_name)
+        ImportJobRepository.update_sheet(self.job_id, sheet_name, self.sheets[sheet_name])
+
+    def rows_processed(self, sheet_name, count):
+        self.rows_processed_total += count
+        self.sheets[sheet_name]['rows_processed'] += count
+        ImportJobRepository.update(self.job_id, rows_processed=self.rows_processed_total)
+        ImportJobRepository.update_sheet(self.job_id, sheet_name, self.sheets[sheet_name])
+
+    def sheet_finished(self, sheet_name):
+        self.sheets[sheet_name].update(status='done', finished_at=timezone.now().isoformat(),
+                                       duration_seconds=round(time.monotonic() - self._started[sheet_name], 3))
+        ImportJobRepository.update_sheet(self.job_id, sheet_name, self.sheets[sheet_name])
+
+
+class ImportCheckpoint:
+    """
+    Receives checkpoint callbacks from a chunked ExcelService and records them for the job in
+    Redis, together with the rows they cover.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def load(self):
+        return ImportCheckpointRepository.get(self.job_id)
+
+    def brands_committed(self, sheet_name, chunk_index, brand_names):
+        ImportCheckpointRepository.save_brands(self.job_id, sheet_name, chunk_index, brand_names)
+        ImportJobRepository.update(self.job_id, checkpoint_at=timezone.now().isoformat())
+
+    def sheet_committed(self, sheet_name):
+        ImportCheckpointRepository.save_sheet(self.job_id, sheet_name)
+        ImportJobRepository.update(self.job_id, checkpoint_at=timezone.now().isoformat())
+
+
+METRIC_HELP = {
+    'excel_imports_total': 'Finished Excel imports by outcome.',
+    'excel_import_duration_seconds': 'Wall time of finished Excel imports.',
+    'excel_import_stage_seconds_total': 'Wall time spent per import stage.',
+    'excel_import_rows_total': 'Rows read from uploaded workbooks.',
+    'excel_import_sheets_skipped_total': 'Sheets skipped because their content had not changed.',
+    'excel_import_brands_skipped_total': 'Brands of changed series sheets skipped because their rows had not changed.',
+    'excel_import_inserted_rows_total': 'Rows inserted per hierarchy level.',
+    'excel_import_deleted_rows_total': 'Rows deleted per hierarchy level.',
+    'excel_import_sql_queries_total': 'SQL queries issued by imports.',
+    'excel_import_redis_commands_total': 'Redis commands issued by imports.',
+    'excel_import_redis_round_trips_total': 'Redis round trips made by imports.',
+}
+
+# Families exposed as summaries, i.e. a <name>_sum and a <name>_count series; every other family is a counter
+SUMMARY_METRICS = {'excel_import_duration_seconds'}
+
+
+class ImportJobService:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    IMPORT = 'import'
+    PLAN = 'plan'
+
+    @staticmethod
+    def _spool_path(job_id, file_name):
+        os.makedirs(settings.IMPORT_SPOOL_DIR, exist_ok=True)
+        extension = os.path.splitext(file_name)[1].lower()
+        return os.path.join(settings.IMPORT_SPOOL_DIR, f"{job_id}{extension}")
+
+    @staticmethod
+    def submit(uploaded_file, backend=None, reconcile=False, dry_run=False, chunked=False):
+        """
+        Saves an uploaded workbook to the spool directory and queues it for a worker.
+
+        Parameters:
+            uploaded_file (UploadedFile): The uploaded workbook.
+            backend (str, optional): The ingestion backend to read the workbook with.
+            reconcile (bool): Whether series and models missing from the workbook are deleted.
+            dry_run (bool): Only plan the import. The workbook is kept until the plan is applied
+                with `apply_plan` or the job expires.
+            chunked (bool): Commit the import in chunks with checkpoints instead of in one
+                transaction. The workbook of a failed chunked import is kept for `resume`.
+
+        Returns:
+            str: The identifier of the queued job.
+        """
+        job_id = uuid.uuid4().hex
+        file_path = ImportJobService._spool_path(job_id, uploaded_file.name)
+
+        with open(file_path, 'wb') as spool_file:
+            for chunk in uploaded_file.chunks():
+                spool_file.write(chunk)
+
+        ImportJobRepository.create(job_id, status=ImportJobService.QUEUED, file_name=uploaded_file.name,
+                                   file_path=file_path, backend=backend or '',
+                                   reconcile=int(reconcile), chunked=int(chunked),
+                                   mode=ImportJobService.PLAN if dry_run else ImportJobService.IMPORT,
+                                   created_at=timezone.now().isoformat())
+        return job_id
+
+    @staticmethod
+    def resume(job_id):
+        """
+        Queues a chunked import again so that it continues after its last checkpoint. Only an
+        import that failed, or whose worker stopped renewing its heartbeat for
+        IMPORT_JOB_STALE_SECONDS, e.g. because it was killed, can be resumed.
+
+        Parameters:
+            job_id (str): The identifier of the import job.
+
+        Returns:
+            str: The identifier of the job, or None if no chunked import has that identifier.
+
+        Raises:
+            ImportJobError: If the import is still running, finished or lost its workbook.
+        """
+        job = ImportJobRepository.get(job_id)
+        if job is None or job.get('mode') != ImportJobService.IMPORT or job.get('chunked') != '1':
+            return None
+
+        if job['status'] == ImportJobService.RUNNING:
+            stale_seconds = (timezone.now() - ImportJobService._heartbeat_at(job)).total_seconds()
+            if stale_seconds < settings.IMPORT_JOB_STALE_SECONDS:
+                raise ImportJobError("The import is still running.")
+        elif job['status'] != ImportJobService.FAILED:
+            raise ImportJobError(f"The import is {job['status']}; only a failed or stalled import can be resumed.")
+        if not os.path.exists(job['file_path']):
+            raise ImportJobError("The workbook of the import has expired.")
+
+        ImportJobRepository.requeue(job_id, status=ImportJobService.QUEUED,
+                                    resumed=int(job.get('resumed', 0)) + 1)
+        return job_id
+
+    @staticmethod
+    def apply_plan(job_id):
+        """
+        Queues the import of a workbook whose plan succeeded, reusing its spooled file and its
+        options. The import diffs again against the state at the time it runs.
+
+        Parameters:
+            job_id (str): The identifier of the plan job.
+
+        Returns:
+            str: The identifier of the queued import job, or None if no plan job has that identifier.
+
+        Raises:
+            ImportJobError: If the plan has not succeeded, found errors or was already applied.
+        """
+        job = ImportJobRepository.get(job_id)
+        if job is None or job.get('mode') != ImportJobService.PLAN:
+            return None
+        if job['status'] != ImportJobService.SUCCEEDED:
+            raise ImportJobError(f"The plan is {job['status']}; only a succeeded plan can be applied.")
+        if not json.loads(job['plan'])['valid']:
+            raise ImportJobError("The plan found errors and cannot be applied.")
+
+        import_job_id = uuid.uuid4().hex
+        file_path = ImportJobService._spool_path(import_job_id, job['file_name'])
+        try:
+            # Moving the file also makes sure a plan is applied at most once
+            os.replace(job['file_path'], file_path)
+        except FileNotFoundError:
+            raise ImportJobError("The plan was already applied or has expired.")
+
+        ImportJobRepository.create(import_job_id, status=ImportJobService.QUEUED, file_name=job['file_name'],
+                                   file_path=file_path, backend=job.get('backend', ''),
+                                   reconcile=job.get('reconcile', 0), chunked=job.get('chunked', 0),
+                                   mode=ImportJobService.IMPORT,
+                                   plan_job_id=job_id, created_at=timezone.now().isoformat())
+        ImportJobRepository.update(job_id, applied_job_id=import_job_id)
+        return import_job_id
+
+    @staticmethod
+    def get_status(job_id):
+        """
+        Retrieves the state, timing and per-sheet progress of an import job.
+
+        Returns:
+            dict: The job status, or None if the job does not exist or has expired.
+        """
+        job = ImportJobRepository.get(job_id)
+        if job is None:
+            return None
+
+        job.pop('file_path', None)
+        job['rows_processed'] = int(job.get('rows_processed', 0))
+        job['reconcile'] = job.get('reconcile') == '1'
+        if 'duration_seconds' in job:
+            job['duration_seconds'] = float(job['duration_seconds'])
+        if 'metrics' in job:
+            job['metrics'] = json.loads(job['metrics'])
+        if 'plan' in job:
+            job['plan'] = json.loads(job['plan'])
+        return job
+
+    @staticmethod
+    def run(job_id):
+        """
+        Imports the spooled workbook of a job inside a single database transaction and records
+        the outcome and the import metrics on the job. The spooled file is removed afterwards and
+        the metrics are added to the cumulative series served by the /metrics endpoint.
+
+        Plan jobs only read and diff: the change set is recorded on the job as 'plan' and the
+        spooled file is kept for `apply_plan`. Chunked jobs commit as they go and record
+        checkpoints; when one fails, the spooled file is kept for `resume`.
+
+        Imports lock the categories and brands they write as they reach them and hold the locks
+        until their last commit, so that imports of unrelated categories run side by side and
+        conflicting ones wait for up to HIERARCHY_LOCK_WAIT_SECONDS before failing. The thread
+        renewing the locks renews the job's heartbeat as well, also for plans, which take no locks.
+        """
+        job = ImportJobRepository.get(job_id)
+        if job is None:
+            return
+
+        dry_run = job.get('mode') == ImportJobService.PLAN
+        checkpoint = ImportCheckpoint(job_id) if job.get('chunked') == '1' and not dry_run else None
+        plan = None
+
+        now = timezone.now().isoformat()
+        ImportJobRepository.update(job_id, status=ImportJobService.RUNNING, started_at=now, heartbeat_at=now)
+        metrics = ImportMetrics()
+        started = time.monotonic()
+        status = ImportJobService.SUCCEEDED
+        error = None
+        try:
+            heartbeat = partial(ImportJobService._heartbeat, job_id)
+            with metrics.instrument(), HierarchyLocks(heartbeat=heartbeat) as session:
+                # Plans write nothing, so they take no locks
+                locks = None if dry_run else session
+                with RedisUnitOfWork.fenced(locks), transaction.atomic() if checkpoint is None else nullcontext():
+                    excel_service = ExcelService(job['file_path'], backend=job.get('backend') or None,
+                                                 progress=ImportJobProgress(job_id), metrics=metrics,
+                                                 reconcile=job.get('reconcile') == '1', dry_run=dry_run,
+                                                 checkpoint=checkpoint, locks=locks)
+                    error_message = excel_service.process_excel_file()
+                    plan = excel_service.plan
+                    if error_message:
+                        # Raising rolls back the rows written by the sheets processed before the failure,
+                        # except for the chunks a chunked import already committed
+                        raise ImportJobError(error_message)
+                    if locks is not None:
+                        # Raising here still rolls the import back; after the commit it could only be repaired
+                        locks.check()
+                    # The commit itself, including the Redis flushes and the snapshot run on commit
+                    commit_started = time.perf_counter()
+                metrics.add_time(None, 'commit', time.perf_counter() - commit_started)
+        except Exception as e:
+            status = ImportJobService.FAILED
+            error = str(e)
+        finally:
+            keep_file = status == ImportJobService.SUCCEEDED if dry_run else \
+                status == ImportJobService.FAILED and checkpoint is not None
+            if not keep_file and os.path.exists(job['file_path']):
+                os.remove(job['file_path'])
+            if checkpoint is not None and status == ImportJobService.SUCCEEDED:
+                ImportCheckpointRepository.delete(job_id)
+
+        duration = round(time.monotonic() - started, 3)
+        fields = {'status': status, 'finished_at': timezone.now().isoformat(), 'duration_seconds': duration,
+                  'metrics': json.dumps(metrics.as_dict())}
+        if error is not None:
+            fields['error'] = error
+        if plan is not None:
+            fields['plan'] = json.dumps(plan.as_dict())
+        ImportJobRepository.update(job_id, **fields)
+        if not dry_run:
+            # Plans write nothing, so they are kept out of the import series
+            ImportMetricsRepository.increment(ImportJobService._prometheus_series(status, duration, metrics))
+
+    @staticmethod
+    def _prometheus_series(status, duration, metrics):
+        """
+        Converts the metrics of one import into increments of the cumulative Prometheus series.
+        """
+        series = {
+            f'excel_imports_total{{status="{status}"}}': 1,
+            'excel_import_duration_seconds_sum': duration,
+            'excel_import_duration_seconds_count': 1,
+        }
+        for stage, seconds in metrics.stages.items():
+            series[f'excel_import_stage_seconds_total{{stage="{stage}"}}'] = seconds
+        for name, value in metrics.counters.items():
+            if name.endswith('_inserted') or name.endswith('_deleted'):
+                level, _, action = name.rpartition('_')
+                series[f'excel_import_{action}_rows_total{{level="{level}"}}'] = value
+            else:
+                series[f'excel_import_{name}_total'] = value
+        return series
+
+    @staticmethod
+    def render_metrics():
+        """
+        Renders the cumulative import metrics and the queue length in the Prometheus text
+        exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        series_by_metric = {}
+        for name, value in sorted(ImportMetricsRepository.get_all().items()):
+            metric = name.partition('{')[0]
+            for suffix in ('_sum', '_count'):
+                if metric.endswith(suffix) and metric[:-len(suffix)] in SUMMARY_METRICS:
+                    metric = metric[:-len(suffix)]
+            series_by_metric.setdefault(metric, []).append((name, value))
+
+        lines = []
+        for metric, series in series_by_metric.items():
+            lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} {'summary' if metric in SUMMARY_METRICS else 'counter'}")
+            lines.extend(f"{name} {value:g}" for name, value in series)
+
+        lines.append("# HELP excel_import_queue_length Import jobs waiting for a worker.")
+        lines.append("# TYPE excel_import_queue_length gauge")
+        lines.append(f"excel_import_queue_length {ImportJobRepository.queue_length()}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def remove_expired_spool_files():
+        """
+        Removes the spooled workbooks of plans that were never applied once their job has expired.
+        """
+        if not os.path.isdir(settings.IMPORT_SPOOL_DIR):
+            return
+        expires_before = time.time() - settings.IMPORT_JOB_TTL
+        for entry in os.scandir(settings.IMPORT_SPOOL_DIR):
+            if entry.is_file() and entry.stat().st_mtime < expires_before:
+                os.remove(entry.path)
+
+    @staticmethod
+    def _heartbeat(job_id):
+        """
+        Renews the lease of a running job, which tells idle workers that its worker is alive.
+        """
+        ImportJobRepository.update(job_id, heartbeat_at=timezone.now().isoformat())
+
+    @staticmethod
+    def _heartbeat_at(job):
+        """
+        Returns the time the lease of a job was last renewed, or the time it was created before
+        its first run.
+        """
+        return max(datetime.fromisoformat(job[field]) for field in ('created_at', 'heartbeat_at') if job.get(field))
+
+    @staticmethod
+    def sweep_stale_jobs():
+        """
+        Takes the jobs of workers that stopped, e.g. because they were killed, out of their
+        processing lists once their heartbeat was not renewed for IMPORT_JOB_STALE_SECONDS. A
+        worker renews it every third of HIERARCHY_LOCK_LEASE_SECONDS while it runs the job, also
+        within long steps such as a large apply or the commit. Such a job is queued again, where a
+        chunked import continues after its last checkpoint and any other import starts over, as its
+        transaction was rolled back. After IMPORT_JOB_MAX_ATTEMPTS runs, or once its workbook
+        expired, it is marked as failed instead.
+
+        Returns:
+            int: The number of jobs taken out of processing lists.
+        """
+        now = timezone.now()
+
+        def decide(job):
+            if job['status'] in (ImportJobService.SUCCEEDED, ImportJobService.FAILED):
+                # The worker stopped after finishing the job but before acknowledging it
+                return {}, False
+            if (now - ImportJobService._heartbeat_at(job)).total_seconds() < settings.IMPORT_JOB_STALE_SECONDS:
+                return None
+
+            attempts = int(job.get('attempts', 1))
+            if attempts < settings.IMPORT_JOB_MAX_ATTEMPTS and os.path.exists(job['file_path']):
+                return {'status': ImportJobService.QUEUED, 'attempts': attempts + 1}, True
+            return {'status': ImportJobService.FAILED, 'finished_at': now.isoformat(),
+                    'error': f"The worker running the import stopped after {attempts} attempt(s)."}, False
+
+        return sum(ImportJobRepository.reclaim(worker_id, job_id, decide)
+                   for worker_id, job_id in ImportJobRepository.get_processing())
+
+    @staticmethod
+    def work(poll_timeout=5, stop=None):
+        """
+        Processes queued jobs one at a time until `stop()` returns True.
+
+        Parameters:
+            poll_timeout (int): Seconds to block on the queue before checking `stop` again.
+            stop (callable, optional): Returns True when the worker should exit.
+        """
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        while not (stop and stop()):
+            job_id = ImportJobRepository.dequeue(worker_id, timeout=poll_timeout)
+            if job_id:
+                ImportJobService.run(job_id)
+                ImportJobRepository.acknowledge(worker_id, job_id)
+            else:
+                ImportJobService.remove_expired_spool_files()
+                ImportJobService.sweep_stale_jobs()
+                CacheRebuildService.repair_scheduled()
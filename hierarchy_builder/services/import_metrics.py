@@ -0,0 +1,75 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+
+from hierarchy_builder.repositories.counting_redis import count_redis_commands
+
+
+class ImportMetrics:
+    """
+    Collects the wall time per sheet and stage and the counters of a single import: rows read,
+    rows inserted and deleted per level, SQL queries, Redis commands and Redis round trips.
+    Recording is a few dictionary updates, so it is always on.
+    """
+
+    def __init__(self):
+        self.sheets = {}
+        self.stages = Counter()
+        self.counters = Counter()
+
+    def _sheet(self, sheet_name):
+        return self.sheets.setdefault(sheet_name, {'rows': 0, 'stages': Counter()})
+
+    @contextmanager
+    def stage(self, sheet_name, stage):
+        """
+        Adds the wall time of the block to a stage of a sheet, or of the whole import when
+        `sheet_name` is None.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(sheet_name, stage, time.perf_counter() - started)
+
+    def add_time(self, sheet_name, stage, seconds):
+        self.stages[stage] += seconds
+        if sheet_name is not None:
+            self._sheet(sheet_name)['stages'][stage] += seconds
+
+    def add_rows(self, sheet_name, count):
+        self._sheet(sheet_name)['rows'] += count
+        self.counters['rows'] += count
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    @contextmanager
+    def instrument(self):
+        """
+        Counts the SQL queries and the Redis commands and round trips the current thread issues
+        inside the block, through its default database connection and the django_redis client.
+        Other threads, e.g. the lock renewer or concurrent requests, are not counted.
+        """
+        def count_query(execute, sql, params, many, context):
+            self.counters['sql_queries'] += 1
+            return execute(sql, params, many, context)
+
+        with count_redis_commands(self.counters), connection.execute_wrapper(count_query):
+            yield self
+
+    def as_dict(self):
+        """
+        Returns the collected metrics as a JSON-serializable dictionary with times in seconds.
+        """
+        return {
+            'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            'counters': dict(self.counters),
+            'sheets': {
+                sheet_name: {'rows': sheet['rows'],
+                             'stages': {stage: round(seconds, 4) for stage, seconds in sheet['stages'].items()}}
+                for sheet_name, sheet in self.sheets.items()
+            },
+        }
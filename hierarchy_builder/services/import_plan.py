@@ -0,0 +1,49 @@
+ADD = 'add'
+DELETE = 'delete'
+
+
+class ImportPlan:
+    """
+    Collects the changes a dry-run import would make: per level, the number of rows to add and
+    to delete with a sample of each, and the problems that would make the import fail.
+    """
+
+    def __init__(self, sample_size=20):
+        self.sample_size = sample_size
+        self.levels = {}
+        self.errors = []
+
+    def record(self, level, action, names):
+        """
+        Adds planned changes to a level.
+
+        Parameters:
+            level (str): The level, e.g. 'brands'.
+            action (str): Either 'add' or 'delete'.
+            names (iterable): Readable names of the changed rows, e.g. 'mobile/apple'.
+        """
+        entry = self.levels.setdefault(level, {ADD: {'count': 0, 'sample': []},
+                                               DELETE: {'count': 0, 'sample': []}})[action]
+        for name in names:
+            entry['count'] += 1
+            if len(entry['sample']) < self.sample_size:
+                entry['sample'].append(name)
+
+    def error(self, sheet_name, message):
+        self.errors.append({'sheet': sheet_name, 'error': message})
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    def as_dict(self):
+        """
+        Returns the plan as a JSON-serializable dictionary.
+        """
+        return {
+            'valid': self.is_valid,
+            'levels': {level: {action: {'count': entry['count'], 'sample': sorted(entry['sample'])}
+                               for action, entry in actions.items()}
+                       for level, actions in self.levels.items()},
+            'errors': self.errors,
+        }
@@ -0,0 +1,75 @@
+from hierarchy_builder.models import Brand, Series, DeviceModel
+from hierarchy_builder.repositories.search_index_repository import SearchIndexRepository, BRAND, SERIES, MODEL
+
+
+class SearchService:
+    """
+    Finds brands, series and models by the beginning of their name in the Redis search index.
+    """
+
+    @staticmethod
+    def search(query, limit):
+        """
+        Retrieves the brands, series and models whose name starts with the query, ignoring case,
+        with their path in the hierarchy. Series and models belong to every brand with their brand
+        name, so they are listed once per category of that brand.
+
+        Parameters:
+            query (str): The beginning of the names to find.
+            limit (int): The maximum number of results.
+
+        Returns:
+            list: Dictionaries with the 'type' and 'name' of each match and its 'category',
+            'brand' and, for models, 'series', ordered by name.
+        """
+        entries = SearchIndexRepository.search(query, limit)
+        categories_by_brand = SearchIndexRepository.get_categories_by_brands(
+            {path[0] for kind, path in entries if kind != BRAND})
+
+        results = []
+        for kind, path in entries:
+            if kind == BRAND:
+                category_name, brand_name = path
+                results.append({'type': kind, 'name': brand_name, 'category': category_name, 'brand': brand_name})
+                continue
+
+            for category_name in categories_by_brand[path[0]]:
+                result = {'type': kind, 'name': path[-1], 'category': category_name, 'brand': path[0]}
+                if kind == MODEL:
+                    result['series'] = path[1]
+                results.append(result)
+        return results[:limit]
+
+    @staticmethod
+    def rebuild_index(chunk_size=2000):
+        """
+        Rebuilds the search index from the database into a staging sorted set and swaps it in with
+        RENAME, so searches see either the old index or the complete new one.
+
+        Parameters:
+            chunk_size (int): Rows fetched per database round trip and written per ZADD.
+
+        Returns:
+            int: The number of rows indexed.
+        """
+        SearchIndexRepository.clear_staging()
+        queries = [
+            (BRAND, Brand.objects.values_list('category__name', 'name')),
+            (SERIES, Series.objects.values_list('brand__name', 'name')),
+            (MODEL, DeviceModel.objects.values_list('series__brand__name', 'series__name', 'name')),
+        ]
+
+        indexed = 0
+        for kind, queryset in queries:
+            paths = []
+            for path in queryset.iterator(chunk_size=chunk_size):
+                paths.append(path)
+                if len(paths) >= chunk_size:
+                    SearchIndexRepository.add(kind, paths, key=SearchIndexRepository.STAGING_KEY)
+                    indexed += len(paths)
+                    paths = []
+            SearchIndexRepository.add(kind, paths, key=SearchIndexRepository.STAGING_KEY)
+            indexed += len(paths)
+
+        SearchIndexRepository.swap_in_staging()
+        return indexed
@@ -0,0 +1,72 @@
+import hashlib
+
+# Part of every fingerprint, so that a change to how sheets are parsed or fingerprinted invalidates stored ones
+FINGERPRINT_VERSION = '2'
+
+
+def _digest(*parts):
+    content = '\x1f'.join((FINGERPRINT_VERSION,) + tuple('' if part is None else part for part in parts))
+    return int.from_bytes(hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest(), 'big')
+
+
+def _hex(value):
+    return f"{value:032x}"
+
+
+def fingerprint_names(names, category_type=None):
+    """
+    Fingerprints the parsed content of a 'Devices' or brand sheet.
+
+    Parameters:
+        names (iterable): The normalized names found in the sheet.
+        category_type (str, optional): The category of a brand sheet.
+
+    Returns:
+        str: A hex fingerprint that does not depend on the order of the names.
+    """
+    return _hex(_digest(category_type, *sorted(names)))
+
+
+class SeriesSheetFingerprint:
+    """
+    Fingerprints a '-Series' sheet chunk by chunk, per brand and as a whole. The series and model
+    names of every brand are merged across chunks and digested once, so a brand whose rows are
+    spread over several chunks, or repeat a series, gets the same fingerprint as with one chunk.
+    """
+
+    def __init__(self):
+        self.category_type = None
+        self._brands = {}
+        self._brand_fingerprints = None
+
+    def add(self, category_type, series_and_models_by_brand):
+        """
+        Adds a parsed chunk, i.e. a {brand: {series: models}} dictionary.
+        """
+        self.category_type = self.category_type or category_type
+        self._brand_fingerprints = None
+        for brand_name, series_and_models in series_and_models_by_brand.items():
+            series = self._brands.setdefault(brand_name, {})
+            for series_name, models in series_and_models.items():
+                series.setdefault(series_name, set()).update(models)
+
+    def brand_fingerprints(self):
+        """
+        Returns:
+            dict: Brand names mapped to the hex fingerprints of their series and models.
+        """
+        if self._brand_fingerprints is None:
+            self._brand_fingerprints = {
+                brand_name: _hex(_digest(*('\x1e'.join((series_name, *sorted(models)))
+                                           for series_name, models in sorted(series.items()))))
+                for brand_name, series in self._brands.items()
+            }
+        return self._brand_fingerprints
+
+    def sheet_fingerprint(self):
+        """
+        Returns:
+            str: The hex fingerprint of the whole sheet, including its category.
+        """
+        brands = sorted(f"{brand_name}={fingerprint}" for brand_name, fingerprint in self.brand_fingerprints().items())
+        return _hex(_digest(self.category_type, *brands))
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+
+class SheetParser:
+    """
+    Turns the DataFrame of a single sheet into normalized (lowercased) hierarchy names.
+    """
+
+    @staticmethod
+    def get_category_type(df):
+        """
+        Extracts the category name from the header of the first column, e.g. 'MobileName' -> 'mobile'.
+        """
+        return str(df.columns[0]).replace('Name', '').lower()
+
+    @staticmethod
+    def _lower_strings(column):
+        """
+        Lowercases the string cells of a column. Cells that are not strings become NaN.
+        """
+        strings = column[column.map(lambda value: isinstance(value, str)).astype(bool)]
+        return strings.str.lower().reindex(column.index)
+
+    @staticmethod
+    def _normalize_names(column):
+        """
+        Lowercases the string cells of a column and drops empty cells and 'nan' placeholders.
+
+        Returns:
+            set: The distinct normalized names found in the column.
+        """
+        return set(SheetParser._lower_strings(column).dropna()) - {'nan'}
+
+    @staticmethod
+    def parse_device_categories(df):
+        """
+        Parses the 'Devices' sheet.
+
+        Returns:
+            set: The names of the device categories listed in the sheet.
+        """
+        return SheetParser._normalize_names(df['DeviceName'])
+
+    @staticmethod
+    def parse_brands(df):
+        """
+        Parses a brand sheet, whose first column lists the brands of one category.
+
+        Returns:
+            tuple: A (category_type, brand_names) pair, or (None, set()) for an empty sheet.
+        """
+        if df.empty or len(df.columns) == 0:
+            return None, set()
+
+        return SheetParser.get_category_type(df), SheetParser._normalize_names(df.iloc[:, 0])
+
+    @staticmethod
+    def parse_series_and_models(df):
+        """
+        Melts a wide '-Series' sheet into a long frame. Every row of the sheet starts with a brand
+        followed by a run of cells in which a cell containing 's' opens a new series and the cells
+        after it, up to the next series, are the models of that series.
+
+        Returns:
+            tuple: A (category_type, frame) pair where frame has the columns 'brand', 'series' and
+            'model'. A series without models is represented by a single row whose model is None.
+            Returns (None, empty frame) for sheets without series columns.
+        """
+        columns = ['brand', 'series', 'model']
+        if df.empty or len(df.columns) < 2:
+            return None, pd.DataFrame(columns=columns)
+
+        brands = SheetParser._lower_strings(df.iloc[:, 0]).to_numpy(dtype=object)
+        cells = df.iloc[:, 1:].to_numpy(dtype=object)
+        n_rows, n_cols = cells.shape
+
+        # Row-major ravel keeps the cells of every sheet row in their original left-to-right order
+        long = pd.DataFrame({
+            'row': np.repeat(np.arange(n_rows), n_cols),
+            'value': cells.ravel(),
+        })
+        long = long[long['value'].notna().to_numpy()].copy()
+        long['brand'] = brands[long['row'].to_numpy()]
+        long = long[long['brand'].notna().to_numpy() & (long['brand'] != 'nan').to_numpy()].copy()
+
+        values = long['value'].astype(str).str.lower()
+        long = long.assign(value=values)[(values != 'nan').to_numpy()].copy()
+
+        is_series = long['value'].str.contains('s', regex=False).to_numpy()
+        # Every model belongs to the closest series to its left within the same sheet row
+        long['series'] = long['value'].where(is_series).groupby(long['row']).ffill()
+        long['model'] = long['value'].where(~is_series)
+        long = long[long['series'].notna().to_numpy()]
+
+        frame = long[columns].astype(object).where(long[columns].notna(), None).drop_duplicates()
+        return SheetParser.get_category_type(df), frame.reset_index(drop=True)
+
+    @staticmethod
+    def group_series_and_models(frame):
+        """
+        Groups a long (brand, series, model) frame into nested dictionaries.
+
+        Returns:
+            dict: Brand names mapped to dictionaries of series names and their sets of model names.
+        """
+        grouped = {}
+        for brand_name, series_name, model_name in zip(frame['brand'], frame['series'], frame['model']):
+            models = grouped.setdefault(brand_name, {}).setdefault(series_name, set())
+            if model_name is not None:
+                models.add(model_name)
+        return grouped
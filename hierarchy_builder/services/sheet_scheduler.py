@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+from hierarchy_builder.readers import get_workbook_reader, choose_backend, STREAMING_BACKEND
+from hierarchy_builder.services.sheet_parser import SheetParser
+
+DEVICE_CATEGORIES = 'device_categories'
+BRANDS = 'brands'
+SERIES_AND_MODELS = 'series_and_models'
+
+# Sheets of a level may only be applied once every sheet of the previous levels has been applied
+LEVELS = (DEVICE_CATEGORIES, BRANDS, SERIES_AND_MODELS)
+
+
+def get_sheet_level(sheet_name):
+    """
+    Returns the hierarchy level a sheet describes, based on its name.
+    """
+    if '-Series' in sheet_name:
+        return SERIES_AND_MODELS
+    if sheet_name == 'Devices':
+        return DEVICE_CATEGORIES
+    return BRANDS
+
+
+def parse_sheet(reader, sheet_name):
+    """
+    Parses a sheet chunk by chunk without touching the database or Redis.
+
+    Yields:
+        tuple: A (row_count, parsed) pair per chunk, where parsed is a set of category names for
+        the 'Devices' sheet, a (category_type, brand_names) pair for brand sheets and a
+        (category_type, {brand: {series: models}}) pair for '-Series' sheets.
+    """
+    level = get_sheet_level(sheet_name)
+    for df in reader.iter_chunks(sheet_name):
+        if level == DEVICE_CATEGORIES:
+            yield len(df), SheetParser.parse_device_categories(df)
+        elif level == BRANDS:
+            yield len(df), SheetParser.parse_brands(df)
+        else:
+            category_type, frame = SheetParser.parse_series_and_models(df)
+            yield len(df), (category_type, SheetParser.group_series_and_models(frame))
+
+
+def _parse_sheet_in_worker(excel_file, backend, sheet_name):
+    reader = get_workbook_reader(excel_file, backend=backend)
+    try:
+        return deque(parse_sheet(reader, sheet_name))
+    finally:
+        reader.close()
+
+
+def _get_pool_context():
+    """
+    Returns the multiprocessing context of the parsing pool. Workers are never forked from the
+    importing process, as it runs threads, e.g. the one renewing its hierarchy locks.
+    """
+    start_methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in start_methods else 'spawn')
+
+
+class _SheetPrefetcher:
+    """
+    Parses sheets in a process pool in plan order, keeping at most `depth` sheets submitted or
+    parsed but not yet consumed, so that memory stays bounded however many sheets a workbook has.
+    Sheets must be consumed in plan order; sheets that are skipped are dropped.
+    """
+
+    def __init__(self, executor, excel_file, backend, sheet_names, depth):
+        self.executor = executor
+        self.excel_file = excel_file
+        self.backend = backend
+        self.pending = deque(sheet_names)
+        self.futures = OrderedDict()
+        self.depth = depth
+
+    def _fill(self):
+        while self.pending and len(self.futures) < self.depth:
+            name = self.pending.popleft()
+            self.futures[name] = self.executor.submit(_parse_sheet_in_worker, self.excel_file, self.backend, name)
+
+    def _take(self, sheet_name):
+        # Every sheet before this one in the plan was skipped
+        while self.futures and sheet_name in self.futures:
+            name, future = self.futures.popitem(last=False)
+            if name == sheet_name:
+                return future
+            future.cancel()
+        while self.pending and sheet_name in self.pending:
+            name = self.pending.popleft()
+            if name == sheet_name:
+                return self.executor.submit(_parse_sheet_in_worker, self.excel_file, self.backend, name)
+        raise KeyError(sheet_name)
+
+    def iter_chunks(self, sheet_name):
+        """
+        Yields the (row_count, parsed) pairs of a sheet once its worker parsed it.
+        """
+        future = self._take(sheet_name)
+        self._fill()
+        chunks = future.result()
+        del future
+        while chunks:
+            # Released as they are applied rather than when the whole sheet is done
+            yield chunks.popleft()
+
+    def start(self):
+        self._fill()
+
+
+class SheetScheduler:
+    """
+    Orders the sheets of a workbook by hierarchy level and parses them, in a process pool when
+    the workbook is a file on disk, more than one worker is allowed and the backend loads whole
+    sheets anyway. Parsing does not depend on the database, so up to `workers` sheets are parsed
+    ahead while earlier ones are applied, across levels.
+    """
+
+    def __init__(self, reader, excel_file, backend=None, workers=1):
+        self.reader = reader
+        self.excel_file = excel_file
+        self.backend = backend
+        self.workers = workers
+
+    def plan(self):
+        """
+        Groups the sheets by level in dependency order, keeping the workbook order within a level.
+
+        Returns:
+            list: (level, sheet_names) pairs for every level that has sheets.
+        """
+        sheet_names = self.reader.sheet_names
+        plan = [(level, [name for name in sheet_names if get_sheet_level(name) == level]) for level in LEVELS]
+        return [(level, names) for level, names in plan if names]
+
+    def _can_use_pool(self):
+        # Worker processes reopen the workbook themselves, so it must be readable from a path
+        if not (self.workers > 1 and len(self.reader.sheet_names) > 1
+                and isinstance(self.excel_file, (str, os.PathLike))):
+            return False
+        # The streaming backend is chosen to bound memory, which a worker returning whole sheets defeats
+        backend = self.backend if self.backend is not None else choose_backend(self.excel_file)
+        return backend != STREAMING_BACKEND
+
+    def iter_levels(self):
+        """
+        Yields the levels in dependency order together with their sheets.
+
+        Yields:
+            tuple: A (level, sheets) pair where sheets is a list of (sheet_name, chunks) pairs and
+            chunks is an iterable of the (row_count, parsed) pairs produced by `parse_sheet`.
+            Parse errors are raised while iterating the chunks of the failing sheet.
+        """
+        plan = self.plan()
+        if not self._can_use_pool():
+            for level, sheet_names in plan:
+                yield level, [(name, parse_sheet(self.reader, name)) for name in sheet_names]
+            return
+
+        # Workers start without the importing process' state, so Django is set up in each of them
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_get_pool_context(),
+                                       initializer=django.setup)
+        try:
+            prefetcher = _SheetPrefetcher(executor, self.excel_file, self.backend,
+                                          [name for level, sheet_names in plan for name in sheet_names],
+                                          self.workers)
+            prefetcher.start()
+            for level, sheet_names in plan:
+                yield level, [(name, prefetcher.iter_chunks(name)) for name in sheet_names]
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,25 @@
+from django.db import transaction
+
+from hierarchy_builder.models import Series
+from hierarchy_builder.repositories.device_model_repository import DeviceModelRepository
+from hierarchy_builder.repositories.series_repository import SeriesRepository
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+
+class BulkCreateTests(HierarchyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.import_workbook({'Mobile': {'a': {'s1': ['a1']}}})
+
+    def test_existing_series_and_models_are_not_counted(self):
+        with transaction.atomic(), RedisUnitOfWork.batch():
+            # Rows written earlier in the transaction are not in Redis yet and are skipped by the insert
+            series_inserted = SeriesRepository.bulk_create(['s1', 's2'], brand_name='a', category_name='mobile')
+            models_inserted = DeviceModelRepository.bulk_create({'s1': {'a1', 'a2'}, 's2': {'a1'}},
+                                                                brand_name='a', category_name='mobile')
+        self.assertEqual(series_inserted, 1)
+        self.assertEqual(models_inserted, 2)
+        self.assertEqual(Series.objects.filter(brand__name='a').count(), 2)
+        self.assertEqual(self.series_and_models('a'), {'s1': ['a1', 'a2'], 's2': ['a1']})
@@ -0,0 +1,36 @@
+from django.test import override_settings
+
+from hierarchy_builder.repositories.series_repository import SeriesRepository
+from hierarchy_builder.services.cache_rebuild_service import CacheRebuildService
+from hierarchy_builder.services.hierarchy_locks import HierarchyLockError, HierarchyLocks, category_lock
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+
+class CacheRebuildTests(HierarchyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.import_workbook({
+            'Mobile': {'a': {'s1': ['a1', 'a2']}, 'b': {'s2': ['b1']}},
+            'Tablet': {'a': {'s3': ['t1']}},
+        })
+
+    def test_rebuild_restores_lost_keys(self):
+        self.redis_con.unlink(SeriesRepository._redis_series_key('a'), SeriesRepository._redis_models_key('b', 's2'))
+        self.redis_con.sadd(SeriesRepository._redis_series_key('gone'), 's9')
+
+        result = CacheRebuildService.rebuild(chunk_size=2)
+        self.assertEqual(result['stale_keys_removed'], 1)
+        self.assertEqual(self.series_and_models('a'), {'s1': ['a1', 'a2'], 's3': ['t1']})
+        self.assertEqual(self.series_and_models('b'), {'s2': ['b1']})
+        self.assertEqual({kind: entry['count'] for kind, entry in CacheRebuildService.verify().items()},
+                         {'missing': 0, 'extra': 0, 'mismatched': 0})
+
+    @override_settings(HIERARCHY_LOCK_WAIT_SECONDS=0)
+    def test_rebuild_waits_for_imports(self):
+        self.redis_con.unlink(SeriesRepository._redis_series_key('a'))
+        with HierarchyLocks() as other:
+            other.acquire([category_lock('tablet')])
+            with self.assertRaises(HierarchyLockError):
+                CacheRebuildService.rebuild()
+        self.assertEqual(self.series_and_models('a'), {})
@@ -0,0 +1,27 @@
+from django.test import SimpleTestCase
+
+from hierarchy_builder.services.diff_service import DiffService
+
+
+class DiffServiceTests(SimpleTestCase):
+
+    def test_diff_names(self):
+        self.assertEqual(DiffService.diff_names(['a', 'b'], ['b', 'c', 'c']), ({'c'}, {'a'}))
+        self.assertEqual(DiffService.diff_names([], []), (set(), set()))
+
+    def test_diff_series_and_models(self):
+        existing = {'s1': {'m1', 'm2'}, 's2': {'m3'}, 's3': set()}
+        incoming = {'s1': {'m2', 'm4'}, 's3': {'m5'}, 's4': {'m6'}}
+
+        series_to_add, series_to_delete, models_to_add, models_to_delete = \
+            DiffService.diff_series_and_models(existing, incoming)
+
+        self.assertEqual(series_to_add, {'s4'})
+        self.assertEqual(series_to_delete, {'s2'})
+        self.assertEqual(models_to_add, {'s1': {'m4'}, 's3': {'m5'}, 's4': {'m6'}})
+        # The models of a deleted series go with it
+        self.assertEqual(models_to_delete, {'s1': {'m1'}})
+
+    def test_unchanged_brand_has_an_empty_diff(self):
+        series = {'s1': {'m1'}, 's2': set()}
+        self.assertEqual(DiffService.diff_series_and_models(series, series), (set(), set(), {}, {}))
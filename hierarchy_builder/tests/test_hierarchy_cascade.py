@@ -0,0 +1,73 @@
+from django.db import transaction
+
+from hierarchy_builder.models import DeviceCategory, Brand, Series, DeviceModel
+from hierarchy_builder.repositories.brand_repository import BrandRepository
+from hierarchy_builder.repositories.device_category_repository import DeviceCategoryRepository
+from hierarchy_builder.repositories.hierarchy_cascade_repository import HierarchyCascadeRepository
+from hierarchy_builder.repositories.search_index_repository import BRAND, MODEL
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+from hierarchy_builder.services.search_service import SearchService
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+# Brand 'a' exists in both categories, so they share the series and models sets of 'a' in Redis
+HIERARCHY = {
+    'Mobile': {'a': {'s1': ['a1'], 's2': ['a2']}, 'b': {'s3': ['b1']}},
+    'Tablet': {'a': {'s5': ['t1']}, 'c': {'s4': ['c1']}},
+}
+
+
+class HierarchyCascadeTests(HierarchyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.import_workbook(HIERARCHY)
+
+    def _search(self, query):
+        return {(result['type'], result['category'], result['name']) for result in SearchService.search(query, 50)}
+
+    def test_deleting_a_category_deletes_its_subtree_and_keeps_shared_sets(self):
+        with transaction.atomic(), RedisUnitOfWork.batch():
+            counts = HierarchyCascadeRepository.delete_categories(['mobile'])
+
+        self.assertEqual(counts, {'device_categories': 1, 'brands': 2, 'series': 3, 'device_models': 3})
+        self.assertFalse(DeviceCategory.objects.filter(name='mobile').exists())
+        self.assertEqual(Brand.objects.count(), 2)
+        self.assertEqual(set(Series.objects.values_list('name', flat=True)), {'s5', 's4'})
+        self.assertEqual(set(DeviceModel.objects.values_list('name', flat=True)), {'t1', 'c1'})
+
+        self.assertEqual(set(DeviceCategoryRepository.get_all_from_redis()), {'tablet'})
+        self.assertEqual(BrandRepository.get_brands_by_category_from_redis('mobile'), {})
+        # The series and models of the remaining brand 'a' are rewritten from the rows left
+        self.assertEqual(self.series_and_models('a'), {'s5': ['t1']})
+        self.assertEqual(self.series_and_models('b'), {})
+
+        self.assertEqual(self._search('a'), {(BRAND, 'tablet', 'a')})
+        self.assertEqual(self._search('t1'), {(MODEL, 'tablet', 't1')})
+        self.assertEqual(self._search('a1'), set())
+
+    def test_deleting_brands_of_one_category(self):
+        with transaction.atomic(), RedisUnitOfWork.batch():
+            counts = HierarchyCascadeRepository.delete_brands(['a'], 'tablet')
+
+        self.assertEqual(counts, {'brands': 1, 'series': 1, 'device_models': 1})
+        self.assertEqual(set(BrandRepository.get_brands_by_category_from_redis('tablet')), {'c'})
+        self.assertEqual(self.series_and_models('a'), {'s1': ['a1'], 's2': ['a2']})
+
+    def test_single_deletes_go_through_the_cascade(self):
+        with transaction.atomic(), RedisUnitOfWork.batch():
+            self.assertTrue(BrandRepository.delete('b', 'mobile'))
+            self.assertTrue(DeviceCategoryRepository.delete('tablet'))
+            self.assertFalse(DeviceCategoryRepository.delete('tablet'))
+
+        self.assertEqual(set(Series.objects.values_list('name', flat=True)), {'s1', 's2'})
+        self.assertEqual(set(BrandRepository.get_brands_by_category_from_redis('mobile')), {'a'})
+        self.assertEqual(BrandRepository.get_brands_by_category_from_redis('tablet'), {})
+        self.assertEqual(self.series_and_models('a'), {'s1': ['a1'], 's2': ['a2']})
+        self.assertEqual(self.series_and_models('b'), {})
+        self.assertEqual(self._search('c1'), set())
+
+    def test_reimport_without_a_category_cascades(self):
+        self.import_workbook({'Tablet': HIERARCHY['Tablet']}, name='v2.xlsx')
+
+        self.assertEqual(set(DeviceCategory.objects.values_list('name', flat=True)), {'tablet'})
+        self.assertEqual(self.series_and_models('a'), {'s5': ['t1']})
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+from django.db import transaction
+from openpyxl import load_workbook
+
+from hierarchy_builder.repositories.cache_repair_repository import CacheRepairRepository
+from hierarchy_builder.repositories.hierarchy_lock_repository import HierarchyLockRepository
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+from hierarchy_builder.services.cache_rebuild_service import CacheRebuildService
+from hierarchy_builder.services.excel_service import ExcelService
+from hierarchy_builder.services.hierarchy_locks import (CATEGORY_LIST_LOCK, HierarchyLockError, HierarchyLocks, brand_lock,
+                                                        category_lock)
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+
+class HierarchyLocksTests(HierarchyTestCase):
+
+    def _import(self, path, locks):
+        with RedisUnitOfWork.fenced(locks), transaction.atomic():
+            error_message = ExcelService(path, workers=1, locks=locks).process_excel_file()
+        self.assertIsNone(error_message)
+
+    def test_category_list_lock_is_released_after_the_list_changed(self):
+        path = self.workbook({'Mobile': {'a': {'s1': ['a1']}}})
+        with HierarchyLocks() as locks:
+            self._import(path, locks)
+            self.assertNotIn(CATEGORY_LIST_LOCK, locks.held)
+            self.assertIn(category_lock('mobile'), locks.held)
+            self.assertIsNone(HierarchyLockRepository.redis_con.get(
+                HierarchyLockRepository._redis_keys([CATEGORY_LIST_LOCK])[0]))
+
+    def test_category_list_is_not_locked_when_unchanged(self):
+        self._import(self.workbook({'Mobile': {'a': {'s1': ['a1']}}}), None)
+        path = self.workbook({'Mobile': {'a': {'s1': ['a1', 'a2']}}}, name='v2.xlsx')
+        with HierarchyLocks(wait_seconds=0) as other:
+            other.acquire([CATEGORY_LIST_LOCK])
+            with HierarchyLocks(wait_seconds=0) as locks:
+                self._import(path, locks)
+        self.assertEqual(self.series_and_models('a'), {'s1': ['a1', 'a2']})
+
+    def test_brand_sheet_of_an_unlisted_category_locks_the_category_list(self):
+        self._import(self.workbook({'Mobile': {'a': {'s1': ['a1']}}}), None)
+        path = self.workbook({'Mobile': {'a': {'s1': ['a1']}}, 'Tablet': {'c': {'s2': ['c1']}}}, name='v2.xlsx')
+        workbook = load_workbook(path)
+        workbook['Devices'].delete_rows(3)
+        workbook.save(path)
+
+        with HierarchyLocks(wait_seconds=0) as other:
+            other.acquire([CATEGORY_LIST_LOCK])
+            with HierarchyLocks(wait_seconds=0) as locks:
+                with RedisUnitOfWork.fenced(locks), transaction.atomic():
+                    error_message = ExcelService(path, workers=1, locks=locks).process_excel_file()
+        self.assertIn('Another import holds one of the locks', error_message)
+
+        with HierarchyLocks() as locks:
+            self._import(path, locks)
+            self.assertNotIn(CATEGORY_LIST_LOCK, locks.held)
+        self.assertEqual(self.series_and_models('c'), {'s2': ['c1']})
+
+    def _flush(self, locks, names):
+        locks.acquire(names)
+        pipeline = RedisUnitOfWork.redis_con.pipeline(transaction=True)
+        pipeline.set('unrelated', 1)
+        locks.execute(pipeline)
+
+    def test_acquire_reports_changes_under_the_requested_locks_only(self):
+        with HierarchyLocks(wait_seconds=0) as locks:
+            with HierarchyLocks(wait_seconds=0) as other:
+                self._flush(other, [category_lock('tablet')])
+            self.assertFalse(locks.acquire([category_lock('mobile')]))
+            self.assertTrue(locks.acquire([category_lock('tablet')]))
+
+    def test_acquire_ignores_the_sessions_own_flushes(self):
+        with HierarchyLocks(wait_seconds=0) as locks:
+            self._flush(locks, [CATEGORY_LIST_LOCK])
+            locks.release([CATEGORY_LIST_LOCK])
+            self.assertFalse(locks.acquire([CATEGORY_LIST_LOCK]))
+
+    def test_flush_after_lost_locks_schedules_a_repair(self):
+        path = self.workbook({'Mobile': {'a': {'s1': ['a1']}}})
+        with HierarchyLocks() as locks, \
+                patch.object(HierarchyLockRepository, 'execute_fenced', return_value=None):
+            self._import(path, locks)
+        self.assertEqual(self.series_and_models('a'), {})
+        self.assertIn(brand_lock('a'), CacheRepairRepository.get_all())
+
+        CacheRebuildService.repair_scheduled()
+        self.assertEqual(self.series_and_models('a'), {'s1': ['a1']})
+        self.assertEqual(CacheRepairRepository.get_all(), set())
+
+    def test_session_that_lost_its_lock_cannot_flush(self):
+        with HierarchyLocks(wait_seconds=0) as locks:
+            locks.acquire([brand_lock('a')])
+            # The lease ran out and another import took the lock over
+            HierarchyLockRepository.redis_con.delete(HierarchyLockRepository._redis_keys([brand_lock('a')])[0])
+            with HierarchyLocks(wait_seconds=0) as other:
+                other.acquire([brand_lock('a')])
+
+                with self.assertRaises(HierarchyLockError):
+                    locks.check()
+                pipeline = RedisUnitOfWork.redis_con.pipeline(transaction=True)
+                pipeline.set('written', 1)
+                locks.execute(pipeline)
+                self.assertIsNone(RedisUnitOfWork.redis_con.get('written'))
+                with self.assertRaises(HierarchyLockError):
+                    locks.acquire([brand_lock('b')])
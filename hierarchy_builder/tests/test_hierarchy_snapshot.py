@@ -0,0 +1,69 @@
+import gzip
+import json
+
+from django.urls import reverse
+
+from hierarchy_builder.repositories.hierarchy_snapshot_repository import HierarchySnapshotRepository
+from hierarchy_builder.services.hierarchy_service import HierarchyService
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+
+class HierarchySnapshotTests(HierarchyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        HierarchyService._local_snapshot = None
+
+    def test_snapshot_of_an_older_generation_does_not_replace_a_newer_one(self):
+        newer = HierarchySnapshotRepository.save(2, b'{"new": 1}', updated_at=2.0, etag='new', encodings={})
+        self.assertIsNone(HierarchySnapshotRepository.save(1, b'{"old": 1}', updated_at=3.0, etag='old',
+                                                           encodings={}))
+        self.assertEqual(HierarchySnapshotRepository.get().etag, 'new')
+
+        same = HierarchySnapshotRepository.save(2, b'{"new": 2}', updated_at=4.0, etag='same', encodings={})
+        self.assertEqual(same.version, newer.version + 1)
+        self.assertEqual(HierarchySnapshotRepository.get().etag, 'same')
+
+    def test_import_rebuilds_the_snapshot(self):
+        self.import_workbook({'Mobile': {'a': {'s1': ['a1']}}})
+        snapshot = HierarchyService.get_snapshot()
+        self.assertEqual(json.loads(snapshot.content), {'mobile': {'a': {'s1': ['a1']}}})
+        self.assertEqual(json.loads(gzip.decompress(snapshot.encodings['gzip'])), json.loads(snapshot.content))
+
+    def test_matching_etag_is_answered_with_304(self):
+        self.import_workbook({'Mobile': {'a': {'s1': ['a1']}}})
+        url = reverse('device-hierarchy')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'mobile': {'a': {'s1': ['a1']}}})
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_every_encoding_has_its_own_etag(self):
+        self.import_workbook({'Mobile': {'a': {'s1': ['a1']}}})
+        url = reverse('device-hierarchy')
+        identity = self.client.get(url)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate', HTTP_IF_NONE_MATCH=identity['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotEqual(response['ETag'], identity['ETag'])
+        self.assertEqual(gzip.decompress(response.content), identity.content)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_etag_changes_with_the_hierarchy(self):
+        self.import_workbook({'Mobile': {'a': {'s1': ['a1']}}})
+        url = reverse('device-hierarchy')
+        etag = self.client.get(url)['ETag']
+
+        self.import_workbook({'Mobile': {'a': {'s1': ['a1', 'a2']}}}, name='v2.xlsx')
+        # The in-process copy is only trusted for HIERARCHY_SNAPSHOT_CHECK_INTERVAL seconds
+        HierarchyService._local_checked_at = float('-inf')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'mobile': {'a': {'s1': ['a1', 'a2']}}})
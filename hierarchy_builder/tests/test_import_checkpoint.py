@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.test import override_settings
+
+from hierarchy_builder.models import DeviceModel
+from hierarchy_builder.repositories.device_model_repository import DeviceModelRepository
+from hierarchy_builder.repositories.import_checkpoint_repository import ImportCheckpointRepository
+from hierarchy_builder.repositories.sheet_fingerprint_repository import SheetFingerprintRepository
+from hierarchy_builder.repositories.unit_of_work import RedisUnitOfWork
+from hierarchy_builder.services.excel_service import ExcelService
+from hierarchy_builder.services.hierarchy_locks import HierarchyLocks
+from hierarchy_builder.services.import_job_service import ImportCheckpoint
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+V1 = {'Mobile': {'a': {'s1': ['a1']}, 'b': {'s1': ['b1']}, 'c': {'s1': ['c1']}}}
+V2 = {'Mobile': {'a': {'s1': ['a1']}, 'b': {'s1': ['b1', 'b2']}, 'c': {'s1': ['c1', 'c2']}}}
+
+
+@override_settings(IMPORT_CHECKPOINT_BRANDS=1)
+class ChunkedImportResumeTests(HierarchyTestCase):
+
+    def _fail_on_brand(self, brand_name):
+        original = DeviceModelRepository.bulk_create
+
+        def bulk_create(models_by_series, **kwargs):
+            if kwargs['brand_name'] == brand_name:
+                raise RuntimeError(f"worker died on {brand_name}")
+            return original(models_by_series, **kwargs)
+
+        return mock.patch.object(DeviceModelRepository, 'bulk_create', side_effect=bulk_create)
+
+    def test_resume_applies_brands_skipped_by_the_failed_run(self):
+        self.assertIsNone(ExcelService(self.workbook(V1), workers=1).process_excel_file())
+        path = self.workbook(V2, name='v2.xlsx')
+
+        # The first run does not trust the fingerprints, e.g. because another import flushed
+        # meanwhile, so it applies every brand and dies on the last one
+        first = ExcelService(path, workers=1, checkpoint=ImportCheckpoint('job'))
+        first._trust_fingerprints = False
+        with self._fail_on_brand('c'):
+            self.assertIn('worker died on c', first.process_excel_file())
+        self.assertEqual(ImportCheckpointRepository.get('job')[1],
+                         {('Mobile-Series', 0, 'a'), ('Mobile-Series', 0, 'b')})
+
+        # The resumed run trusts them and only reaches the changed brands
+        resumed = ExcelService(path, workers=1, checkpoint=ImportCheckpoint('job'))
+        self.assertIsNone(resumed.process_excel_file())
+
+        self.assertEqual(self.series_and_models('c'), {'s1': ['c1', 'c2']})
+        self.assertEqual(self.series_and_models('b'), {'s1': ['b1', 'b2']})
+        self.assertTrue(DeviceModel.objects.filter(name='c2', series__brand__name='c').exists())
+
+    def test_series_fingerprint_and_checkpoint_are_written_through_the_lock_session(self):
+        fenced_fields = set()
+        with HierarchyLocks() as locks, RedisUnitOfWork.fenced(locks):
+            original = locks.execute
+
+            def execute(pipeline):
+                fenced_fields.update(args[1:3] for args, _ in pipeline.command_stack if args[0] == 'HSET')
+                return original(pipeline)
+
+            with mock.patch.object(locks, 'execute', side_effect=execute):
+                service = ExcelService(self.workbook(V1), workers=1, locks=locks, checkpoint=ImportCheckpoint('job'))
+                self.assertIsNone(service.process_excel_file())
+
+        self.assertIn((SheetFingerprintRepository.SHEETS_HASH_KEY, 'Mobile-Series'), fenced_fields)
+        self.assertIn((ImportCheckpointRepository._redis_key('job'), 'Mobile-Series'), fenced_fields)
+        self.assertIn('Mobile-Series', SheetFingerprintRepository.get_all()[0])
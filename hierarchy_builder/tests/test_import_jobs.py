@@ -0,0 +1,67 @@
+import time
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from hierarchy_builder.repositories.import_job_repository import ImportJobRepository
+from hierarchy_builder.services.hierarchy_locks import HierarchyLocks
+from hierarchy_builder.services.import_job_service import ImportJobService
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+
+class ImportJobQueueTests(HierarchyTestCase):
+
+    def _start(self, job_id, worker_id, started_at, **fields):
+        path = self.workbook({'Mobile': {'a': {'s1': ['a1']}}}, name=f'{job_id}.xlsx')
+        ImportJobRepository.create(job_id, status=ImportJobService.QUEUED, file_path=path,
+                                   created_at=started_at.isoformat(), **fields)
+        self.assertEqual(ImportJobRepository.dequeue(worker_id, timeout=1), job_id)
+        ImportJobRepository.update(job_id, status=ImportJobService.RUNNING, started_at=started_at.isoformat())
+
+    def test_job_of_a_stopped_worker_is_queued_again(self):
+        self._start('job', 'dead', timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(ImportJobService.sweep_stale_jobs(), 1)
+        job = ImportJobRepository.get('job')
+        self.assertEqual((job['status'], job['attempts']), (ImportJobService.QUEUED, '2'))
+        self.assertEqual(ImportJobRepository.dequeue('alive', timeout=1), 'job')
+
+    def test_running_job_is_left_alone(self):
+        self._start('job', 'alive', timezone.now())
+
+        self.assertEqual(ImportJobService.sweep_stale_jobs(), 0)
+        self.assertEqual(ImportJobRepository.get('job')['status'], ImportJobService.RUNNING)
+        self.assertEqual(ImportJobRepository.queue_length(), 0)
+
+    def test_job_with_a_live_heartbeat_is_left_alone(self):
+        # A single long step, e.g. the commit, records no progress but keeps the heartbeat going
+        self._start('job', 'alive', timezone.now() - timedelta(hours=1), heartbeat_at=timezone.now().isoformat())
+
+        self.assertEqual(ImportJobService.sweep_stale_jobs(), 0)
+        self.assertEqual(ImportJobRepository.get('job')['status'], ImportJobService.RUNNING)
+
+    def test_lock_renewer_renews_the_heartbeat(self):
+        beats = []
+        with HierarchyLocks(lease_seconds=0.03, heartbeat=lambda: beats.append(time.monotonic())):
+            time.sleep(0.1)
+        self.assertGreater(len(beats), 2)
+
+    def test_run_records_the_heartbeat(self):
+        path = self.workbook({'Mobile': {'a': {'s1': ['a1']}}})
+        ImportJobRepository.create('job', status=ImportJobService.QUEUED, file_path=path, mode=ImportJobService.IMPORT,
+                                   created_at=(timezone.now() - timedelta(hours=1)).isoformat())
+        ImportJobService.run('job')
+
+        job = ImportJobRepository.get('job')
+        self.assertEqual(job['status'], ImportJobService.SUCCEEDED)
+        self.assertLess((timezone.now() - ImportJobService._heartbeat_at(job)).total_seconds(), 60)
+
+    @override_settings(IMPORT_JOB_MAX_ATTEMPTS=2)
+    def test_job_fails_after_its_last_attempt(self):
+        self._start('job', 'dead', timezone.now() - timedelta(hours=1), attempts=2)
+
+        self.assertEqual(ImportJobService.sweep_stale_jobs(), 1)
+        self.assertEqual(ImportJobRepository.get('job')['status'], ImportJobService.FAILED)
+        self.assertEqual(ImportJobRepository.queue_length(), 0)
+        self.assertEqual(ImportJobRepository.get_processing(), [])
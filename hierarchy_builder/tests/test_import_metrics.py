@@ -0,0 +1,38 @@
+import threading
+
+from django_redis import get_redis_connection
+
+from hierarchy_builder.repositories.import_metrics_repository import ImportMetricsRepository
+from hierarchy_builder.services.import_job_service import ImportJobService
+from hierarchy_builder.services.import_metrics import ImportMetrics
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+
+class ImportMetricsTests(HierarchyTestCase):
+
+    def test_only_commands_of_the_importing_thread_are_counted(self):
+        redis_con = get_redis_connection("default")
+        metrics = ImportMetrics()
+        with metrics.instrument():
+            redis_con.set('key', 1)
+            pipeline = redis_con.pipeline()
+            pipeline.get('key')
+            pipeline.get('other')
+            pipeline.execute()
+            other = threading.Thread(target=redis_con.get, args=('key',))
+            other.start()
+            other.join()
+        redis_con.get('key')
+
+        self.assertEqual(metrics.counters['redis_commands'], 3)
+        self.assertEqual(metrics.counters['redis_round_trips'], 2)
+
+    def test_duration_is_exported_as_one_summary(self):
+        ImportMetricsRepository.increment(ImportJobService._prometheus_series('succeeded', 1.5, ImportMetrics()))
+        ImportMetricsRepository.increment(ImportJobService._prometheus_series('failed', 0.5, ImportMetrics()))
+
+        lines = ImportJobService.render_metrics().splitlines()
+        self.assertIn('# TYPE excel_import_duration_seconds summary', lines)
+        self.assertIn('excel_import_duration_seconds_sum 2', lines)
+        self.assertIn('excel_import_duration_seconds_count 2', lines)
+        self.assertFalse([line for line in lines if line.startswith('# TYPE excel_import_duration_seconds_')])
@@ -0,0 +1,46 @@
+from django.db import transaction
+
+from hierarchy_builder.services.excel_service import ExcelService
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+HIERARCHY = {
+    'Mobile': {'aa': {'s1': ['a1']}, 'bb': {'s2': ['b1', 'b2']}},
+    'Tablet': {'cc': {'s3': ['c1']}, 'dd': {'s4': ['d1', 'd2'], 's5': []}},
+}
+
+
+class ImportPlanTests(HierarchyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.import_workbook(HIERARCHY)
+
+    def _deletes(self, plan):
+        return {level: actions['delete']['count'] for level, actions in plan['levels'].items()}
+
+    def _plan_and_apply(self, hierarchy):
+        path = self.workbook(hierarchy, name='v2.xlsx')
+        service = ExcelService(path, workers=1, dry_run=True)
+        self.assertIsNone(service.process_excel_file())
+        plan = service.plan.as_dict()
+
+        service = ExcelService(path, workers=1)
+        with transaction.atomic():
+            self.assertIsNone(service.process_excel_file())
+        applied = {name[:-len('_deleted')]: count for name, count in service.metrics.counters.items()
+                   if name.endswith('_deleted')}
+        return plan, applied
+
+    def test_plan_counts_the_series_and_models_of_deleted_brands(self):
+        plan, applied = self._plan_and_apply({'Mobile': {'aa': {'s1': ['a1']}}, 'Tablet': HIERARCHY['Tablet']})
+        self.assertEqual(self._deletes(plan), {'brands': 1, 'series': 1, 'device_models': 2})
+        self.assertIn('bb/s2/b2', plan['levels']['device_models']['delete']['sample'])
+        self.assertEqual({level: count for level, count in applied.items() if count},
+                         {'brands': 1, 'series': 1, 'device_models': 2})
+
+    def test_plan_counts_the_subtree_of_deleted_categories(self):
+        plan, applied = self._plan_and_apply({'Mobile': HIERARCHY['Mobile']})
+        self.assertEqual(self._deletes(plan),
+                         {'device_categories': 1, 'brands': 2, 'series': 3, 'device_models': 3})
+        self.assertEqual({level: count for level, count in applied.items() if count},
+                         {'device_categories': 1, 'brands': 2, 'series': 3, 'device_models': 3})
@@ -0,0 +1,51 @@
+import os
+
+from django.db import transaction
+from openpyxl import Workbook
+
+from hierarchy_builder.models import Series, DeviceModel
+from hierarchy_builder.services.excel_service import ExcelService
+from hierarchy_builder.services.search_service import SearchService
+from hierarchy_builder.tests.utils import HierarchyTestCase
+
+# Brand 'apple' exists in both categories, so they share the series and models sets of 'apple' in Redis
+HIERARCHY = {
+    'Mobile': {'apple': {'s1': ['a1'], 's2': ['a2']}},
+    'Tablet': {'apple': {'s3': ['t1']}},
+}
+
+
+class ReconcileTests(HierarchyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.import_workbook(HIERARCHY)
+
+    def _series_sheet_only(self, rows):
+        """Writes a workbook with the 'Devices' sheet and a 'Mobile-Series' sheet, but no brand sheets."""
+        workbook = Workbook()
+        devices = workbook.active
+        devices.title = 'Devices'
+        devices.append(['DeviceName'])
+        devices.append(['Mobile'])
+        devices.append(['Tablet'])
+        series_sheet = workbook.create_sheet('Mobile-Series')
+        series_sheet.append(['MobileName', None, None])
+        for row in rows:
+            series_sheet.append(row)
+        path = os.path.join(self.tmp_dir, 'mobile-series.xlsx')
+        workbook.save(path)
+        return path
+
+    def test_reconcile_keeps_same_name_brands_of_other_categories(self):
+        path = self._series_sheet_only([['apple', 's1', 'a1']])
+
+        with transaction.atomic():
+            service = ExcelService(path, workers=1, reconcile=True)
+            self.assertIsNone(service.process_excel_file())
+
+        self.assertEqual(set(Series.objects.values_list('brand__category__name', 'name')),
+                         {('mobile', 's1'), ('tablet', 's3')})
+        self.assertEqual(set(DeviceModel.objects.values_list('name', flat=True)), {'a1', 't1'})
+        self.assertEqual(self.series_and_models('apple'), {'s1': ['a1'], 's3': ['t1']})
+        self.assertEqual({result['name'] for result in SearchService.search('s', 50)}, {'s1', 's3'})
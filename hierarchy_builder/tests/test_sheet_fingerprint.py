@@ -0,0 +1,37 @@
+from django.test import SimpleTestCase
+
+from hierarchy_builder.services.sheet_fingerprint import SeriesSheetFingerprint
+
+ROWS = [
+    ('a', 's1', ['a1', 'a2']),
+    ('b', 's2', ['b1']),
+    ('a', 's3', ['a3']),
+    ('a', 's1', ['a4']),
+]
+
+
+class SeriesSheetFingerprintTests(SimpleTestCase):
+
+    def _fingerprint(self, chunk_size):
+        fingerprint = SeriesSheetFingerprint()
+        for start in range(0, len(ROWS), chunk_size):
+            chunk = {}
+            for brand_name, series_name, models in ROWS[start:start + chunk_size]:
+                chunk.setdefault(brand_name, {}).setdefault(series_name, set()).update(models)
+            fingerprint.add('mobile', chunk)
+        return fingerprint
+
+    def test_fingerprint_does_not_depend_on_the_chunk_size(self):
+        whole = self._fingerprint(len(ROWS))
+        for chunk_size in (1, 2, 3):
+            chunked = self._fingerprint(chunk_size)
+            self.assertEqual(chunked.brand_fingerprints(), whole.brand_fingerprints())
+            self.assertEqual(chunked.sheet_fingerprint(), whole.sheet_fingerprint())
+
+    def test_fingerprint_changes_with_the_content(self):
+        fingerprint = self._fingerprint(2)
+        changed = self._fingerprint(2)
+        changed.add('mobile', {'b': {'s2': {'b2'}}})
+        self.assertEqual(changed.brand_fingerprints()['a'], fingerprint.brand_fingerprints()['a'])
+        self.assertNotEqual(changed.brand_fingerprints()['b'], fingerprint.brand_fingerprints()['b'])
+        self.assertNotEqual(changed.sheet_fingerprint(), fingerprint.sheet_fingerprint())
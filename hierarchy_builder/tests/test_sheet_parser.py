@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from hierarchy_builder.services.sheet_parser import SheetParser
+
+
+class SheetParserTests(SimpleTestCase):
+
+    def test_parse_device_categories(self):
+        df = pd.DataFrame({'DeviceName': ['Mobile', 'TABLET', None, np.nan, 'nan', 42, 'mobile']})
+        self.assertEqual(SheetParser.parse_device_categories(df), {'mobile', 'tablet'})
+
+    def test_parse_brands(self):
+        df = pd.DataFrame({'MobileName': ['Apple', 'apple', None, 'Samsung']})
+        self.assertEqual(SheetParser.parse_brands(df), ('mobile', {'apple', 'samsung'}))
+        self.assertEqual(SheetParser.parse_brands(pd.DataFrame()), (None, set()))
+
+    def test_parse_series_and_models(self):
+        df = pd.DataFrame([
+            ['Apple', 'iPhone S', 'A1', 'A2', 'Pad S', 'P1'],
+            ['Apple', 'iPhone S', 'A3', None, None, None],
+            ['Nokia', 'Lumia S', None, None, None, None],
+            [None, 'Orphan S', 'O1', None, None, None],
+            ['Sony', 'X1', 'Xperia S', 7, np.nan, 'nan'],
+        ], columns=['MobileName', 'c1', 'c2', 'c3', 'c4', 'c5'])
+
+        category_type, frame = SheetParser.parse_series_and_models(df)
+
+        self.assertEqual(category_type, 'mobile')
+        self.assertEqual(SheetParser.group_series_and_models(frame), {
+            'apple': {'iphone s': {'a1', 'a2', 'a3'}, 'pad s': {'p1'}},
+            'nokia': {'lumia s': set()},
+            # Cells before the first series of a row belong to no series; numbers are names too
+            'sony': {'xperia s': {'7'}},
+        })
+
+    def test_parse_series_and_models_without_series_columns(self):
+        category_type, frame = SheetParser.parse_series_and_models(pd.DataFrame({'MobileName': ['Apple']}))
+        self.assertIsNone(category_type)
+        self.assertEqual(SheetParser.group_series_and_models(frame), {})
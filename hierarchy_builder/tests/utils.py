@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+
+from django.db import transaction
+from django.test import TransactionTestCase
+from django_redis import get_redis_connection
+from openpyxl import Workbook
+
+
+def write_workbook(path, hierarchy):
+    """
+    Writes a workbook in the layout ExcelService expects from a nested dictionary.
+
+    Parameters:
+        path (str): Where to save the workbook.
+        hierarchy (dict): Category names mapped to brand names mapped to series names mapped to
+            lists of model names. Series names must contain an 's' and model names must not.
+    """
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    devices = workbook.create_sheet('Devices')
+    devices.append(['DeviceName'])
+    for category_name, brands in hierarchy.items():
+        devices.append([category_name])
+
+        brand_sheet = workbook.create_sheet(category_name)
+        brand_sheet.append([f"{category_name}Name"])
+        series_sheet = workbook.create_sheet(f"{category_name}-Series")
+        series_sheet.append([f"{category_name}Name", None, None, None])
+        for brand_name, series in brands.items():
+            brand_sheet.append([brand_name])
+            for series_name, models in series.items():
+                series_sheet.append([brand_name, series_name, *models])
+    workbook.save(path)
+
+
+class HierarchyTestCase(TransactionTestCase):
+    """
+    Runs against the SQLite database and fakeredis server of the benchmark settings. Transactions
+    really commit, so the Redis writes that wait for `transaction.on_commit` are flushed.
+    """
+
+    def setUp(self):
+        self.redis_con = get_redis_connection("default")
+        self.redis_con.flushdb()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def workbook(self, hierarchy, name='workbook.xlsx'):
+        path = os.path.join(self.tmp_dir, name)
+        write_workbook(path, hierarchy)
+        return path
+
+    def import_workbook(self, hierarchy, name='workbook.xlsx'):
+        """Imports a workbook built from a nested dictionary in one transaction, like an upload."""
+        from hierarchy_builder.services.excel_service import ExcelService
+        with transaction.atomic():
+            error_message = ExcelService(self.workbook(hierarchy, name), workers=1).process_excel_file()
+        self.assertIsNone(error_message)
+
+    def series_and_models(self, brand_name):
+        from hierarchy_builder.repositories.series_repository import SeriesRepository
+        return SeriesRepository.get_series_and_models_by_brands([brand_name])[brand_name]
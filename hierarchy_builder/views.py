@@ -1,14 +1,23 @@
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db import transaction
+from rest_framework.reverse import reverse
 from .serializers import FileUploadSerializer
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from hierarchy_builder.services.excel_service import ExcelService
+from hierarchy_builder.readers import BACKENDS
+from hierarchy_builder.services.import_job_service import ImportJobError, ImportJobService
 from hierarchy_builder.services.hierarchy_service import HierarchyService
+from hierarchy_builder.services.search_service import SearchService
 
 
 def index(request):
@@ -17,13 +26,31 @@ def index(request):
 
 class ExcelUploadView(APIView):
     parser_classes = (MultiPartParser, FormParser)
+    dry_run = False
 
-    file_upload = openapi.Parameter('file', in_=openapi.IN_FORM, description="Upload Excel file",
+    file_upload = openapi.Parameter('file', in_=openapi.IN_FORM,
+                                    description="Upload Excel file (.xlsx, .xlsb, .ods) or zip of CSV/Parquet sheets",
                                     type=openapi.TYPE_FILE, required=True)
+    backend = openapi.Parameter('backend', in_=openapi.IN_FORM,
+                                description="Ingestion backend: 'pandas', 'streaming', 'calamine' or 'bundle' "
+                                            "(a zip of one CSV or Parquet file per sheet). Defaults to the "
+                                            "fastest backend for the file type and size.",
+                                type=openapi.TYPE_STRING, enum=list(BACKENDS), required=False)
+    reconcile = openapi.Parameter('reconcile', in_=openapi.IN_FORM,
+                                  description="Also delete the series and models that the '-Series' sheets "
+                                              "no longer list. Defaults to false, which only adds them.",
+                                  type=openapi.TYPE_BOOLEAN, required=False)
+    chunked = openapi.Parameter('chunked', in_=openapi.IN_FORM,
+                                description="Commit the import per sheet and per batch of brands with "
+                                            "checkpoints instead of in one transaction, so that a failed "
+                                            "import can be resumed. Defaults to false.",
+                                type=openapi.TYPE_BOOLEAN, required=False)
 
-    @swagger_auto_schema(manual_parameters=[file_upload],
-                         operation_summary="Upload and Process Excel File",
-                         responses={201: "Excel file has been processed successfully.",
+    @swagger_auto_schema(manual_parameters=[file_upload, backend, reconcile, chunked],
+                         operation_summary="Upload Excel File for Processing",
+                         operation_description="Queues the Excel file for a background import. "
+                                               "Poll the returned status URL to follow its progress.",
+                         responses={202: "Excel file has been queued for processing.",
                                     400: "Invalid file format.",
                                     500: "Internal Server Error"})
     def post(self, request, *args, **kwargs):
@@ -32,28 +59,318 @@ class ExcelUploadView(APIView):
         if serializer.is_valid():
             excel_file = serializer.validated_data['file']
             try:
-                with transaction.atomic():
-                    excel_service = ExcelService(excel_file)
-                    excel_service.process_excel_file()
+                job_id = ImportJobService.submit(excel_file, backend=serializer.validated_data.get('backend'),
+                                                 reconcile=serializer.validated_data['reconcile'],
+                                                 dry_run=self.dry_run,
+                                                 chunked=serializer.validated_data['chunked'])
 
-                return Response({"message": "Excel file has been processed successfully."},
-                                status=status.HTTP_201_CREATED)
+                return Response({"message": "Excel file has been queued for processing.",
+                                 "job_id": job_id,
+                                 "status_url": reverse('excel-upload-status', args=[job_id], request=request)},
+                                status=status.HTTP_202_ACCEPTED)
             except Exception as e:
-                return Response({"error": f"An error occurred while processing the Excel file: {str(e)}"},
+                return Response({"error": f"An error occurred while queuing the Excel file: {str(e)}"},
                                 status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ExcelPlanView(ExcelUploadView):
+    dry_run = True
+
+    @swagger_auto_schema(manual_parameters=[ExcelUploadView.file_upload, ExcelUploadView.backend,
+                                            ExcelUploadView.reconcile],
+                         operation_summary="Plan an Excel Import",
+                         operation_description="Queues a dry run of the import. Nothing is written; the status "
+                                               "URL reports the rows each level would add and delete and any "
+                                               "errors, and a valid plan can then be applied.",
+                         responses={202: "Excel file has been queued for planning.",
+                                    400: "Invalid file format.",
+                                    500: "Internal Server Error"})
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+
+class ApplyImportPlanView(APIView):
+
+    @swagger_auto_schema(operation_summary="Apply an Excel Import Plan",
+                         operation_description="Queues the import of a workbook whose plan succeeded without "
+                                               "errors. The import diffs again against the current state.",
+                         responses={202: "The import has been queued.",
+                                    404: "Plan not found.",
+                                    409: "The plan failed, found errors or was already applied."})
+    def post(self, request, job_id, *args, **kwargs):
+        try:
+            import_job_id = ImportJobService.apply_plan(job_id)
+        except ImportJobError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        if import_job_id is None:
+            return Response({"error": "Plan not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "The import has been queued.",
+                         "job_id": import_job_id,
+                         "status_url": reverse('excel-upload-status', args=[import_job_id], request=request)},
+                        status=status.HTTP_202_ACCEPTED)
+
+
+class ResumeImportView(APIView):
+
+    @swagger_auto_schema(operation_summary="Resume a Chunked Excel Import",
+                         operation_description="Queues a failed or stalled chunked import again. It skips "
+                                               "the sheets and brands committed before its last checkpoint.",
+                         responses={202: "The import has been queued.",
+                                    404: "Chunked import not found.",
+                                    409: "The import is running, finished or its workbook has expired."})
+    def post(self, request, job_id, *args, **kwargs):
+        try:
+            resumed_job_id = ImportJobService.resume(job_id)
+        except ImportJobError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        if resumed_job_id is None:
+            return Response({"error": "Chunked import not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "The import has been queued.",
+                         "job_id": resumed_job_id,
+                         "status_url": reverse('excel-upload-status', args=[resumed_job_id], request=request)},
+                        status=status.HTTP_202_ACCEPTED)
+
+
+class ImportJobStatusView(APIView):
+
+    @swagger_auto_schema(operation_summary="Get Excel Import Status",
+                         operation_description="Reports the status, timing, rows processed and per-sheet "
+                                               "progress of a queued Excel import.",
+                         responses={200: 'Successfully retrieved the import status',
+                                    404: 'Import job not found'})
+    def get(self, request, job_id, *args, **kwargs):
+        job = ImportJobService.get_status(job_id)
+        if job is None:
+            return Response({"error": "Import job not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
+
+
+def _parse_subtree_params(query_params, max_depth):
+    """
+    Reads the depth, cursor, page_size and fields query parameters of the partial hierarchy views.
+
+    Returns:
+        dict: The keyword arguments for HierarchyService.
+
+    Raises:
+        ValueError: If a parameter is not a valid integer or is out of range.
+    """
+    depth = int(query_params.get('depth', max_depth))
+    cursor = int(query_params.get('cursor', 0))
+    page_size = int(query_params['page_size']) if 'page_size' in query_params else None
+    if not 1 <= depth <= max_depth:
+        raise ValueError(f"depth must be between 1 and {max_depth}.")
+    if cursor < 0 or (page_size is not None and page_size < 1):
+        raise ValueError("cursor must not be negative and page_size must be positive.")
+
+    fields = query_params.get('fields')
+    names = [name.strip().lower() for name in fields.split(',') if name.strip()] if fields else None
+    return {'depth': depth, 'cursor': cursor, 'page_size': page_size, 'names': names}
+
+
+subtree_parameters = [
+    openapi.Parameter('depth', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Number of levels below the requested node to include."),
+    openapi.Parameter('cursor', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="The next_cursor of the previous page."),
+    openapi.Parameter('page_size', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Number of children per page to aim for; pages may be somewhat larger or smaller."),
+    openapi.Parameter('fields', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="Comma-separated names of the children to return instead of a page."),
+]
+
+
+class CategoryHierarchyView(APIView):
+
+    @swagger_auto_schema(manual_parameters=subtree_parameters,
+                         operation_summary="Get the Hierarchy of a Category",
+                         operation_description="Retrieves one page of the brands of a category with their series "
+                                               "and models, reading only the Redis keys of that category.",
+                         responses={200: 'Successfully retrieved the category',
+                                    400: 'Invalid query parameters',
+                                    404: 'Category not found'})
+    def get(self, request, category_name, *args, **kwargs):
+        try:
+            params = _parse_subtree_params(request.query_params, max_depth=3)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        subtree = HierarchyService.get_category_subtree(category_name.lower(), depth=params['depth'],
+                                                        cursor=params['cursor'], page_size=params['page_size'],
+                                                        brand_names=params['names'])
+        if subtree is None:
+            return Response({"error": "Category not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(subtree)
+
+
+class BrandHierarchyView(APIView):
+
+    @swagger_auto_schema(manual_parameters=subtree_parameters,
+                         operation_summary="Get the Hierarchy of a Brand",
+                         operation_description="Retrieves one page of the series of a brand with their models, "
+                                               "reading only the Redis keys of that brand.",
+                         responses={200: 'Successfully retrieved the brand',
+                                    400: 'Invalid query parameters',
+                                    404: 'Brand not found'})
+    def get(self, request, category_name, brand_name, *args, **kwargs):
+        try:
+            params = _parse_subtree_params(request.query_params, max_depth=2)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        subtree = HierarchyService.get_brand_subtree(category_name.lower(), brand_name.lower(), depth=params['depth'],
+                                                     cursor=params['cursor'], page_size=params['page_size'],
+                                                     series_names=params['names'])
+        if subtree is None:
+            return Response({"error": "Brand not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(subtree)
+
+
+class SearchView(APIView):
+    query = openapi.Parameter('q', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description="The beginning of the brand, series or model names to find, ignoring case.")
+    limit = openapi.Parameter('limit', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description="Maximum number of results, up to SEARCH_MAX_LIMIT.")
+
+    @swagger_auto_schema(manual_parameters=[query, limit],
+                         operation_summary="Search Brands, Series and Models",
+                         operation_description="Finds the brands, series and models whose name starts with the "
+                                               "query in the Redis search index and returns them with their "
+                                               "category, brand and series.",
+                         responses={200: 'Successfully retrieved the matches',
+                                    400: 'Invalid query parameters'})
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', settings.SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not query:
+            return Response({"error": "q must not be empty."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= settings.SEARCH_MAX_LIMIT:
+            return Response({"error": f"limit must be between 1 and {settings.SEARCH_MAX_LIMIT}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'query': query, 'results': SearchService.search(query, limit)})
+
+
+class MetricsView(APIView):
+
+    @swagger_auto_schema(operation_summary="Get Import Metrics",
+                         operation_description="Exposes cumulative import timings, row counts, SQL queries and "
+                                               "Redis round trips in the Prometheus text format.",
+                         responses={200: 'Successfully retrieved the metrics'})
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(ImportJobService.render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class HierarchyView(APIView):
+    stream = openapi.Parameter('stream', in_=openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                               description="Read the live hierarchy from Redis and stream it as it is serialized "
+                                           "instead of serving the snapshot.")
 
-    @swagger_auto_schema(operation_summary="Get Full Device Hierarchy",
-                         operation_description="Retrieves the complete hierarchy of device categories, brands, series, and models from Redis.",
+    @swagger_auto_schema(manual_parameters=[stream],
+                         operation_summary="Get Full Device Hierarchy",
+                         operation_description="Retrieves the complete hierarchy of device categories, brands, series, and models "
+                                               "from the snapshot materialized in Redis after every import.",
                          responses={200: 'Successfully retrieved the hierarchy',
+                                    304: 'The hierarchy has not changed since the given ETag or date',
                                     500: 'Internal Server Error'})
     def get(self, request, *args, **kwargs):
+        if _wants_stream(request):
+            return _stream_response(HierarchyService.iter_full_hierarchy_json())
+
         try:
-            hierarchy_data = HierarchyService.get_full_hierarchy()
-            return Response(hierarchy_data)
+            return _snapshot_response(request, HierarchyService.get_snapshot())
         except Exception as e:
             return Response({"error": str(e)}, status=500)
+
+
+def _wants_stream(request):
+    return request.GET.get('stream', '').lower() in ('1', 'true')
+
+
+def _stream_response(chunks):
+    # Written out batch by batch, so neither the hierarchy nor its JSON is ever held in memory whole
+    response = StreamingHttpResponse(chunks, content_type='application/json')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _snapshot_response(request, snapshot):
+    # The snapshot is already serialized and compressed, so it is returned as is instead of re-rendered
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    encoding = next((name for name in ('br', 'gzip')
+                     if name in snapshot.encodings and re.search(rf'\b{name}\b', accept_encoding)), None)
+    # Every representation needs its own strong ETag
+    etag = f'"{snapshot.etag}-{encoding}"' if encoding else f'"{snapshot.etag}"'
+    last_modified = int(snapshot.updated_at)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(snapshot.encodings[encoding] if encoding else snapshot.content,
+                                content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class AsyncHierarchyView(View):
+    """
+    Async counterpart of HierarchyView, served when HIERARCHY_ASYNC_VIEWS is enabled.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        if _wants_stream(request):
+            return _stream_response(HierarchyService.aiter_full_hierarchy_json())
+
+        try:
+            return _snapshot_response(request, await HierarchyService.aget_snapshot())
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+
+
+class AsyncCategoryHierarchyView(View):
+    """
+    Async counterpart of CategoryHierarchyView, served when HIERARCHY_ASYNC_VIEWS is enabled.
+    """
+
+    async def get(self, request, category_name, *args, **kwargs):
+        try:
+            params = _parse_subtree_params(request.GET, max_depth=3)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        subtree = await HierarchyService.aget_category_subtree(category_name.lower(), depth=params['depth'],
+                                                               cursor=params['cursor'], page_size=params['page_size'],
+                                                               brand_names=params['names'])
+        if subtree is None:
+            return JsonResponse({"error": "Category not found."}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse(subtree)
+
+
+class AsyncBrandHierarchyView(View):
+    """
+    Async counterpart of BrandHierarchyView, served when HIERARCHY_ASYNC_VIEWS is enabled.
+    """
+
+    async def get(self, request, category_name, brand_name, *args, **kwargs):
+        try:
+            params = _parse_subtree_params(request.GET, max_depth=2)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        subtree = await HierarchyService.aget_brand_subtree(category_name.lower(), brand_name.lower(),
+                                                            depth=params['depth'], cursor=params['cursor'],
+                                                            page_size=params['page_size'],
+                                                            series_names=params['names'])
+        if subtree is None:
+            return JsonResponse({"error": "Brand not found."}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse(subtree)